@@ -17,11 +17,14 @@ setup(name='tap-activecampaign',
       entry_points='''
           [console_scripts]
           tap-activecampaign=tap_activecampaign:main
+          tap-activecampaign-merge-state=tap_activecampaign.partition:merge_state_main
+          tap-activecampaign-multi=tap_activecampaign.multi:main
       ''',
       packages=find_packages(),
       package_data={
           'tap_activecampaign': [
               'schemas/*.json',
+              'catalog_bundle.json',
               'tests/*.py'
           ]
       },
@@ -32,5 +35,11 @@ setup(name='tap-activecampaign',
           'test': [
               'pylint',
               'nose',
+          ],
+          'parquet': [
+              'pyarrow==26.0.0',
+          ],
+          'msgspec': [
+              'msgspec==0.22.0',
           ]
       })
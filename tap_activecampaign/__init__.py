@@ -1,11 +1,12 @@
+import argparse
 import sys
 import json
-import argparse
 import singer
-from singer import metadata, utils
-from tap_activecampaign.client import ActiveCampaignClient
-from tap_activecampaign.discover import discover
-from tap_activecampaign.sync import sync
+from tap_activecampaign.partition import parse_partition
+
+# Only singer is imported up front. Discover mode needs no API client and no
+# network access, so the client, streams and their dependencies are imported
+# when a sync actually starts.
 
 LOGGER = singer.get_logger()
 
@@ -17,6 +18,7 @@ REQUIRED_CONFIG_KEYS = [
 ]
 
 def do_discover():
+    from tap_activecampaign.discover import discover
 
     LOGGER.info('Starting discover')
     catalog = discover()
@@ -24,27 +26,97 @@ def do_discover():
     LOGGER.info('Finished discover')
 
 
-@singer.utils.handle_top_exception(LOGGER)
-def main():
+def parse_args(required_config_keys):
+    """
+    Parse the tap specific `--partition i/N` and `--plan` arguments, then the standard Singer
+    arguments with singer.utils.parse_args.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--partition', type=parse_partition,
+                        help='Sync only the streams and contacts shards of partition i of N')
+    parser.add_argument('--plan', action='store_true',
+                        help='Print the sync plan of the catalog without syncing')
+    tap_args, sys.argv[1:] = parser.parse_known_args()
+
+    args = singer.utils.parse_args(required_config_keys)
+    args.partition = tap_args.partition
+    args.plan = tap_args.plan
+    return args
+
+
+def get_client(config):
+    from tap_activecampaign.cassette import get_cassette
+    from tap_activecampaign.client import ActiveCampaignClient
+
+    return ActiveCampaignClient(config['api_url'],
+                                config['api_token'],
+                                config['user_agent'],
+                                config.get('request_timeout'),
+                                get_cassette(config),
+                                connect_timeout=config.get('connect_timeout'),
+                                request_deadline=config.get('request_deadline'),
+                                circuit_breaker_threshold=config.get('circuit_breaker_threshold'),
+                                circuit_breaker_reset_timeout=config.get('circuit_breaker_reset_timeout'),
+                                max_concurrency=config.get('max_concurrency'),
+                                rate_limit=config.get('rate_limit'))
+
 
-    parsed_args = singer.utils.parse_args(REQUIRED_CONFIG_KEYS)
+def do_plan(config, catalog, state, partition=None):
+    from tap_activecampaign.client import RATE_LIMIT
+    from tap_activecampaign.plan import get_plan
+    from tap_activecampaign.sync import get_sync_streams
 
-    with ActiveCampaignClient(parsed_args.config['api_url'],
-                              parsed_args.config['api_token'],
-                              parsed_args.config['user_agent'],
-                              parsed_args.config.get('request_timeout')) as client:
+    LOGGER.info('Starting plan')
+    selected_streams, stream_names = get_sync_streams(catalog, state, config, partition)
+    with get_client(config) as client:
+        plan = get_plan(client, state, config.get('start_date'), stream_names, selected_streams,
+                        float(config.get('rate_limit') or RATE_LIMIT))
+    json.dump(plan, sys.stdout, indent=2)
+    LOGGER.info('Finished plan')
 
-        state = {}
-        if parsed_args.state:
-            state = parsed_args.state
 
-        if parsed_args.discover:
-            do_discover()
-        elif parsed_args.catalog:
+def do_sync(config, catalog, state, partition=None, writer=None):
+    from tap_activecampaign.output import get_writer
+    from tap_activecampaign.sync import sync
+
+    # The writer of the sync, unless given by the caller
+    sync_writer = writer or get_writer(config)
+
+    with get_client(config) as client:
+        try:
             sync(client=client,
-                 config=parsed_args.config,
-                 catalog=parsed_args.catalog,
-                 state=state)
+                 config=config,
+                 catalog=catalog,
+                 state=state,
+                 partition=partition,
+                 writer=sync_writer)
+        finally:
+            if writer is None:
+                # Write the queued messages and complete the open batch files, if any
+                sync_writer.close()
+
+
+@singer.utils.handle_top_exception(LOGGER)
+def main():
+
+    parsed_args = parse_args(REQUIRED_CONFIG_KEYS)
+
+    state = {}
+    if parsed_args.state:
+        state = parsed_args.state
+
+    if parsed_args.discover:
+        do_discover()
+    elif parsed_args.catalog and parsed_args.plan:
+        do_plan(config=parsed_args.config,
+                catalog=parsed_args.catalog,
+                state=state,
+                partition=parsed_args.partition)
+    elif parsed_args.catalog:
+        do_sync(config=parsed_args.config,
+                catalog=parsed_args.catalog,
+                state=state,
+                partition=parsed_args.partition)
 
 if __name__ == '__main__':
     main()
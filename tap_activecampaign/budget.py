@@ -0,0 +1,59 @@
+import time
+import singer
+
+LOGGER = singer.get_logger()
+
+RUNTIME_MARGIN = 60 # Seconds of the budget kept to finish the current page, at most 10% of the budget
+CHECKPOINT_KEY = 'checkpoint' # State key of the position of a stream stopped by the budget
+
+
+class RuntimeBudgetSpent(Exception):
+    """
+    Raised by a stream stopped by the runtime budget, once its checkpoint is written to the state.
+    """
+
+
+class RuntimeBudget:
+    """
+    `max_runtime` seconds for a sync, from the creation of the budget. The budget is spent once
+    less than the margin remains, so the page in progress can still be finished in time.
+    """
+
+    def __init__(self, max_runtime, margin=None):
+        self.max_runtime = float(max_runtime)
+        self.margin = min(float(margin if margin is not None else RUNTIME_MARGIN), self.max_runtime * 0.1)
+        self.start = time.monotonic()
+
+    def get_remaining(self):
+        return self.max_runtime - (time.monotonic() - self.start)
+
+    def is_spent(self):
+        return self.get_remaining() <= self.margin
+
+
+def get_checkpoints(state):
+    """
+    Return the checkpoints of the state, one per stream stopped by the budget. A state merged from
+    several partitions (see partition.merge_states) may have a list of them, any other state has one.
+    """
+    checkpoints = state.get(CHECKPOINT_KEY)
+    if not checkpoints:
+        return []
+    return checkpoints if isinstance(checkpoints, list) else [checkpoints]
+
+def set_checkpoints(state, checkpoints):
+    if not checkpoints:
+        state.pop(CHECKPOINT_KEY, None)
+    else:
+        state[CHECKPOINT_KEY] = checkpoints[0] if len(checkpoints) == 1 else checkpoints
+
+
+def get_runtime_budget(config):
+    """
+    Return the RuntimeBudget of the `max_runtime` config value, or None when the runtime is not limited.
+    """
+    max_runtime = config.get('max_runtime')
+    if not max_runtime:
+        return None
+    LOGGER.info('Runtime budget: {} seconds'.format(max_runtime))
+    return RuntimeBudget(max_runtime)
@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+import json
+import os
+from urllib.parse import urlencode
+import singer
+
+LOGGER = singer.get_logger()
+
+RECORD = 'record'
+REPLAY = 'replay'
+MODES = (RECORD, REPLAY)
+
+
+class CassetteMissError(Exception):
+    pass
+
+
+class Cassette:
+    """
+    On-disk store of API page responses, keyed by method, path and query string.
+    • record: every successful response is written to `directory` as a gzip compressed JSON file
+    • replay: responses are served from `directory` without any network access
+    """
+
+    def __init__(self, directory, mode=RECORD):
+        if mode not in MODES:
+            raise Exception('Error: cassette_mode must be one of {}'.format(', '.join(MODES)))
+        self.directory = directory
+        self.mode = mode
+        if mode == RECORD:
+            os.makedirs(directory, exist_ok=True)
+        elif not os.path.isdir(directory):
+            raise Exception('Error: cassette_dir {} does not exist'.format(directory))
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    @staticmethod
+    def get_query(params):
+        """
+        Return the query string for `params`, which is either the querystring built by the
+        streams or a dict of query parameters.
+        """
+        if not params:
+            return ''
+        if isinstance(params, dict):
+            return urlencode(sorted(params.items()))
+        return str(params)
+
+    def get_file_path(self, method, path, params):
+        """ Return the cassette file for a request. """
+        key = '{} {}?{}'.format(method, path, self.get_query(params))
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, '{}.json.gz'.format(digest))
+
+    def record(self, method, path, params, response_json):
+        """ Persist a response; written to a temp file first so an interrupted run leaves no partial page. """
+        file_path = self.get_file_path(method, path, params)
+        tmp_path = '{}.tmp'.format(file_path)
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as file:
+            json.dump({
+                'method': method,
+                'path': path,
+                'query': self.get_query(params),
+                'response': response_json
+            }, file)
+        os.replace(tmp_path, file_path)
+
+    def play(self, method, path, params):
+        """ Return the recorded response for a request, raise CassetteMissError if it was never recorded. """
+        file_path = self.get_file_path(method, path, params)
+        try:
+            with gzip.open(file_path, 'rt', encoding='utf-8') as file:
+                return json.load(file)['response']
+        except FileNotFoundError:
+            raise CassetteMissError('No recorded response for {} {}?{}'.format(
+                method, path, self.get_query(params))) from None
+
+
+def get_cassette(config):
+    """
+    Return a Cassette from the `cassette_mode` and `cassette_dir` config values, or None when not configured.
+    """
+    mode = config.get('cassette_mode')
+    if not mode:
+        return None
+    directory = config.get('cassette_dir') or 'cassette'
+    LOGGER.info('Cassette mode: {}, directory: {}'.format(mode, directory))
+    return Cassette(directory, mode)
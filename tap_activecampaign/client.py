@@ -1,16 +1,34 @@
-import backoff
+import collections
 import ipaddress
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
 from urllib.parse import urlparse
 import socket
 import requests
-from singer import metrics, utils
+from singer import metrics
 import singer
+from tap_activecampaign.concurrency import ConcurrencyLimiter
 
 LOGGER = singer.get_logger()
 REQUEST_TIMEOUT = 300
 
+# Retry settings
+MAX_TRIES = 5 # Attempts per logical request
+BACKOFF_FACTOR = 2 # Exponential backoff: up to 2, 4, 8, 16 seconds between attempts (full jitter)
+MAX_BACKOFF = 60 # Upper bound in seconds for a single backoff wait; server Retry-After hints are not capped
+REQUEST_DEADLINE = 900 # Overall budget in seconds for one logical request, including all retries
+# Consecutive server or connection failures on an endpoint that open its circuit: a request that used
+# all its attempts opens it, and the other requests to that endpoint (e.g. contacts shards) fail fast
+CIRCUIT_BREAKER_THRESHOLD = MAX_TRIES
+CIRCUIT_BREAKER_RESET_TIMEOUT = 60 # Seconds an open circuit fails fast before a trial request is let through
+
 DEFAULT_API_VERSION = '3'
 
+# Rate limit: https://developers.activecampaign.com/reference#rate-limits
+RATE_LIMIT = 5 # Requests per second per account
+
 
 class Server5xxError(Exception):
     pass
@@ -43,6 +61,9 @@ class ActiveCampaignRateLimitError(Server429Error):
 class ActiveCampaignInternalServerError(Server5xxError):
     pass
 
+class ActiveCampaignCircuitOpenError(ActiveCampaignError):
+    pass
+
 
 # Errors Reference: https://developers.activecampaign.com/reference#errors
 STATUS_CODE_EXCEPTION_MAPPING = {
@@ -97,6 +118,15 @@ def should_retry_error(exception):
     else:
         return False
 
+def is_endpoint_failure(exception):
+    """
+    Return true if the exception counts towards opening the circuit of an endpoint: server errors and
+    connection failures. Throttling (429) and the intermittent 403 are left to the backoff and the limiters.
+    """
+    if isinstance(exception, (Server429Error, ActiveCampaignForbiddenError)):
+        return False
+    return should_retry_error(exception)
+
 def get_exception_for_status_code(status_code):
     # Map the status code with `STATUS_CODE_EXCEPTION_MAPPING` dictionary and accordingly return the error.
     if status_code > 500:
@@ -138,9 +168,105 @@ def raise_for_error(response):
                 response_json.get("message", STATUS_CODE_EXCEPTION_MAPPING.get(
                 status_code, {}).get("message", "Unknown Error")))
     
-    exc = get_exception_for_status_code(status_code)
+    exc = get_exception_for_status_code(status_code)(message)
+    # Server hint for how long to wait before retrying (429 and 503 responses)
+    exc.retry_after = get_retry_after(response)
+
+    raise exc from None
+
+def get_retry_after(response):
+    """
+    Return the `Retry-After` header of the response in seconds, or None if it is missing or invalid.
+    The header is either a number of seconds or an HTTP date.
+    """
+    value = (getattr(response, 'headers', None) or {}).get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
 
-    raise exc(message) from None
+def get_retry_delay(attempt, exception):
+    """
+    Return seconds to wait before the next attempt: at least the server `Retry-After` hint when given
+    (plus up to 1 second of jitter, the request deadline decides whether to wait), otherwise
+    exponential backoff with full jitter.
+    """
+    retry_after = getattr(exception, 'retry_after', None)
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 1)
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF_FACTOR * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker. After `failure_threshold` consecutive server or connection failures
+    (see is_endpoint_failure) the circuit opens and requests fail fast with ActiveCampaignCircuitOpenError. Once
+    `reset_timeout` seconds have passed a single trial request is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, endpoint, failure_threshold, reset_timeout):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.__lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def before_request(self):
+        with self.__lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise ActiveCampaignCircuitOpenError(
+                    'Circuit open for endpoint {} after {} consecutive failures, failing fast'.format(
+                        self.endpoint, self.failures))
+            # Half-open: let this request through as a trial, keep others failing fast
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self.__lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.__lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    LOGGER.warning('Opening circuit for endpoint {} after {} consecutive failures'.format(
+                        self.endpoint, self.failures))
+                self.opened_at = time.monotonic()
+
+class RateLimiter:
+    """
+    Allows at most `limit` calls per `every` seconds, like singer.utils.ratelimit, but per instance
+    and safe to share between threads.
+    """
+
+    def __init__(self, limit, every):
+        self.limit = limit
+        self.every = every
+        self.__times = collections.deque()
+        self.__lock = threading.Lock()
+
+    def wait(self):
+        with self.__lock:
+            if len(self.__times) >= self.limit:
+                sleep_time = self.every - (time.time() - self.__times.popleft())
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+            self.__times.append(time.time())
 
 def is_api_url_valid(api_url):
     parsed_url = urlparse(api_url)
@@ -172,15 +298,25 @@ class ActiveCampaignClient(object):
                  api_url,
                  api_token,
                  user_agent=None,
-                 request_timeout=None):
+                 request_timeout=None,
+                 cassette=None,
+                 connect_timeout=None,
+                 request_deadline=None,
+                 circuit_breaker_threshold=None,
+                 circuit_breaker_reset_timeout=None,
+                 max_concurrency=None,
+                 rate_limit=None):
         self.__api_url = api_url
         self.__api_token = api_token
         self.__user_agent = user_agent
         self.__session = requests.Session()
         self.__verified = False
         self.base_url = '{}/api/{}/users/me'.format(self.__api_url, DEFAULT_API_VERSION)
+        # Optional record/replay store of page responses (see cassette.py)
+        self.cassette = cassette
 
-        if not is_api_url_valid(api_url):
+        # Replay serves recorded pages only, the api_url is never resolved
+        if not (self.cassette and self.cassette.replaying) and not is_api_url_valid(api_url):
             raise Exception('Error: api_url is not valid')
 
         # if request_timeout is other than 0, "0" or "" then use request_timeout
@@ -189,20 +325,88 @@ class ActiveCampaignClient(object):
         else: # If value is 0, "0" or "" then set default to 300 seconds.
             self.request_timeout = REQUEST_TIMEOUT
 
-    # Backoff for Server5xxError, Server429Error, OSError and Exception with ConnectionResetError.
-    @backoff.on_exception(backoff.expo,
-                          (Exception),
-                          giveup=lambda e: not should_retry_error(e),
-                          max_tries=5,
-                          factor=2)
+        # Separate connect timeout; when not set, request_timeout applies to connect and read
+        self.connect_timeout = float(connect_timeout) if connect_timeout and float(connect_timeout) else None
+        # Overall budget for one logical request, at least one full read timeout
+        self.request_deadline = max(float(request_deadline or REQUEST_DEADLINE), self.request_timeout)
+        # A higher threshold than MAX_TRIES would never be reached by a sequential sync
+        self.circuit_breaker_threshold = min(int(circuit_breaker_threshold or CIRCUIT_BREAKER_THRESHOLD), MAX_TRIES)
+        self.circuit_breaker_reset_timeout = float(circuit_breaker_reset_timeout or CIRCUIT_BREAKER_RESET_TIMEOUT)
+        self.__circuit_breakers = {}
+        self.__circuit_breakers_lock = threading.Lock()
+        # Adaptive limit of the requests in flight, shared by all threads using this client
+        self.limiter = ConcurrencyLimiter(max_limit=max_concurrency)
+        # Rate budget of the account, requests per second
+        self.rate_limiter = RateLimiter(float(rate_limit or RATE_LIMIT), 1)
+
+    def get_circuit_breaker(self, endpoint):
+        with self.__circuit_breakers_lock:
+            if endpoint not in self.__circuit_breakers:
+                self.__circuit_breakers[endpoint] = CircuitBreaker(
+                    endpoint, self.circuit_breaker_threshold, self.circuit_breaker_reset_timeout)
+            return self.__circuit_breakers[endpoint]
+
+    def get_timeout(self, remaining):
+        """
+        Return the requests timeout for an attempt: the read timeout is capped by the
+        remaining deadline of the logical request.
+        """
+        read_timeout = min(self.request_timeout, max(remaining, 1.0))
+        if self.connect_timeout:
+            return (self.connect_timeout, read_timeout)
+        return read_timeout
+
+    def call_with_retry(self, circuit_name, function, *args, **kwargs):
+        """
+        Call `function(*args, timeout=..., **kwargs)` through the circuit breaker of `circuit_name`,
+        retrying Server5xxError, Server429Error, ActiveCampaignForbiddenError, OSError and Exception
+        with ConnectionResetError up to MAX_TRIES times within the request deadline.
+        Waits honor the `Retry-After` header. Each attempt waits for the rate budget, then holds a slot
+        of the concurrency limiter, which only measures the request itself.
+        """
+        breaker = self.get_circuit_breaker(circuit_name)
+        deadline = time.monotonic() + self.request_deadline
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.before_request()
+            # Queueing for the rate budget is not server latency, keep it out of the limiter's samples
+            self.rate_limiter.wait()
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = function(*args, timeout=self.get_timeout(deadline - time.monotonic()), **kwargs)
+            except Exception as err:
+                self.limiter.release(time.monotonic() - start, throttled=isinstance(err, Server429Error))
+                if not should_retry_error(err):
+                    raise
+                if is_endpoint_failure(err):
+                    breaker.record_failure()
+                if attempt >= MAX_TRIES or breaker.is_open:
+                    raise
+                delay = get_retry_delay(attempt, err)
+                if time.monotonic() + delay >= deadline:
+                    LOGGER.warning('Giving up on {} after {} attempts, request deadline of {} seconds reached'.format(
+                        circuit_name, attempt, self.request_deadline))
+                    raise
+                LOGGER.info('Retrying {} in {:.1f} seconds after attempt {} failed: {}'.format(
+                    circuit_name, delay, attempt, repr(err)))
+                time.sleep(delay)
+                continue
+            self.limiter.release(time.monotonic() - start)
+            breaker.record_success()
+            return result
+
     def __enter__(self):
-        self.__verified = self.check_api_token()
+        if self.cassette and self.cassette.replaying:
+            return self
+        self.__verified = self.call_with_retry('users/me', self.check_api_token)
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
         self.__session.close()
 
-    def check_api_token(self):
+    def check_api_token(self, timeout=None):
         if self.__api_token is None:
             raise Exception('Error: Missing api_token.')
         headers = {}
@@ -215,23 +419,33 @@ class ActiveCampaignClient(object):
             # Simple endpoint that returns 1 record w/ default organization URN
             url=url,
             headers=headers,
-            timeout=self.request_timeout)
+            timeout=timeout or self.request_timeout)
         if response.status_code != 200:
             raise_for_error(response)
         else:
             return True
 
-    # Backoff for Server5xxError, Server429Error, OSError and Exception with ConnectionResetError.
-    @backoff.on_exception(backoff.expo,
-                          (Exception),
-                          giveup=lambda e: not should_retry_error(e),
-                          max_tries=5,
-                          factor=2)
-    # Rate limit: https://developers.activecampaign.com/reference#rate-limits
-    @utils.ratelimit(5, 1)
     def request(self, method, path=None, url=None, api_version=None, **kwargs):
+        """
+        Return the JSON response for a request. With a cassette configured, responses are
+        recorded to it or, in replay mode, served from it without network access.
+        """
+        if self.cassette and self.cassette.replaying:
+            return self.cassette.play(method, path or url, kwargs.get('params'))
+        if self.cassette:
+            # The cassette keeps the API pages: decoded records would be transformed again on replay
+            kwargs.pop('decoder', None)
+
+        response_json = self.call_with_retry(kwargs.get('endpoint') or path or url, self._request,
+                                             method, path=path, url=url, api_version=api_version, **kwargs)
+        if self.cassette:
+            self.cassette.record(method, path or url, kwargs.get('params'), response_json)
+        return response_json
+
+    # Single attempt; retries are handled by call_with_retry.
+    def _request(self, method, path=None, url=None, api_version=None, timeout=None, **kwargs):
         if not self.__verified:
-            self.__verified = self.check_api_token()
+            self.__verified = self.check_api_token(timeout)
 
         if not api_version:
             api_version = DEFAULT_API_VERSION
@@ -244,6 +458,8 @@ class ActiveCampaignClient(object):
             del kwargs['endpoint']
         else:
             endpoint = None
+        # Optional decoder of the response content, e.g. a StructDecoder (see struct_decode.py)
+        decoder = kwargs.pop('decoder', None)
 
         if 'headers' not in kwargs:
             kwargs['headers'] = {}
@@ -257,7 +473,7 @@ class ActiveCampaignClient(object):
             kwargs['headers']['Content-Type'] = 'application/json'
 
         with metrics.http_request_timer(endpoint) as timer:
-            response = self.__session.request(method, url, stream=True, timeout=self.request_timeout, **kwargs)
+            response = self.__session.request(method, url, stream=True, timeout=timeout or self.request_timeout, **kwargs)
             timer.tags[metrics.Tag.http_status_code] = response.status_code
 
         if response.status_code != 200:
@@ -265,7 +481,7 @@ class ActiveCampaignClient(object):
 
         # Log invalid JSON (e.g. unterminated string errors)
         try:
-            response_json = response.json()
+            response_json = decoder(response.content) if decoder else response.json()
         except Exception as err:
             LOGGER.error('{}'.format(err))
             LOGGER.error('response content: {}'.format(response.content))
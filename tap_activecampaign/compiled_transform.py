@@ -0,0 +1,284 @@
+import copy
+import json
+import threading
+import singer
+from singer import metadata, Transformer
+from tap_activecampaign.datetimes import normalize_datetime
+
+LOGGER = singer.get_logger()
+
+# Compiled transforms by schema and metadata, shared by the stream objects of a sync
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+class CompileError(Exception):
+    """
+    The schema or the metadata uses a construct the compiler does not handle; Transformer is used.
+    """
+
+
+class TransformMismatch(Exception):
+    """
+    A value does not match the schema; the record is transformed by Transformer, which reports the errors.
+    """
+
+
+# Conversions of the generated code, with the same results as singer's Transformer for a single type
+# (followed by "null" when nullable). Values that do not convert raise TransformMismatch.
+
+def mismatch(value):
+    raise TransformMismatch(value)
+
+def to_null(value):
+    if value is None or value == '':
+        return None
+    raise TransformMismatch(value)
+
+def to_integer(value, nullable):
+    try:
+        return int(value.replace(',', '') if isinstance(value, str) else value)
+    except Exception: # pylint: disable=broad-except
+        return to_null(value) if nullable else mismatch(value)
+
+def to_number(value, nullable):
+    try:
+        return float(value.replace(',', '') if isinstance(value, str) else value)
+    except Exception: # pylint: disable=broad-except
+        return to_null(value) if nullable else mismatch(value)
+
+def to_string(value, nullable):
+    if value is not None:
+        try:
+            return str(value)
+        except Exception: # pylint: disable=broad-except
+            pass
+    return to_null(value) if nullable else mismatch(value)
+
+def to_boolean(value, nullable):
+    if isinstance(value, str) and value.lower() == 'false':
+        return False
+    try:
+        return bool(value)
+    except Exception: # pylint: disable=broad-except
+        return to_null(value) if nullable else mismatch(value)
+
+def to_datetime(value, nullable):
+    result = normalize_datetime(value)
+    if result is not None:
+        return result
+    return to_null(value) if nullable else mismatch(value)
+
+def transform_generic(value, schema):
+    """
+    Transform a value of a schema the compiler does not specialize (anyOf, arrays, type lists).
+    """
+    success, result = Transformer().transform_recur(value, schema, [])
+    if not success:
+        raise TransformMismatch(value)
+    return result
+
+
+def get_kind(schema):
+    """
+    Return (kind, nullable) of a schema node, kind being the conversion generated for its values.
+    """
+    if 'anyOf' in schema:
+        return 'generic', False
+    if 'type' not in schema:
+        return 'any', False
+
+    types = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+    nullable = 'null' in types
+    others = [typ for typ in types if typ != 'null']
+    if not others:
+        return ('null', True) if nullable else ('generic', False)
+    if schema.get('format') == 'date-time':
+        return 'datetime', nullable
+    if len(others) > 1 or schema.get('format') == 'singer.decimal':
+        return 'generic', False
+    if others[0] == 'object':
+        if 'patternProperties' in schema:
+            return 'generic', False
+        return ('object' if schema.get('properties') else 'dict'), nullable
+    if others[0] in ('integer', 'number', 'string', 'boolean'):
+        return others[0], nullable
+    return 'generic', False
+
+
+class TransformCompiler:
+    """
+    Generates the Python source of a flat transform function for a stream schema: one block per
+    property, with the fields that are not selected left out, so the schema and the metadata are
+    not walked again for every record.
+    """
+
+    def __init__(self, stream_metadata=None, trusted_fields=None):
+        self.metadata = stream_metadata or {}
+        # Class of the top level fields whose values of that class are copied without conversion (see passthrough.py)
+        self.trusted_fields = dict(trusted_fields or {})
+        self.lines = []
+        self.constants = {}
+        self.names = 0
+
+    def new_name(self, prefix):
+        self.names += 1
+        return '{}{}'.format(prefix, self.names)
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def is_filtered(self, breadcrumb):
+        # Same rules as Transformer.filter_data_by_metadata
+        inclusion = metadata.get(self.metadata, breadcrumb, 'inclusion')
+        if inclusion == 'automatic':
+            return False
+        return metadata.get(self.metadata, breadcrumb, 'selected') is False or inclusion == 'unsupported'
+
+    def check_nested_metadata(self, breadcrumb):
+        for key in self.metadata:
+            if len(key) > len(breadcrumb) and tuple(key[:len(breadcrumb)]) == breadcrumb and self.is_filtered(key):
+                raise CompileError('fields below {} are not selected'.format('.'.join(breadcrumb)))
+
+    def compile_object(self, properties, source, target, breadcrumb, indent):
+        self.emit(indent, '{} = {{}}'.format(target))
+        for name, field_schema in properties.items():
+            field_breadcrumb = breadcrumb + ('properties', name)
+            if self.is_filtered(field_breadcrumb):
+                continue
+            value = self.new_name('value')
+            self.emit(indent, '{} = {}.get({!r}, MISSING)'.format(value, source, name))
+            self.emit(indent, 'if {} is not MISSING:'.format(value))
+            if not breadcrumb and name in self.trusted_fields:
+                # Values of the sampled class are copied, any other value is converted
+                trusted_class = self.new_name('CLASS')
+                self.constants[trusted_class] = self.trusted_fields[name]
+                self.emit(indent + 1, 'if {}.__class__ is {}:'.format(value, trusted_class))
+                self.emit(indent + 2, '{}[{!r}] = {}'.format(target, name, value))
+                self.emit(indent + 1, 'else:')
+                self.compile_value(field_schema, value, '{}[{!r}]'.format(target, name), field_breadcrumb, indent + 2)
+                continue
+            self.compile_value(field_schema, value, '{}[{!r}]'.format(target, name), field_breadcrumb, indent + 1)
+
+    def compile_value(self, schema, value, target, breadcrumb, indent): # pylint: disable=too-many-branches
+        kind, nullable = get_kind(schema)
+        none_case = ['elif {} is None:'.format(value), '    {} = None'.format(target)] if nullable else []
+
+        if kind == 'integer':
+            lines = ['if {0}.__class__ is int:', '    {1} = {0}',
+                     'elif {0}.__class__ is str and {0}.isdigit() and {0}.isascii():', '    {1} = int({0})']
+            lines += none_case + ['else:', '    {1} = to_integer({0}, {2})']
+        elif kind == 'string':
+            lines = ['if {0}.__class__ is str:', '    {1} = {0}']
+            lines += none_case + ['else:', '    {1} = to_string({0}, {2})']
+        elif kind == 'number':
+            lines = ['if {0}.__class__ is float:', '    {1} = {0}']
+            lines += none_case + ['else:', '    {1} = to_number({0}, {2})']
+        elif kind == 'boolean':
+            # None is falsy: a nullable boolean turns None into False, as Transformer does
+            lines = ['if {0} is True or {0} is False:', '    {1} = {0}', 'else:', '    {1} = to_boolean({0}, {2})']
+        elif kind == 'datetime':
+            lines = ['{1} = to_datetime({0}, {2})']
+        elif kind == 'null':
+            lines = ['{1} = to_null({0})']
+        elif kind in ('any', 'dict'):
+            self.check_nested_metadata(breadcrumb)
+            if kind == 'any':
+                lines = ['{1} = {0}']
+            else:
+                lines = ['if isinstance({0}, dict):', '    {1} = {0}',
+                         'else:', '    {1} = to_null({0}) if {2} else mismatch({0})']
+        elif kind == 'object':
+            nested = self.new_name('object')
+            self.emit(indent, 'if isinstance({}, dict):'.format(value))
+            self.compile_object(schema['properties'], value, nested, breadcrumb, indent + 1)
+            self.emit(indent + 1, '{} = {}'.format(target, nested))
+            lines = (['elif {0} is None or {0} == "":', '    {1} = None'] if nullable else []) + \
+                ['else:', '    mismatch({0})']
+        else:
+            self.check_nested_metadata(breadcrumb)
+            constant = self.new_name('SCHEMA')
+            # transform_recur reorders the type lists, the constant is a private copy
+            self.constants[constant] = copy.deepcopy(schema)
+            lines = ['{1} = transform_generic({0}, ' + constant + ')']
+
+        for line in lines:
+            self.emit(indent, line.format(value, target, nullable))
+
+    def compile(self, schema, function_name='transform_record'):
+        """
+        Return the source of the transform function of the schema and the constants it uses.
+        """
+        kind, _ = get_kind(schema)
+        if kind != 'object':
+            raise CompileError('the schema is not an object with properties')
+        self.emit(0, 'def {}(record):'.format(function_name))
+        self.emit(1, 'if not isinstance(record, dict):')
+        self.emit(2, 'mismatch(record)')
+        self.compile_object(schema['properties'], 'record', 'result', (), 1)
+        self.emit(1, 'return result')
+        return '\n'.join(self.lines) + '\n', self.constants
+
+    def compile_field(self, schema, breadcrumb, function_name='transform_value'):
+        """
+        Return the source of the transform function of the values of one field and the constants it uses.
+        """
+        self.emit(0, 'def {}(value):'.format(function_name))
+        self.compile_value(schema, 'value', 'result', breadcrumb, 1)
+        self.emit(1, 'return result')
+        return '\n'.join(self.lines) + '\n', self.constants
+
+
+def build_function(source, constants, function_name):
+    namespace = {
+        'MISSING': object(),
+        'mismatch': mismatch,
+        'to_null': to_null,
+        'to_integer': to_integer,
+        'to_number': to_number,
+        'to_string': to_string,
+        'to_boolean': to_boolean,
+        'to_datetime': to_datetime,
+        'transform_generic': transform_generic,
+        **constants
+    }
+    exec(compile(source, '<transform {}>'.format(function_name), 'exec'), namespace) # pylint: disable=exec-used
+    return namespace[function_name]
+
+def compile_transform(schema, stream_metadata=None, function_name='transform_record', trusted_fields=None):
+    """
+    Compile the transform function of a stream: record -> transformed record, equal to the result
+    of Transformer().transform(record, schema, stream_metadata). Raises TransformMismatch for a
+    record that does not match the schema and CompileError for a schema it does not handle.
+    The values of the top level `trusted_fields` ({field name: class}) are copied as they are when
+    they are of that class.
+    """
+    source, constants = TransformCompiler(stream_metadata, trusted_fields).compile(schema, function_name)
+    return build_function(source, constants, function_name)
+
+def compile_field_transform(schema, breadcrumb=(), stream_metadata=None, function_name='transform_value'):
+    """
+    Compile the transform function of the values of one field, see compile_transform.
+    """
+    source, constants = TransformCompiler(stream_metadata).compile_field(schema, breadcrumb, function_name)
+    return build_function(source, constants, function_name)
+
+def get_cache_key(stream_name, schema, stream_metadata):
+    return json.dumps([stream_name, schema, sorted([list(breadcrumb), values]
+                                                   for breadcrumb, values in (stream_metadata or {}).items())],
+                      sort_keys=True)
+
+def get_compiled_transform(stream_name, schema, stream_metadata):
+    """
+    Return the compiled transform of the stream schema and metadata, compiled once per sync, or
+    None when the schema can only be transformed by Transformer.
+    """
+    key = get_cache_key(stream_name, schema, stream_metadata)
+    with _CACHE_LOCK:
+        if key not in _CACHE:
+            try:
+                _CACHE[key] = compile_transform(schema, stream_metadata, 'transform_{}'.format(stream_name))
+            except CompileError as err:
+                LOGGER.info('Stream: {}, records are transformed by Transformer: {}'.format(stream_name, err))
+                _CACHE[key] = None
+        return _CACHE[key]
@@ -0,0 +1,129 @@
+import collections
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+import time
+import singer
+from singer import metrics
+
+LOGGER = singer.get_logger()
+
+INITIAL_CONCURRENCY = 2 # Requests in flight when a sync starts
+MAX_CONCURRENCY = 16 # Upper bound of requests in flight
+MIN_CONCURRENCY = 1
+ADDITIVE_INCREASE = 1 # Added to the limit after each window without throttling or latency growth
+MULTIPLICATIVE_DECREASE = 0.5 # Factor applied to the limit on throttling or latency growth
+LATENCY_TOLERANCE = 1.5 # Window p95 above baseline p95 * tolerance counts as rising latency
+WINDOW_SIZE = 20 # Completed requests per evaluation window
+WORK_POLL_SECONDS = 1 # Interval at which map_with_limit starts more work after the limit grew
+
+
+def get_percentile(values, percentile):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+class ConcurrencyLimiter:
+    """
+    AIMD (additive increase, multiplicative decrease) limit of the requests in flight.
+    Every WINDOW_SIZE completed requests the limit grows by ADDITIVE_INCREASE when no request was
+    throttled, the window p95 latency stayed within LATENCY_TOLERANCE of the baseline and the requests
+    in flight reached the limit (it is then the bottleneck), otherwise it shrinks by MULTIPLICATIVE_DECREASE
+    or, below the limit, stays. A throttled request shrinks the limit right away, at most
+    once per window. The current limit is logged as a `concurrency_limit` metric on every change.
+    """
+
+    def __init__(self, initial_limit=None, max_limit=None, min_limit=MIN_CONCURRENCY, window_size=WINDOW_SIZE):
+        self.max_limit = int(max_limit or MAX_CONCURRENCY)
+        self.min_limit = min(int(min_limit), self.max_limit)
+        self.limit = float(max(self.min_limit, min(int(initial_limit or INITIAL_CONCURRENCY), self.max_limit)))
+        self.window_size = window_size
+        self.in_flight = 0
+        # Highest number of requests in flight during the window
+        self.peak_in_flight = 0
+        self.baseline_p95 = None
+        self.__latencies = collections.deque(maxlen=window_size)
+        self.__throttled = False
+        self.__decreased_in_window = False
+        self.__condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait until a request slot is available and take it.
+        """
+        with self.__condition:
+            while self.in_flight >= int(self.limit):
+                self.__condition.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self, latency, throttled=False):
+        """
+        Free a request slot, recording the latency of the request and whether it was throttled.
+        """
+        with self.__condition:
+            self.in_flight -= 1
+            if throttled:
+                self.__throttled = True
+                if not self.__decreased_in_window:
+                    self.__decreased_in_window = True
+                    self.set_limit(self.limit * MULTIPLICATIVE_DECREASE, 'throttled')
+            else:
+                self.__latencies.append(latency)
+                if len(self.__latencies) >= self.window_size:
+                    self.end_window()
+            self.__condition.notify_all()
+
+    def end_window(self):
+        p95 = get_percentile(self.__latencies, 0.95)
+        if self.baseline_p95 is None:
+            self.baseline_p95 = p95
+
+        if self.__throttled:
+            # Already decreased when the throttled response came in
+            pass
+        elif p95 > self.baseline_p95 * LATENCY_TOLERANCE:
+            self.set_limit(self.limit * MULTIPLICATIVE_DECREASE, 'latency p95 {:.3f}s over baseline {:.3f}s'.format(
+                p95, self.baseline_p95))
+        elif self.peak_in_flight >= int(self.limit):
+            self.set_limit(self.limit + ADDITIVE_INCREASE, 'stable')
+
+        # Follow slow drifts of the latency, so a new normal does not keep shrinking the limit
+        self.baseline_p95 = min(p95, 0.9 * self.baseline_p95 + 0.1 * p95)
+        self.__latencies.clear()
+        self.peak_in_flight = self.in_flight
+        self.__throttled = False
+        self.__decreased_in_window = False
+
+    def set_limit(self, limit, reason):
+        previous = int(self.limit)
+        self.limit = float(max(self.min_limit, min(limit, self.max_limit)))
+        if int(self.limit) != previous:
+            LOGGER.info('Concurrency limit {} -> {} ({})'.format(previous, int(self.limit), reason))
+            metrics.log(LOGGER, metrics.Point('gauge', 'concurrency_limit', int(self.limit), {}))
+
+
+def map_with_limit(function, items, limiter=None, max_workers=None):
+    """
+    Return the results of function(item) for the items, called in threads. With a ConcurrencyLimiter,
+    a call starts only while fewer than `limiter.limit` calls are running, so the work follows the
+    limit as it grows or shrinks; otherwise up to `max_workers` calls (default all) run at once.
+    """
+    items = list(items)
+    if not items:
+        return []
+    if limiter is None:
+        with ThreadPoolExecutor(max_workers=min(max_workers or len(items), len(items))) as executor:
+            return list(executor.map(function, items))
+
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=min(limiter.max_limit, len(items))) as executor:
+        running = {}
+        next_index = 0
+        while next_index < len(items) or running:
+            while next_index < len(items) and len(running) < max(1, int(limiter.limit)):
+                running[executor.submit(function, items[next_index])] = next_index
+                next_index += 1
+            done, _ = wait(running, timeout=WORK_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    return results
@@ -0,0 +1,50 @@
+import datetime
+import functools
+import re
+from singer.transform import string_to_datetime
+
+# Normalized values kept by normalize_datetime; bulk operations stamp many records with the same value
+DATETIME_CACHE_SIZE = 65536
+
+# Formats returned by the API: "2021-02-01 10:11:12" (UTC) and ISO 8601 with "Z" or an offset
+DATETIME_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?(Z|[+-]\d{2}:\d{2})?')
+
+
+def parse_fixed_format(value):
+    """
+    Return the UTC datetime of a value in one of the API formats, or None for any other value.
+    """
+    match = DATETIME_PATTERN.fullmatch(value)
+    if not match:
+        return None
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    try:
+        parsed = datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                                   int(fraction.ljust(6, '0')) if fraction else 0, datetime.timezone.utc)
+        if offset and offset != 'Z':
+            sign = -1 if offset[0] == '-' else 1
+            parsed = parsed - sign * datetime.timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6]))
+    except (ValueError, OverflowError):
+        return None
+    return parsed
+
+@functools.lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def normalize_datetime_string(value):
+    parsed = parse_fixed_format(value)
+    if parsed is None:
+        # Any other format goes through singer's parser, which logs the values it cannot parse
+        return string_to_datetime(value)
+    return '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.{:06d}Z'.format(
+        parsed.year, parsed.month, parsed.day, parsed.hour, parsed.minute, parsed.second, parsed.microsecond)
+
+def normalize_datetime(value):
+    """
+    Return a date-time value as singer's Transformer formats it ("%Y-%m-%dT%H:%M:%S.%fZ" in UTC), None
+    for an empty or unparsable value. Strings are cached, values of other types are not.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return normalize_datetime_string(value)
+    return string_to_datetime(value)
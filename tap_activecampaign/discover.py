@@ -1,7 +1,7 @@
 import singer
+from singer import metadata
 from singer.catalog import Catalog, CatalogEntry, Schema
 from tap_activecampaign.schema import get_schemas
-from tap_activecampaign.streams import flatten_streams
 
 LOGGER = singer.get_logger()
 
@@ -9,7 +9,6 @@ def discover():
     schemas, field_metadata = get_schemas()
     catalog = Catalog([])
 
-    flat_streams = flatten_streams()
     for stream_name, schema_dict in schemas.items():
         try:
             schema = Schema.from_dict(schema_dict)
@@ -23,7 +22,7 @@ def discover():
         catalog.streams.append(CatalogEntry(
             stream=stream_name,
             tap_stream_id=stream_name,
-            key_properties=flat_streams.get(stream_name, {}).get('key_properties', None),
+            key_properties=metadata.get(metadata.to_map(mdata), (), 'table-key-properties'),
             schema=schema,
             metadata=mdata
         ))
@@ -0,0 +1,146 @@
+import glob
+import hashlib
+import json
+import os
+import uuid
+import singer
+
+LOGGER = singer.get_logger()
+
+# Number of hex characters kept from each record hash
+HASH_LENGTH = 16
+# Maximum number of removed ids included in the log message
+MAX_LOGGED_IDS = 100
+# State key of the run that staged the sidecar fingerprints of each stream
+RUNS_KEY = 'fingerprint_runs'
+
+
+class FingerprintStore:
+    """
+    Keeps a compact content hash per primary key for FULL_TABLE streams, so that only
+    new or changed records are written and the keys that disappeared can be reported.
+    :param fingerprints: Hashes of the previous run, {stream_name: {record_key: hash}}
+    :param state: When given, fingerprints are persisted in state['fingerprints']
+    :param file_path: When given, fingerprints are staged next to this sidecar JSON file instead, and
+        the state records the run that staged them (see promote_staged_fingerprints)
+    """
+
+    def __init__(self, fingerprints=None, state=None, file_path=None):
+        self.previous = fingerprints or {}
+        self.current = {}
+        self.state = state
+        self.file_path = file_path
+        self.run_id = uuid.uuid4().hex
+        self.staged = {}
+
+    @staticmethod
+    def get_record_key(record, key_properties):
+        return '|'.join(str(record.get(key)) for key in key_properties)
+
+    @staticmethod
+    def get_hash(record):
+        record_json = json.dumps(record, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1(record_json.encode('utf-8')).hexdigest()[:HASH_LENGTH]
+
+    def is_changed(self, stream_name, record, key_properties):
+        """
+        Remember the hash of the record and return True if it is new or differs from the previous run.
+        """
+        record_key = self.get_record_key(record, key_properties)
+        record_hash = self.get_hash(record)
+        self.current.setdefault(stream_name, {})[record_key] = record_hash
+        return self.previous.get(stream_name, {}).get(record_key) != record_hash
+
+    def finish_stream(self, stream_name):
+        """
+        Replace the fingerprints of a fully synced stream, persist them and return the
+        record keys present in the previous run but not in this one.
+        """
+        current = self.current.pop(stream_name, {})
+        removed_keys = sorted(set(self.previous.get(stream_name, {})) - set(current))
+        self.previous[stream_name] = current
+
+        if removed_keys:
+            LOGGER.info('Stream: {}, {} records no longer present, keys: {}{}'.format(
+                stream_name,
+                len(removed_keys),
+                removed_keys[:MAX_LOGGED_IDS],
+                ' ...' if len(removed_keys) > MAX_LOGGED_IDS else ''))
+        self.save(stream_name)
+        return removed_keys
+
+    def save(self, stream_name):
+        if not self.file_path:
+            if self.state is not None:
+                self.state.setdefault('fingerprints', {})[stream_name] = self.previous[stream_name]
+            return
+
+        # The target has not loaded the records yet: the fingerprints are staged, and the next run
+        # promotes them only if its state, saved by the target after the stream, names this run
+        self.staged[stream_name] = self.previous[stream_name]
+        write_json(get_staged_path(self.file_path, self.run_id), self.staged)
+        if self.state is not None:
+            self.state.setdefault(RUNS_KEY, {})[stream_name] = self.run_id
+
+
+def write_json(path, value):
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'w') as file:
+        json.dump(value, file)
+    os.replace(tmp_path, path)
+
+
+def get_staged_path(file_path, run_id):
+    return '{}.{}.staged'.format(file_path, run_id)
+
+
+def promote_staged_fingerprints(file_path, state):
+    """
+    Return the fingerprints of the sidecar file, updated with the fingerprints staged by previous runs
+    for the streams whose run is recorded in the state, i.e. whose records the target has loaded.
+    The other staged fingerprints are discarded, so records of a failed load are written again.
+    """
+    fingerprints = {}
+    if os.path.exists(file_path):
+        with open(file_path) as file:
+            fingerprints = json.load(file)
+
+    runs = state.get(RUNS_KEY, {})
+    staged_paths = sorted(glob.glob(get_staged_path(glob.escape(file_path), '*')))
+    promoted = False
+    for staged_path in staged_paths:
+        run_id = staged_path[len(file_path) + 1:-len('.staged')]
+        with open(staged_path) as file:
+            staged = json.load(file)
+        for stream_name, stream_fingerprints in staged.items():
+            if runs.get(stream_name) == run_id:
+                fingerprints[stream_name] = stream_fingerprints
+                promoted = True
+            else:
+                LOGGER.info('Stream: {}, discarding the fingerprints of run {}, not saved by the target'.format(
+                    stream_name, run_id))
+
+    if promoted:
+        write_json(file_path, fingerprints)
+    for staged_path in staged_paths:
+        os.remove(staged_path)
+    return fingerprints
+
+
+def get_fingerprint_store(config, state):
+    """
+    Return a FingerprintStore based on the `fingerprint_store` config value:
+    • "state": fingerprints are kept in the state, so they only advance once the target has saved the state
+    • any other value: path of a sidecar JSON file holding the fingerprints, promoted from their staged
+      file only once the state shows that the target saved the state of the run that staged them
+    Return None when change detection is not configured.
+    """
+    location = config.get('fingerprint_store')
+    if not location:
+        return None
+
+    if location == 'state':
+        return FingerprintStore(fingerprints=dict(state.get('fingerprints', {})), state=state)
+
+    fingerprints = promote_staged_fingerprints(location, state)
+    return FingerprintStore(fingerprints=fingerprints, state=state, file_path=location)
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import singer
+from tap_activecampaign.output import SingerWriter, get_writer
+
+LOGGER = singer.get_logger()
+
+# Entry point `tap-activecampaign-multi`: syncs several ActiveCampaign accounts in one process.
+# Config: the usual tap config, where `accounts` lists {"name", "api_url", "api_token"} (plus any
+# per-account overrides) instead of a single api_url/api_token.
+REQUIRED_CONFIG_KEYS = [
+    'accounts',
+    'start_date',
+    'user_agent'
+]
+
+MAX_WORKERS = 4 # Accounts synced at the same time
+
+OUTPUT_PREFIX = 'prefix' # All messages on stdout, stream names prefixed with "<account name>__"
+OUTPUT_FILES = 'files' # Messages of each account in <output_dir>/<account name>.jsonl
+
+
+class MultiAccountState:
+    """
+    Combined state of all accounts, {"accounts": {account name: state}}, written to stdout.
+    Each account's state is serialized by the thread syncing that account, and the combined
+    STATE message is assembled from those snapshots, so no thread reads a state being modified.
+    """
+
+    def __init__(self, states, writer=None):
+        self.writer = writer or get_writer()
+        self.__snapshots = {name: json.dumps(state) for name, state in states.items()}
+        self.__lock = threading.Lock()
+
+    def update(self, account_name, state):
+        snapshot = json.dumps(state)
+        with self.__lock:
+            self.__snapshots[account_name] = snapshot
+            accounts = ', '.join('{}: {}'.format(json.dumps(name), value)
+                                 for name, value in self.__snapshots.items())
+            self.writer.write_line('{"type": "STATE", "value": {"accounts": {' + accounts + '}}}')
+
+
+class AccountWriter(SingerWriter):
+    """
+    Writer of the Singer messages of one account (see output.SingerWriter). Schemas and records go
+    to stdout with prefixed stream names or to the account's own file, the account state goes to
+    the combined state and, with one file per account, to that file as well.
+    """
+
+    # RECORD lines serialized by a TransformPool carry the stream name without the account prefix
+    record_lines = False
+
+    def __init__(self, account_name, multi_state, output=OUTPUT_PREFIX, output_dir='.'):
+        super().__init__()
+        self.account_name = account_name
+        self.multi_state = multi_state
+        self.__file = None
+        if output == OUTPUT_FILES:
+            self.__file = open(os.path.join(output_dir, '{}.jsonl'.format(account_name)), 'w')
+            self.writer = SingerWriter(out=self.__file)
+            self.prefix = ''
+        else:
+            self.writer = get_writer()
+            self.prefix = '{}__'.format(account_name)
+
+    def write_line(self, line):
+        self.writer.write_line(line)
+
+    def write_schema(self, stream_name, schema, key_properties, bookmark_properties=None):
+        super().write_schema(self.prefix + stream_name, schema, key_properties, bookmark_properties)
+
+    def write_record(self, stream_name, record, time_extracted=None, line=None):
+        # A serialized `line` is ignored, the record is written with the prefixed stream name
+        super().write_record(self.prefix + stream_name, record, time_extracted=time_extracted)
+
+    def write_state(self, state):
+        if self.__file:
+            super().write_state(state)
+        self.multi_state.update(self.account_name, state)
+
+    def close(self):
+        super().close()
+        if self.__file:
+            self.__file.close()
+
+
+def get_account_name(account):
+    return account.get('name') or urlparse(account['api_url']).hostname.split('.')[0]
+
+def get_account_config(config, account):
+    """
+    Return the tap config of an account: the shared config with the account values on top. Local
+    files (cassettes, fingerprint sidecar) get a per-account location.
+    """
+    name = get_account_name(account)
+    account_config = {key: value for key, value in config.items() if key != 'accounts'}
+    account_config.update(account)
+    if account_config.get('cassette_mode'):
+        account_config['cassette_dir'] = os.path.join(account_config.get('cassette_dir') or 'cassette', name)
+    fingerprint_store = account_config.get('fingerprint_store')
+    if fingerprint_store and fingerprint_store != 'state':
+        root, extension = os.path.splitext(fingerprint_store)
+        account_config['fingerprint_store'] = '{}_{}{}'.format(root, name, extension)
+    return account_config
+
+def sync_accounts(config, catalog, state, sync_account):
+    """
+    Sync all accounts of the config over a shared pool of `max_workers` threads. Every account has
+    its own client, so its own rate budget (`rate_limit`) and concurrency limit.
+    `sync_account(account_config, catalog, account_state, writer)` syncs one account.
+    Failed accounts are logged and reported once all accounts are done.
+    """
+    names = [get_account_name(account) for account in config['accounts']]
+    if len(set(names)) != len(names):
+        raise Exception('Account names must be unique: {}'.format(names))
+
+    states = {name: (state.get('accounts') or {}).get(name) or {} for name in names}
+    multi_state = MultiAccountState(states)
+    output = config.get('output') or OUTPUT_PREFIX
+    output_dir = config.get('output_dir') or '.'
+    if output == OUTPUT_FILES:
+        os.makedirs(output_dir, exist_ok=True)
+
+    def sync_one(account):
+        name = get_account_name(account)
+        writer = AccountWriter(name, multi_state, output, output_dir)
+        try:
+            LOGGER.info('START Syncing account: {}'.format(name))
+            sync_account(get_account_config(config, account), catalog, states[name], writer)
+            LOGGER.info('FINISHED Syncing account: {}'.format(name))
+            return None
+        except Exception as err:
+            LOGGER.error('Account {} failed: {}'.format(name, repr(err)))
+            return name
+        finally:
+            writer.close()
+
+    with ThreadPoolExecutor(max_workers=int(config.get('max_workers') or MAX_WORKERS)) as executor:
+        failed = [name for name in executor.map(sync_one, config['accounts']) if name]
+
+    if failed:
+        raise Exception('Sync failed for accounts: {}'.format(', '.join(failed)))
+
+
+@singer.utils.handle_top_exception(LOGGER)
+def main():
+    from tap_activecampaign import do_discover, do_sync
+
+    parsed_args = singer.utils.parse_args(REQUIRED_CONFIG_KEYS)
+
+    if parsed_args.discover:
+        # The catalog is the same for every account
+        do_discover()
+    elif parsed_args.catalog:
+        sync_accounts(parsed_args.config,
+                      parsed_args.catalog,
+                      parsed_args.state or {},
+                      lambda config, catalog, state, writer: do_sync(config, catalog, state, writer=writer))
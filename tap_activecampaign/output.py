@@ -0,0 +1,243 @@
+import collections
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import simplejson
+import singer
+from singer import messages, metrics
+
+LOGGER = singer.get_logger()
+
+BATCH_SIZE = 100000 # Records per batch file
+COMPRESSION_LEVEL = 6 # gzip level of the batch files, 1 (fastest) to 9 (smallest)
+OUTPUT_QUEUE_MAX_MB = 64 # Memory cap of the lines waiting for the writer thread
+METRICS_INTERVAL = 60 # Seconds between two reports of the output queue metrics
+
+
+class OutputQueue:
+    """
+    Lines waiting to be written by a dedicated writer thread, so that fetching continues while the
+    target applies backpressure. Producers block only once `max_bytes` of lines are queued. The
+    queue depth and the time producers spent blocked are logged as metrics every METRICS_INTERVAL
+    seconds and on close.
+    """
+
+    def __init__(self, write, max_bytes):
+        self.write = write
+        self.max_bytes = max_bytes
+        self.blocked_seconds = 0.0
+        self.__lines = collections.deque()
+        # Size of the queued lines, including the ones being written
+        self.__bytes = 0
+        self.__closed = False
+        self.__error = None
+        self.__blocked_since_report = 0.0
+        self.__last_report = time.monotonic()
+        self.__condition = threading.Condition()
+        self.__thread = threading.Thread(target=self.run, name='output-writer', daemon=True)
+        self.__thread.start()
+
+    def put(self, line):
+        size = len(line) + 1
+        with self.__condition:
+            self.raise_error()
+            if self.__bytes + size > self.max_bytes and self.__bytes:
+                start = time.monotonic()
+                while self.__bytes + size > self.max_bytes and self.__bytes and self.__error is None:
+                    self.__condition.wait()
+                blocked = time.monotonic() - start
+                self.blocked_seconds += blocked
+                self.__blocked_since_report += blocked
+                self.raise_error()
+            self.__lines.append(line)
+            self.__bytes += size
+            self.__condition.notify_all()
+            if time.monotonic() - self.__last_report >= METRICS_INTERVAL:
+                self.report_metrics()
+
+    def run(self):
+        while True:
+            with self.__condition:
+                while not self.__lines and not self.__closed:
+                    self.__condition.wait()
+                if not self.__lines:
+                    return
+                lines = list(self.__lines)
+                self.__lines.clear()
+            size = sum(len(line) + 1 for line in lines)
+            try:
+                self.write(''.join(line + '\n' for line in lines))
+            except Exception as err: # pylint: disable=broad-except
+                with self.__condition:
+                    self.__error = err
+                    self.__condition.notify_all()
+                return
+            with self.__condition:
+                self.__bytes -= size
+                self.__condition.notify_all()
+
+    def raise_error(self):
+        if self.__error is not None:
+            raise self.__error
+
+    def report_metrics(self):
+        metrics.log(LOGGER, metrics.Point('gauge', 'output_queue_depth', len(self.__lines), {'bytes': self.__bytes}))
+        metrics.log(LOGGER, metrics.Point('timer', 'output_blocked_time', round(self.__blocked_since_report, 3), {}))
+        self.__blocked_since_report = 0.0
+        self.__last_report = time.monotonic()
+
+    def close(self):
+        """
+        Write all queued lines and stop the writer thread.
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread.join()
+        with self.__condition:
+            self.report_metrics()
+        self.raise_error()
+
+
+class SingerWriter:
+    """
+    Writes Singer messages as JSON lines to stdout (or `out`). Messages are serialized by the
+    calling thread and written under a lock, so streams synced from several threads never
+    interleave their lines. With `queue_max_bytes`, lines are handed to an OutputQueue and
+    written by its thread.
+    """
+
+    # Records are written as RECORD lines, which a TransformPool can serialize in its worker processes
+    record_lines = True
+
+    def __init__(self, out=None, queue_max_bytes=None):
+        self.out = out
+        self.__lock = threading.Lock()
+        self.queue = OutputQueue(self.write_text, queue_max_bytes) if queue_max_bytes else None
+
+    def write_message(self, message):
+        self.write_line(messages.format_message(message))
+
+    def write_line(self, line):
+        if self.queue:
+            self.queue.put(line)
+        else:
+            self.write_text(line + '\n')
+
+    def write_text(self, text):
+        # Resolve stdout at write time, it may be redirected (e.g. by tests)
+        out = self.out or sys.stdout
+        with self.__lock:
+            out.write(text)
+            out.flush()
+
+    def write_schema(self, stream_name, schema, key_properties, bookmark_properties=None):
+        self.write_message(messages.SchemaMessage(
+            stream=stream_name,
+            schema=schema,
+            key_properties=key_properties,
+            bookmark_properties=bookmark_properties))
+
+    def write_record(self, stream_name, record, time_extracted=None, line=None):
+        # `line`: the RECORD message already serialized
+        if line is not None:
+            self.write_line(line)
+            return
+        self.write_message(messages.RecordMessage(
+            stream=stream_name,
+            record=record,
+            time_extracted=time_extracted))
+
+    def write_state(self, state):
+        self.write_message(messages.StateMessage(value=state))
+
+    def close(self):
+        if self.queue:
+            self.queue.close()
+
+
+class BatchWriter(SingerWriter):
+    """
+    Writes the records of each stream to rotating gzip compressed JSONL files in `batch_dir` and
+    emits a Singer BATCH message referencing each file once it is complete, after `batch_size`
+    records. Open files are completed before a STATE message is written, so a state never
+    covers records that are not in an emitted batch.
+    """
+
+    record_lines = False
+
+    def __init__(self, batch_dir, batch_size=None, compression_level=None, out=None):
+        super().__init__(out)
+        self.batch_dir = os.path.abspath(batch_dir)
+        self.batch_size = int(batch_size or BATCH_SIZE)
+        self.compression_level = int(compression_level if compression_level is not None else COMPRESSION_LEVEL)
+        # Open batch per stream: [file object, path, record count]
+        self.__batches = {}
+        self.__lock = threading.RLock()
+        os.makedirs(self.batch_dir, exist_ok=True)
+
+    def write_record(self, stream_name, record, time_extracted=None, line=None):
+        line = simplejson.dumps(record, use_decimal=True) + '\n'
+        with self.__lock:
+            batch = self.__batches.get(stream_name)
+            if batch is None:
+                path = os.path.join(self.batch_dir, '{}-{}.jsonl.gz'.format(stream_name, uuid.uuid4().hex))
+                batch = [gzip.open(path, 'wt', compresslevel=self.compression_level), path, 0]
+                self.__batches[stream_name] = batch
+            batch[0].write(line)
+            batch[2] += 1
+            if batch[2] >= self.batch_size:
+                self.flush_batch(stream_name)
+
+    def flush_batch(self, stream_name):
+        with self.__lock:
+            file, path, record_count = self.__batches.pop(stream_name)
+            file.close()
+            LOGGER.info('Stream: {}, batch of {} records: {}'.format(stream_name, record_count, path))
+            self.write_line(json.dumps({
+                'type': 'BATCH',
+                'stream': stream_name,
+                'encoding': {'format': 'jsonl', 'compression': 'gzip'},
+                'manifest': ['file://{}'.format(path)]
+            }))
+
+    def flush(self):
+        with self.__lock:
+            for stream_name in list(self.__batches):
+                self.flush_batch(stream_name)
+
+    def write_state(self, state):
+        with self.__lock:
+            self.flush()
+            super().write_state(state)
+
+    def close(self):
+        self.flush()
+        super().close()
+
+# Shared by all streams of a sync
+WRITER = SingerWriter()
+
+def get_writer(config=None):
+    """
+    Return the writer for the Singer messages of a sync: a ParquetWriter when `export_dir` is
+    configured, a BatchWriter when `batch_dir` is configured, otherwise a stdout writer with an
+    output queue of `output_queue_max_mb` (0 writes synchronously with the shared writer).
+    """
+    if config and config.get('export_dir'):
+        # Imported only in export mode, pyarrow is an optional dependency
+        from tap_activecampaign.parquet_export import ParquetWriter
+        return ParquetWriter(config['export_dir'], batch_size=config.get('export_batch_size'))
+    if config and config.get('batch_dir'):
+        return BatchWriter(config['batch_dir'],
+                           batch_size=config.get('batch_size'),
+                           compression_level=config.get('batch_compression_level'))
+    if config:
+        queue_max_mb = float(config.get('output_queue_max_mb', OUTPUT_QUEUE_MAX_MB) or 0)
+        if queue_max_mb > 0:
+            return SingerWriter(queue_max_bytes=int(queue_max_mb * 1024 * 1024))
+    return WRITER
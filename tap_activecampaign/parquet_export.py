@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import uuid
+import singer
+from singer.utils import strptime_to_utc, now
+from tap_activecampaign.output import SingerWriter
+
+# pyarrow is optional: pip install tap-activecampaign[parquet]
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+LOGGER = singer.get_logger()
+
+EXPORT_BATCH_SIZE = 50000 # Records per Parquet row group
+
+
+def get_types(json_schema):
+    json_type = json_schema.get('type') or []
+    if isinstance(json_type, str):
+        json_type = [json_type]
+    return [value for value in json_type if value != 'null']
+
+def get_arrow_field(json_schema):
+    """
+    Return (arrow type, converter) for a JSON schema. The converter turns a transformed record
+    value into a value Arrow accepts for that type. Values without a single type (anyOf, mixed
+    types, objects without properties) are kept as JSON strings.
+    """
+    types = get_types(json_schema)
+    json_type = types[0] if len(types) == 1 and 'anyOf' not in json_schema else None
+
+    if json_type == 'integer':
+        return pyarrow.int64(), int
+    if json_type == 'number':
+        return pyarrow.float64(), float
+    if json_type == 'boolean':
+        return pyarrow.bool_(), bool
+    if json_type == 'string' and json_schema.get('format') == 'date-time':
+        return pyarrow.timestamp('us', tz='UTC'), strptime_to_utc
+    if json_type == 'string':
+        return pyarrow.string(), str
+    if json_type == 'array' and json_schema.get('items'):
+        item_type, item_converter = get_arrow_field(json_schema['items'])
+        return pyarrow.list_(item_type), \
+            lambda values: [None if value is None else item_converter(value) for value in values]
+    if json_type == 'object' and json_schema.get('properties'):
+        fields = {name: get_arrow_field(schema) for name, schema in json_schema['properties'].items()}
+        return pyarrow.struct([(name, arrow_type) for name, (arrow_type, _) in fields.items()]), \
+            lambda value: {name: None if value.get(name) is None else converter(value[name])
+                           for name, (_, converter) in fields.items()}
+    return pyarrow.string(), lambda value: value if isinstance(value, str) else json.dumps(value)
+
+def get_arrow_schema(json_schema):
+    """
+    Return the Arrow schema of a stream and the converter of each column, from its JSON schema.
+    """
+    fields = {name: get_arrow_field(schema) for name, schema in json_schema['properties'].items()}
+    arrow_schema = pyarrow.schema([(name, arrow_type) for name, (arrow_type, _) in fields.items()])
+    return arrow_schema, {name: converter for name, (_, converter) in fields.items()}
+
+
+class ParquetWriter(SingerWriter):
+    """
+    Export mode: writes the records of each stream to Parquet files in `export_dir`/<stream>/, in
+    row groups of `batch_size` records, with an Arrow schema built from the stream's JSON schema.
+    Each file covers one window between two states: the files with records are completed before
+    a STATE message is written to stdout, so bookmarks keep working as in the standard output.
+    """
+
+    record_lines = False
+
+    def __init__(self, export_dir, batch_size=None, out=None):
+        if pyarrow is None:
+            raise Exception('Parquet export requires pyarrow: pip install tap-activecampaign[parquet]')
+        super().__init__(out)
+        self.export_dir = export_dir
+        self.batch_size = int(batch_size or EXPORT_BATCH_SIZE)
+        # Per stream: (Arrow schema, column converters)
+        self.__schemas = {}
+        # Per stream: buffered records and the open pyarrow ParquetWriter
+        self.__buffers = {}
+        self.__files = {}
+        self.__lock = threading.RLock()
+
+    def write_schema(self, stream_name, schema, key_properties, bookmark_properties=None):
+        with self.__lock:
+            if stream_name not in self.__schemas:
+                self.__schemas[stream_name] = get_arrow_schema(schema)
+
+    def write_record(self, stream_name, record, time_extracted=None, line=None):
+        with self.__lock:
+            buffer = self.__buffers.setdefault(stream_name, [])
+            buffer.append(record)
+            if len(buffer) >= self.batch_size:
+                self.write_batch(stream_name)
+
+    def write_batch(self, stream_name):
+        """
+        Convert the buffered records of the stream to an Arrow record batch and write it as a row group.
+        """
+        with self.__lock:
+            records = self.__buffers.pop(stream_name, [])
+            if not records:
+                return
+            arrow_schema, converters = self.__schemas[stream_name]
+            columns = [[None if record.get(name) is None else converter(record[name]) for record in records]
+                       for name, converter in converters.items()]
+            batch = pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(columns, arrow_schema)],
+                schema=arrow_schema)
+
+            if stream_name not in self.__files:
+                directory = os.path.join(self.export_dir, stream_name)
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, '{}-{}-{}.parquet'.format(
+                    stream_name, now().strftime('%Y%m%dT%H%M%S'), uuid.uuid4().hex[:8]))
+                self.__files[stream_name] = pyarrow.parquet.ParquetWriter(path, arrow_schema)
+                LOGGER.info('Stream: {}, exporting to {}'.format(stream_name, path))
+            self.__files[stream_name].write_batch(batch)
+
+    def flush(self):
+        """
+        Write all buffered records and complete the open Parquet files.
+        """
+        with self.__lock:
+            for stream_name in list(self.__buffers):
+                self.write_batch(stream_name)
+            for stream_name in list(self.__files):
+                self.__files.pop(stream_name).close()
+
+    def write_state(self, state):
+        with self.__lock:
+            self.flush()
+            super().write_state(state)
+
+    def close(self):
+        self.flush()
+        super().close()
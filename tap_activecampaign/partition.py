@@ -0,0 +1,173 @@
+import argparse
+import json
+import sys
+import singer
+from singer.utils import strptime_to_utc
+from tap_activecampaign.budget import get_checkpoints, set_checkpoints
+
+LOGGER = singer.get_logger()
+
+# State key of the contacts shard checkpoints, see streams.Contacts.sync_shards
+SHARD_STATE_KEY = 'contacts_shards'
+# State key of the duration and record count of the last run of each stream, see plan.save_stream_run
+HISTORY_KEY = 'stream_history'
+# State key of the stream durations the partitions are balanced with, set by merge_states only, so all
+# partitions started from one state get the same assignment whatever their own runs add to the history
+DURATIONS_KEY = 'partition_durations'
+
+
+def parse_partition(value):
+    """
+    Parse a `--partition i/N` value into (i, N), with partitions numbered from 1 to N.
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('Partition must be i/N, e.g. 1/3: {}'.format(value)) from None
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError('Partition index must be between 1 and {}: {}'.format(count, value))
+    return index, count
+
+def get_partition_durations(state):
+    """
+    Return the stream durations the partitions are balanced with: those of the merged state the
+    partitions were started from, never the history of the partition's own runs.
+    """
+    return state.get(DURATIONS_KEY) or {}
+
+def get_partition_streams(stream_names, partition, shared_streams=(), durations=None):
+    """
+    Return the streams synced by the partition (i, N). Streams are assigned round-robin in name order,
+    so every tap process gets the same assignment from the same catalog. With `durations` (seconds
+    of the previous run per stream, see get_partition_durations), streams with a duration are instead
+    assigned longest first to the partition with the least total duration, so the partitions finish
+    at about the same time. `shared_streams` (streams sharded across the
+    partitions) are synced by every partition. Child streams are synced with their parent, so only
+    top level streams are passed.
+    """
+    index, count = partition
+    durations = durations or {}
+    assigned = sorted(name for name in stream_names if name not in shared_streams)
+
+    unknown = [name for name in assigned if name not in durations]
+    assignment = {name: position % count for position, name in enumerate(unknown)}
+    loads = [0.0] * count
+    for name in sorted((name for name in assigned if name in durations), key=lambda name: (-durations[name], name)):
+        target = min(range(count), key=lambda position: (loads[position], position))
+        loads[target] += durations[name]
+        assignment[name] = target
+
+    return [name for name in assigned if assignment[name] == index - 1] + \
+        [name for name in stream_names if name in shared_streams]
+
+def get_latest(values):
+    try:
+        return max(values, key=strptime_to_utc)
+    except (TypeError, ValueError):
+        # Not a datetime bookmark, keep the last one
+        return values[-1]
+
+def merge_shards(checkpoints):
+    """
+    Merge the contacts shard checkpoints of the partitions: per shard index the most advanced one.
+    Return None when the partitions planned different id ranges, so the sharded sync starts over.
+    """
+    plans = {(checkpoint['last_datetime'],
+              tuple((shard['index'], shard['id_greater'], shard['id_less']) for shard in checkpoint['shards']))
+             for checkpoint in checkpoints}
+    if len(plans) > 1:
+        LOGGER.warning('Partitions planned different {} id ranges, discarding the shard checkpoints'.format(
+            SHARD_STATE_KEY))
+        return None
+
+    shards = []
+    for shards_by_index in zip(*(checkpoint['shards'] for checkpoint in checkpoints)):
+        shards.append(max(shards_by_index, key=lambda shard: (shard['complete'], shard['last_id'])))
+    return {'last_datetime': checkpoints[0]['last_datetime'], 'shards': shards}
+
+def merge_states(states):
+    """
+    Combine the states of partitioned tap processes into one standard state: the latest bookmark per
+    stream, the fingerprints and the latest run history of all streams and, once all contacts shards
+    are complete, the contacts bookmark merged from the shards. The checkpoints of the streams stopped
+    by `max_runtime` are kept with a currently_syncing stream, so the next run resumes them. The durations of the merged history
+    balance the partitions of the next run. Raises an exception when the partitions were started from
+    different states: their stream assignments may differ, leaving streams synced twice or not at all.
+    """
+    if len({json.dumps(state.get(DURATIONS_KEY) or {}, sort_keys=True) for state in states}) > 1:
+        raise Exception('The partitions were started from different states and may have synced different '
+                        'stream assignments; start every partition with the same merged state')
+
+    bookmarks = {}
+    for state in states:
+        for stream_name, value in state.get('bookmarks', {}).items():
+            if value is not None:
+                bookmarks.setdefault(stream_name, []).append(value)
+
+    merged = {'bookmarks': {stream_name: get_latest(values) for stream_name, values in bookmarks.items()
+                            if stream_name != SHARD_STATE_KEY}}
+
+    if SHARD_STATE_KEY in bookmarks:
+        checkpoint = merge_shards(bookmarks[SHARD_STATE_KEY])
+        if checkpoint and all(shard['complete'] for shard in checkpoint['shards']):
+            merged['bookmarks']['contacts'] = get_latest(
+                [checkpoint['last_datetime']] + [shard['max_bookmark'] for shard in checkpoint['shards']])
+        elif checkpoint:
+            merged['bookmarks'][SHARD_STATE_KEY] = checkpoint
+
+    for state in states:
+        if 'fingerprints' in state:
+            merged.setdefault('fingerprints', {}).update(state['fingerprints'])
+        if 'fingerprint_runs' in state:
+            merged.setdefault('fingerprint_runs', {}).update(state['fingerprint_runs'])
+        # Latest run of each stream
+        for stream_name, run in state.get(HISTORY_KEY, {}).items():
+            history = merged.setdefault(HISTORY_KEY, {})
+            if stream_name not in history or \
+                    strptime_to_utc(run['synced_at']) > strptime_to_utc(history[stream_name]['synced_at']):
+                history[stream_name] = run
+        # Record keys at the bookmark, kept for the latest bookmark of each stream
+        for stream_name, ties in state.get('bookmark_ties', {}).items():
+            if ties.get('bookmark') == get_latest([ties.get('bookmark'), merged['bookmarks'].get(stream_name)]):
+                merged.setdefault('bookmark_ties', {})[stream_name] = ties
+
+    # Position of the streams stopped by the runtime budget, the most advanced one per stream
+    checkpoints = {}
+    for state in states:
+        for checkpoint in get_checkpoints(state):
+            previous = checkpoints.get(checkpoint['stream'])
+            if previous is None or checkpoint['offset'] > previous['offset']:
+                checkpoints[checkpoint['stream']] = checkpoint
+    set_checkpoints(merged, [checkpoints[stream_name] for stream_name in sorted(checkpoints)])
+    syncing = [state['currently_syncing'] for state in states if state.get('currently_syncing')]
+    if syncing:
+        # A stream with a checkpoint first, it is resumed first
+        merged['currently_syncing'] = next(
+            (stream_name for stream_name in syncing if stream_name in checkpoints), syncing[0])
+
+    if HISTORY_KEY in merged:
+        merged[DURATIONS_KEY] = {stream_name: run['seconds'] for stream_name, run in merged[HISTORY_KEY].items()}
+    return merged
+
+def merge_state_main():
+    """
+    Entry point of `tap-activecampaign-merge-state`: merge the state files of the partitions and write
+    the result to stdout or `--output`.
+    """
+    parser = argparse.ArgumentParser(description='Merge the state files of partitioned tap-activecampaign runs')
+    parser.add_argument('states', nargs='+', help='State files of the partitions')
+    parser.add_argument('-o', '--output', help='Output state file (default stdout)')
+    args = parser.parse_args()
+
+    states = []
+    for path in args.states:
+        with open(path) as file:
+            states.append(json.load(file))
+    merged = merge_states(states)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(merged, file, indent=2)
+    else:
+        json.dump(merged, sys.stdout, indent=2)
+        sys.stdout.write('\n')
@@ -0,0 +1,110 @@
+import itertools
+import threading
+import singer
+from tap_activecampaign.compiled_transform import CompileError, TransformMismatch, compile_transform
+
+LOGGER = singer.get_logger()
+
+PASSTHROUGH_SAMPLE_SIZE = 100 # First records of a stream transformed in full to find the conformant fields
+PASSTHROUGH_SAMPLE_EVERY = 100 # Then one record in this many is transformed in full and compared
+
+
+def is_unchanged(record, name, value):
+    return name in record and record[name].__class__ is value.__class__ and record[name] == value
+
+def get_unchanged_fields(record, transformed_record):
+    """
+    Return the class of each field of the transformed record with the same value and type as in the
+    record. Null values say nothing of the values to come: those fields are left out.
+    """
+    return {name: value.__class__ for name, value in transformed_record.items()
+            if value is not None and is_unchanged(record, name, value)}
+
+def get_changed_fields(record, transformed_record):
+    return {name for name, value in transformed_record.items() if not is_unchanged(record, name, value)}
+
+def is_same_record(record, transformed_record):
+    return record.keys() == transformed_record.keys() and \
+        not get_changed_fields(record, transformed_record)
+
+
+class PassthroughTransform:
+    """
+    Trusted passthrough of a stream whose API values mostly conform to its schema already. The first
+    `sample_size` records are transformed in full. A field is trusted when the sample has it
+    unchanged, with the same class, in at least one record and changed in none (a field that was
+    only null is not trusted). The next records are only projected on the selected fields: values
+    of trusted fields that have the sampled class are copied as they are, the other values are
+    converted. One record in `sample_every` is still transformed in full and compared, and on a
+    difference the stream falls back to the full transform.
+    """
+
+    def __init__(self, stream_name, schema, stream_metadata, full_transform,
+                 sample_size=PASSTHROUGH_SAMPLE_SIZE, sample_every=PASSTHROUGH_SAMPLE_EVERY):
+        self.stream_name = stream_name
+        self.schema = schema
+        self.stream_metadata = stream_metadata
+        # record -> transformed record, by the compiled transform or Transformer
+        self.full_transform = full_transform
+        self.sample_size = sample_size
+        self.sample_every = sample_every
+        # Numbers the records, next() is atomic
+        self.__counter = itertools.count(1)
+        # {field name: class} of the trusted fields, once the sample is complete
+        self.trusted_fields = None
+        # Class of the fields unchanged in the sample, and the fields changed in the sample
+        self.__sampled_classes = {}
+        self.__changed_fields = set()
+        # Set once the sample is complete
+        self.passthrough = None
+        self.disabled = False
+        self.__lock = threading.Lock()
+
+    def start_passthrough(self):
+        try:
+            self.passthrough = compile_transform(self.schema, self.stream_metadata,
+                                                 'passthrough_{}'.format(self.stream_name), self.trusted_fields)
+        except CompileError as err:
+            LOGGER.info('Stream: {}, no passthrough: {}'.format(self.stream_name, err))
+            self.disabled = True
+            return
+        LOGGER.info('Stream: {}, passthrough of fields: {}, converted fields: {}'.format(
+            self.stream_name,
+            ', '.join(sorted(self.trusted_fields)) or '-',
+            ', '.join(sorted(set(self.schema['properties']) - set(self.trusted_fields))) or '-'))
+
+    def sample(self, record, transformed_record):
+        self.__changed_fields.update(get_changed_fields(record, transformed_record))
+        for name, sampled_class in get_unchanged_fields(record, transformed_record).items():
+            if self.__sampled_classes.setdefault(name, sampled_class) is not sampled_class:
+                self.__changed_fields.add(name)
+
+    def transform(self, record):
+        count = next(self.__counter)
+        if self.passthrough is None and not self.disabled:
+            with self.__lock:
+                if self.passthrough is None and not self.disabled:
+                    # Sample record
+                    transformed_record = self.full_transform(record)
+                    self.sample(record, transformed_record)
+                    if count >= self.sample_size:
+                        self.trusted_fields = {name: sampled_class
+                                               for name, sampled_class in self.__sampled_classes.items()
+                                               if name not in self.__changed_fields}
+                        self.start_passthrough()
+                    return transformed_record
+
+        if self.disabled:
+            return self.full_transform(record)
+        try:
+            passthrough_record = self.passthrough(record)
+        except TransformMismatch:
+            return self.full_transform(record)
+        if count % self.sample_every == 0:
+            transformed_record = self.full_transform(record)
+            if not is_same_record(passthrough_record, transformed_record):
+                LOGGER.warning('Stream: {}, a sampled record differs from the passthrough, '
+                               'falling back to the full transform'.format(self.stream_name))
+                self.disabled = True
+                return transformed_record
+        return passthrough_record
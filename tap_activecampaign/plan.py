@@ -0,0 +1,104 @@
+import singer
+from singer import utils
+from tap_activecampaign.concurrency import map_with_limit
+from tap_activecampaign.partition import HISTORY_KEY
+from tap_activecampaign.streams import STREAMS, PAGE_LIMIT
+
+LOGGER = singer.get_logger()
+
+PREFLIGHT_WORKERS = 8 # Count requests in flight for a client without a concurrency limiter
+
+
+def save_stream_run(state, stream_name, seconds, records):
+    """
+    Keep the duration and the record count of a stream run in state['stream_history'].
+    """
+    state.setdefault(HISTORY_KEY, {})[stream_name] = {
+        'seconds': round(seconds, 1),
+        'records': records,
+        'synced_at': utils.strftime(utils.now())
+    }
+
+def get_stream_durations(state):
+    """
+    Return the seconds of the previous run of each stream in the stream history.
+    """
+    return {stream_name: run['seconds'] for stream_name, run in (state.get(HISTORY_KEY) or {}).items()}
+
+def get_longest_first(stream_names, costs):
+    """
+    Order the streams by cost, longest first (LPT); streams without a cost follow in their order.
+    """
+    known = [stream_name for stream_name in stream_names if costs.get(stream_name) is not None]
+    return sorted(known, key=lambda stream_name: costs[stream_name], reverse=True) + \
+        [stream_name for stream_name in stream_names if costs.get(stream_name) is None]
+
+def get_stream_total(client, stream_obj, state, start_date):
+    """
+    Return the number of records a sync of the stream pages through, from the `meta.total` of one
+    request with limit=1 and the same filters as the sync, including the bookmark filter.
+    """
+    params = {'offset': 0, 'limit': 1, **stream_obj.params}
+    if stream_obj.bookmark_query_field:
+        params[stream_obj.bookmark_query_field] = stream_obj.get_bookmark(state, stream_obj.stream_name, start_date)
+    querystring = '&'.join(['%s=%s' % (key, value) for (key, value) in params.items()])
+
+    data = client.get(path=stream_obj.path, params=querystring, endpoint=stream_obj.stream_name) or {}
+    total = int(data.get('meta', {}).get('total') or 0)
+    return total or len(data.get(stream_obj.data_key) or [])
+
+def get_plan(client, state, start_date, stream_names, selected_streams, rate_limit):
+    """
+    Preflight of a sync: count the records of the streams concurrently and estimate the requests
+    and the duration of each stream at `rate_limit` requests per second. Selected child streams
+    take at least one request per parent record. Streams are ordered longest first; streams that
+    could not be counted come last, in catalog order.
+    """
+    def count(stream_name):
+        stream_obj = STREAMS[stream_name](client)
+        try:
+            return get_stream_total(client, stream_obj, state, start_date)
+        except Exception as err: # pylint: disable=broad-except
+            LOGGER.warning('Stream: {}, preflight count failed: {}'.format(stream_name, repr(err)))
+            return None
+
+    totals = dict(zip(stream_names, map_with_limit(count, stream_names, getattr(client, 'limiter', None),
+                                                   PREFLIGHT_WORKERS)))
+
+    streams = {}
+    for stream_name in stream_names:
+        stream_class = STREAMS[stream_name]
+        total = totals[stream_name]
+        if total is None:
+            streams[stream_name] = {'total': None, 'requests': None, 'estimated_seconds': None}
+            continue
+        # Pages are requested until the offset passes the total, see ActiveCampaign.sync
+        requests = total // PAGE_LIMIT + 1
+        children = [child for child in stream_class.children if child in selected_streams]
+        requests = requests + total * len(children)
+        streams[stream_name] = {
+            'total': total,
+            # Without a query filter the total counts all records, not only the ones after the bookmark
+            'bookmark_filter': bool(stream_class.bookmark_query_field),
+            'children': children,
+            'requests': requests,
+            'estimated_seconds': round(requests / rate_limit, 1)
+        }
+
+    order = get_longest_first(stream_names, {name: stream['requests'] for name, stream in streams.items()})
+    requests = sum(stream['requests'] or 0 for stream in streams.values())
+    return {
+        'rate_limit': rate_limit,
+        'requests': requests,
+        'estimated_seconds': round(requests / rate_limit, 1),
+        'order': order,
+        'streams': streams
+    }
+
+def log_plan(plan):
+    for stream_name in plan['order']:
+        stream = plan['streams'][stream_name]
+        LOGGER.info('Plan: {}, records: {}, requests: {}, estimated seconds: {}'.format(
+            stream_name, stream['total'], stream['requests'], stream['estimated_seconds']))
+    LOGGER.info('Plan: {} requests, estimated {} seconds at {} requests per second'.format(
+        plan['requests'], plan['estimated_seconds'], plan['rate_limit']))
@@ -1,50 +1,135 @@
 import os
 import json
+import functools
 import singer
 from singer import metadata
-from tap_activecampaign.streams import flatten_streams
 
 LOGGER = singer.get_logger()
 
+# Precompiled schemas and standard metadata for every stream, generated from the
+# schemas/*.json files with `python -m tap_activecampaign.schema`.
+# Each stream entry is stored as a JSON string, so only the streams that are
+# requested get parsed. The stream classes (and the API client they import) are
+# only loaded to build the bundle or when it is missing.
+BUNDLE_FILE = 'catalog_bundle.json'
+
 # Reference:
 # https://github.com/singer-io/getting-started/blob/master/docs/DISCOVERY_MODE.md#Metadata
 
 def get_abs_path(path):
     return os.path.join(os.path.dirname(os.path.realpath(__file__)), path)
 
-def get_schemas():
-    schemas = {}
-    field_metadata = {}
+def get_stream_metadata(schema, stream_metadata):
+    """
+    Build the standard metadata of a stream from its schema and stream class attributes.
+    """
+    mdata = metadata.new()
+
+    # Documentation:
+    # https://github.com/singer-io/getting-started/blob/master/docs/DISCOVERY_MODE.md#singer-python-helper-functions
+    # Reference:
+    # https://github.com/singer-io/singer-python/blob/master/singer/metadata.py#L25-L44
+    mdata = metadata.get_standard_metadata(
+        schema=schema,
+        key_properties=stream_metadata.get('key_properties', None),
+        valid_replication_keys=stream_metadata.get('replication_keys', None),
+        replication_method=stream_metadata.get('replication_method', None)
+    )
+    mdata = metadata.to_map(mdata)
+    if stream_metadata.get('parent_tap_stream_id') != None:
+        mdata = metadata.write(mdata, (), 'parent-tap-stream-id', stream_metadata.get('parent_tap_stream_id'))
+    # Loop through all keys and make replication keys of automatic inclusion
+    for field_name in schema['properties'].keys():
+        automatic_keys = ((stream_metadata.get('replication_keys') or []) +
+                          (stream_metadata.get('additional_automatic_keys') or []))
+        if field_name in automatic_keys:
+            mdata = metadata.write(mdata, ('properties', field_name), 'inclusion', 'automatic')
+
+    return metadata.to_list(mdata)
 
-    flat_streams = flatten_streams()
-    for stream_name, stream_metadata in flat_streams.items():
+def compile_bundle():
+    """
+    Read every schema file and return the bundle content: {stream_name: JSON string of
+    {"schema", "metadata", "key_properties"}}.
+    """
+    from tap_activecampaign.streams import flatten_streams
+
+    bundle = {}
+    for stream_name, stream_metadata in flatten_streams().items():
         schema_path = get_abs_path('schemas/{}.json'.format(stream_name))
         with open(schema_path) as file:
             schema = json.load(file)
-        schemas[stream_name] = schema
-        mdata = metadata.new()
-
-        # Documentation:
-        # https://github.com/singer-io/getting-started/blob/master/docs/DISCOVERY_MODE.md#singer-python-helper-functions
-        # Reference:
-        # https://github.com/singer-io/singer-python/blob/master/singer/metadata.py#L25-L44
-        mdata = metadata.get_standard_metadata(
-            schema=schema,
-            key_properties=stream_metadata.get('key_properties', None),
-            valid_replication_keys=stream_metadata.get('replication_keys', None),
-            replication_method=stream_metadata.get('replication_method', None)
-        )
-        mdata = metadata.to_map(mdata)
-        if stream_metadata.get('parent_tap_stream_id') != None:
-            mdata = metadata.write(mdata, (), 'parent-tap-stream-id', stream_metadata.get('parent_tap_stream_id'))
-        # Loop through all keys and make replication keys of automatic inclusion
-        for field_name in schema['properties'].keys():
-            automatic_keys = ((stream_metadata.get('replication_keys') or []) +
-                              (stream_metadata.get('additional_automatic_keys') or []))
-            if field_name in automatic_keys:
-                mdata = metadata.write(mdata, ('properties', field_name), 'inclusion', 'automatic')
-
-        mdata = metadata.to_list(mdata)
-        field_metadata[stream_name] = mdata
+        bundle[stream_name] = json.dumps({
+            'schema': schema,
+            'metadata': get_stream_metadata(schema, stream_metadata),
+            'key_properties': stream_metadata.get('key_properties', None)
+        })
+    return bundle
+
+def write_bundle(path=None):
+    path = path or get_abs_path(BUNDLE_FILE)
+    with open(path, 'w') as file:
+        json.dump(compile_bundle(), file, indent=0)
+        file.write('\n')
+    LOGGER.info('Wrote catalog bundle: {}'.format(path))
+
+@functools.lru_cache(maxsize=None)
+def load_bundle():
+    """
+    Return the raw bundle (stream entries still serialized), or None when it is not present.
+    """
+    try:
+        with open(get_abs_path(BUNDLE_FILE)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        LOGGER.warning('Catalog bundle {} not found, reading schema files'.format(BUNDLE_FILE))
+        return None
+
+def get_stream_entry(stream_name):
+    """
+    Return {"schema", "metadata", "key_properties"} of a stream, from the bundle when available.
+    Every call returns a new copy, as catalog entries get modified by callers.
+    """
+    bundle = load_bundle()
+    if bundle is not None:
+        return json.loads(bundle[stream_name])
+
+    from tap_activecampaign.streams import flatten_streams
+
+    stream_metadata = flatten_streams()[stream_name]
+    with open(get_abs_path('schemas/{}.json'.format(stream_name))) as file:
+        schema = json.load(file)
+    return {
+        'schema': schema,
+        'metadata': get_stream_metadata(schema, stream_metadata),
+        'key_properties': stream_metadata.get('key_properties', None)
+    }
+
+def get_stream_names():
+    bundle = load_bundle()
+    if bundle is not None:
+        return list(bundle.keys())
+
+    from tap_activecampaign.streams import flatten_streams
+
+    return list(flatten_streams().keys())
+
+def get_schemas(stream_names=None):
+    """
+    Return the schemas and metadata of the requested streams (all streams by default).
+    """
+    schemas = {}
+    field_metadata = {}
+
+    for stream_name in stream_names or get_stream_names():
+        entry = get_stream_entry(stream_name)
+        schemas[stream_name] = entry['schema']
+        field_metadata[stream_name] = [
+            {'breadcrumb': tuple(mdata['breadcrumb']), 'metadata': mdata['metadata']}
+            for mdata in entry['metadata']]
 
     return schemas, field_metadata
+
+
+if __name__ == '__main__':
+    write_bundle()
@@ -1,10 +1,25 @@
+import threading
+import humps
 import singer
 from singer import metrics, metadata, Transformer, utils
 from singer.utils import strptime_to_utc
-from tap_activecampaign.transform import transform_json
+from tap_activecampaign.budget import RuntimeBudgetSpent, get_checkpoints, set_checkpoints
+from tap_activecampaign.compiled_transform import TransformMismatch, get_compiled_transform
+from tap_activecampaign.concurrency import map_with_limit
+from tap_activecampaign.datetimes import normalize_datetime
+from tap_activecampaign.passthrough import PassthroughTransform
+from tap_activecampaign.struct_decode import DecodedPage, get_struct_decoder
+from tap_activecampaign.transform import iter_transform_records, transform_records
 from tap_activecampaign.client import ActiveCampaignClient
+from tap_activecampaign.output import get_writer
 
 LOGGER = singer.get_logger()
+
+# Maximum number of record keys at the bookmark kept in the state, any others are re-emitted
+MAX_BOOKMARK_TIE_IDS = 10000
+# Records per API call, the maximum allowed by the API
+PAGE_LIMIT = 100
+
 # streams: API URL endpoints to be called
 # properties:
 #   <root node>: Plural stream name for the endpoint
@@ -17,6 +32,8 @@ LOGGER = singer.get_logger()
 #   data_key: JSON element containing the records for the endpoint
 #   bookmark_query_field: Typically a date-time field used for filtering the query
 #   bookmark_type: Data type for bookmark, integer or datetime
+#   descending_sort: Sort parameter of the replication key; pages are read newest first and paging stops
+#        at the bookmark once the API is seen to apply the sort (for streams without a bookmark_query_field)
 #   children: A collection of child endpoints (where the endpoint path includes the parent id)
 #   parent: On each of the children, the singular stream name for parent element
 
@@ -24,6 +41,8 @@ class ActiveCampaign:
     """
     A base class representing singer streams.
     :param client: The API client used to extract records from external source
+    :param fingerprints: Optional FingerprintStore used to write only new or changed FULL_TABLE records
+    :param writer: Writer of the Singer messages (see output.py), the shared stdout writer by default
     """
 
     stream_name = None
@@ -37,11 +56,40 @@ class ActiveCampaign:
     data_key = None
     created_timestamp = None
     bookmark_query_field = None
+    descending_sort = None
     links = []
     children = []
 
-    def __init__(self, client: ActiveCampaignClient = None):
+    def __init__(self, client: ActiveCampaignClient = None, fingerprints=None, writer=None, budget=None,
+                 pool=None, passthrough=False, struct_decoding=False):
         self.client = client
+        self.fingerprints = fingerprints
+        self.writer = writer or get_writer()
+        # Optional RuntimeBudget, a top level stream stops at a page boundary once it is spent
+        self.budget = budget
+        # Optional TransformPool (see workers.py), pages are then transformed in its worker processes
+        self.pool = pool
+        # Copy the values that conform to the schema without conversion (see passthrough.PassthroughTransform)
+        self.passthrough = passthrough
+        self.__passthrough_transforms = {}
+        # Decode the pages to typed structs (see struct_decode.StructDecoder), built at the first page
+        self.struct_decoding = struct_decoding
+        self.__struct_decoder = None
+        # Guards the passthrough transforms and the struct decoder, built on first use
+        self.__transforms_lock = threading.Lock()
+        # Schema dict and metadata map per stream name, derived once from the catalog
+        self.__catalog_cache = {}
+        # Replication values of the records of the last page read by get_and_transform_records
+        self.page_bookmarks = []
+        # (querystring, data, time_extracted) of the next page, fetched while a TransformPool transforms a page
+        self.__next_page = None
+        # Records written at the highest bookmark (see start_bookmark_ties)
+        self.__tie_bookmark = None
+        self.__tie_ids = set()
+        # Records written by the previous run at the saved bookmark
+        self.__skip_bookmark = None
+        self.__skip_ids = set()
+        self.__tie_lock = threading.Lock()
 
     def write_schema(self, catalog, stream_name):
         """ 
@@ -55,18 +103,18 @@ class ActiveCampaign:
             # schema = {'properties': {'id': {'type': 'integer'}, 'email': {'type': 'string'}}}
             # key_properties = ['id']
             # write_schema(stream, schema, key_properties)
-            singer.write_schema(stream_name, schema, stream.key_properties)
+            self.writer.write_schema(stream_name, schema, stream.key_properties)
         except OSError as err:
             LOGGER.error('OS Error while writing schema for: {}'.format(stream_name))
             raise err
         
-    def write_record(self, stream_name, record, time_extracted):
+    def write_record(self, stream_name, record, time_extracted, line=None):
         """
-        Write a single record for the given stream.
+        Write a single record for the given stream, `line` being its RECORD message when already serialized.
         Example: write_record("users", {"id": 2, "email": "mike@stitchdata.com"})
         """
         try:
-            singer.messages.write_record(stream_name, record, time_extracted=time_extracted)
+            self.writer.write_record(stream_name, record, time_extracted=time_extracted, line=line)
         except OSError as err:
             LOGGER.error('OS Error while writing record for: {}'.format(stream_name))
             LOGGER.error('Stream: {}, record: {}'.format(stream_name, record))
@@ -96,15 +144,250 @@ class ActiveCampaign:
             state['bookmarks'] = {}
         state['bookmarks'][stream] = value
         LOGGER.info('Write state for stream: {}, value: {}'.format(stream, value))
-        singer.write_state(state)
+        self.writer.write_state(state)
+
+    def get_checkpoint(self, state):
+        """
+        Return the checkpoint of the stream if its last run was stopped by the runtime budget.
+        """
+        return next((checkpoint for checkpoint in get_checkpoints(state)
+                     if checkpoint.get('stream') == self.stream_name), None)
+
+    def clear_checkpoint(self, state):
+        set_checkpoints(state, [checkpoint for checkpoint in get_checkpoints(state)
+                                if checkpoint.get('stream') != self.stream_name])
+
+    def save_checkpoint(self, state, offset, last_datetime, max_bookmark_value):
+        """
+        Write the position of the stream to the state and stop the sync. The next run resumes at the
+        same offset with the same bookmark filter, and carries on with the running bookmark.
+        """
+        self.clear_checkpoint(state)
+        set_checkpoints(state, get_checkpoints(state) + [{
+            'stream': self.stream_name,
+            'offset': offset,
+            'last_datetime': last_datetime,
+            'max_bookmark': max_bookmark_value
+        }])
+        self.writer.write_state(state)
+        LOGGER.info('Stream: {}, runtime budget spent, checkpoint at offset {}'.format(self.stream_name, offset))
+        raise RuntimeBudgetSpent(self.stream_name)
+
+    def get_record_key(self, record):
+        return '|'.join(str(record.get(key)) for key in self.key_properties)
+
+    def start_bookmark_ties(self, state, last_datetime):
+        """
+        Load the keys of the records written at the saved bookmark by the previous run. Records with
+        the same key and a replication value equal to the bookmark are unchanged and are skipped.
+        """
+        ties = state.get('bookmark_ties', {}).get(self.stream_name) or {}
+        with self.__tie_lock:
+            self.__tie_bookmark = self.__skip_bookmark = self.transform_datetime(last_datetime)
+            self.__skip_ids = set(ties.get('ids') or []) if ties.get('bookmark') == self.__skip_bookmark else set()
+            self.__tie_ids = set(self.__skip_ids)
+
+    def is_bookmark_tie(self, bookmark_dttm, record):
+        """
+        Return True if the record was already written by the previous run at the same bookmark. The
+        saved bookmark is compared, not the highest bookmark of this run: a record written at the saved
+        bookmark and since updated to a newer one is written again.
+        """
+        return bool(self.__skip_ids) and bookmark_dttm == self.__skip_bookmark and \
+            self.get_record_key(record) in self.__skip_ids
+
+    def track_bookmark_tie(self, bookmark_dttm, record):
+        if self.__tie_bookmark is None:
+            return
+        with self.__tie_lock:
+            if bookmark_dttm > self.__tie_bookmark:
+                self.__tie_bookmark = bookmark_dttm
+                self.__tie_ids = set()
+            if bookmark_dttm == self.__tie_bookmark:
+                self.__tie_ids.add(self.get_record_key(record))
+
+    def save_bookmark_ties(self, state):
+        """
+        Keep the keys of the records written at the new bookmark (at most MAX_BOOKMARK_TIE_IDS) in
+        state['bookmark_ties'], before the bookmark itself is written.
+        """
+        with self.__tie_lock:
+            if self.__tie_bookmark is None:
+                return
+            if not self.__tie_ids:
+                state.get('bookmark_ties', {}).pop(self.stream_name, None)
+                return
+            state.setdefault('bookmark_ties', {})[self.stream_name] = {
+                'bookmark': self.__tie_bookmark,
+                'ids': sorted(self.__tie_ids)[:MAX_BOOKMARK_TIE_IDS]
+            }
+
+    @staticmethod
+    def get_oldest_in_order(page_bookmarks, previous_oldest=None):
+        """
+        Return the oldest replication value of a page read newest first, after the oldest value of
+        the previous pages. Return None if the values are not in descending order.
+        """
+        values = [strptime_to_utc(value) for value in page_bookmarks if value]
+        if previous_oldest is not None:
+            values.insert(0, previous_oldest)
+        if any(newer < older for newer, older in zip(values, values[1:])):
+            return None
+        return values[-1] if values else previous_oldest
+
+    def get_first_bookmark(self, path, params, bookmark_field, order):
+        """
+        Return the replication value of the first record of the stream sorted in `order` (ASC or DESC)
+        by descending_sort, or None (one request with limit=1).
+        """
+        params = {**params, 'offset': 0, 'limit': 1, self.descending_sort: order}
+        querystring = '&'.join(['%s=%s' % (key, value) for (key, value) in params.items()])
+        data = self.client.get(path=path, params=querystring, endpoint=self.stream_name)
+        records = self.transform_data(data) if data else []
+        if not records:
+            return None
+        bookmark_value = records[0].get(bookmark_field) or \
+            (records[0].get(self.created_timestamp) if self.created_timestamp else None)
+        return strptime_to_utc(bookmark_value) if bookmark_value else None
+
+    def is_sorted_newest_first(self, path, params, bookmark_field):
+        """
+        Return True if the API applies descending_sort: the newest first record must be strictly newer
+        than the oldest first record, an API ignoring the sort returns the same record for both.
+        """
+        newest = self.get_first_bookmark(path, params, bookmark_field, 'DESC')
+        oldest = self.get_first_bookmark(path, params, bookmark_field, 'ASC')
+        return newest is not None and oldest is not None and newest > oldest
 
     def transform_datetime(self, this_dttm):
         """
         Transform the datetime to standard datetime format "%Y-%m%dT%H:%M:%S.000000Z"
         """
+        return normalize_datetime(this_dttm)
+
+    def get_schema_and_metadata(self, catalog, stream_name):
+        """
+        Return the schema dict and metadata map of the stream, derived from the catalog only once.
+        """
+        if stream_name not in self.__catalog_cache:
+            stream = catalog.get_stream(stream_name)
+            self.__catalog_cache[stream_name] = (stream.schema.to_dict(), metadata.to_map(stream.metadata))
+        return self.__catalog_cache[stream_name]
+
+    def transform_record(self, stream_name, record, schema, stream_metadata, compiled_transform=None):
+        """
+        Transform a record with the compiled transform of the stream, or with singer's Transformer when
+        the schema is not compiled or the record does not match it (Transformer reports the errors).
+        """
+        if compiled_transform:
+            try:
+                return compiled_transform(record)
+            except TransformMismatch:
+                pass
+
         with Transformer() as transformer:
-            new_dttm = transformer._transform_datetime(this_dttm)
-        return new_dttm
+            try:
+                return transformer.transform(record, schema, stream_metadata)
+            except Exception as err:
+                LOGGER.error('Transformer Error: {}'.format(err))
+                LOGGER.error('Stream: {}, record: {}'.format(stream_name, record))
+                raise err
+
+    @staticmethod
+    def iter_with_parent_id(records, parent, parent_id):
+        # If child object, add parent_id to record
+        for record in records:
+            record[parent + '_id'] = parent_id
+            yield record
+
+    def iter_transformed_records(self, stream_name, records, schema, stream_metadata, parent=None, parent_id=None):
+        """
+        Transform the records of a page for Singer.io, one at a time as they are consumed.
+        """
+        if parent_id and parent:
+            records = self.iter_with_parent_id(records, parent, parent_id)
+        if self.passthrough:
+            return map(self.get_passthrough_transform(stream_name, schema, stream_metadata).transform, records)
+        compiled_transform = get_compiled_transform(stream_name, schema, stream_metadata)
+        return (self.transform_record(stream_name, record, schema, stream_metadata, compiled_transform)
+                for record in records)
+
+    def transform_records(self, stream_name, records, schema, stream_metadata, parent=None, parent_id=None):
+        """
+        Transform a page of records for Singer.io.
+        """
+        return list(self.iter_transformed_records(stream_name, records, schema, stream_metadata, parent, parent_id))
+
+    def get_passthrough_transform(self, stream_name, schema, stream_metadata):
+        """
+        Return the passthrough of the stream, which keeps its sample across the pages of the sync.
+        """
+        with self.__transforms_lock:
+            if stream_name not in self.__passthrough_transforms:
+                compiled_transform = get_compiled_transform(stream_name, schema, stream_metadata)
+                self.__passthrough_transforms[stream_name] = PassthroughTransform(
+                    stream_name, schema, stream_metadata,
+                    lambda record: self.transform_record(stream_name, record, schema, stream_metadata,
+                                                         compiled_transform))
+            return self.__passthrough_transforms[stream_name]
+
+    def get_page(self, catalog, path, querystring):
+        """
+        Request a page of the stream, decoded by the struct decoder of the stream when enabled.
+        """
+        if self.struct_decoding and self.data_key:
+            with self.__transforms_lock:
+                if self.__struct_decoder is None:
+                    schema, stream_metadata = self.get_schema_and_metadata(catalog, self.stream_name)
+                    self.__struct_decoder = get_struct_decoder(
+                        self.stream_name, self.data_key, schema, stream_metadata) or False
+            if self.__struct_decoder:
+                return self.client.get(path=path, params=querystring, endpoint=self.stream_name,
+                                       decoder=self.__struct_decoder)
+        return self.client.get(path=path, params=querystring, endpoint=self.stream_name)
+
+    def fetch_page(self, catalog, path, querystring):
+        """
+        Return (querystring, data, time_extracted) of a page, time_extracted being the datetime when the
+        data was extracted from the API.
+        """
+        data = self.get_page(catalog, path, querystring)
+        return querystring, data, utils.now()
+
+    def prefetch_page(self, catalog, path, querystring):
+        self.__next_page = self.fetch_page(catalog, path, querystring)
+
+    def get_prefetched_page(self, querystring):
+        """
+        Return (querystring, data, time_extracted) of the page fetched ahead for the querystring, or None.
+        """
+        next_page, self.__next_page = self.__next_page, None
+        return next_page if next_page and next_page[0] == querystring else None
+
+    def get_page_records(self, data, time_extracted, parent=None, parent_id=None, prefetch=None):
+        """
+        Return the records of an API page with, when the page is transformed by the TransformPool
+        or decoded to structs, their transformed records and serialized RECORD messages (None otherwise).
+        The records are otherwise an iterator, each record is decamelized, fixed and prepared as it is
+        consumed by process_records, once the keys of all records of the page are verified. With the TransformPool, `prefetch()` (e.g. the request of the next
+        page) is called while the page is transformed in a worker process.
+        """
+        if not data:
+            return [], None, None
+        if isinstance(data, DecodedPage):
+            records = list(self.iter_prepared_records(data[self.data_key]))
+            return records, [self.__struct_decoder.project_record(record) for record in records], None
+        if self.pool:
+            future = self.pool.submit_page(
+                self.stream_name, data, time_extracted, parent, parent_id, self.passthrough)
+            if prefetch:
+                prefetch()
+            records, transformed_records, lines = future.result()
+            return list(self.iter_prepared_records(records)), transformed_records, lines
+        records = self.get_raw_records(data)
+        # The records are written as they are transformed: verify the keys of the whole page first
+        self.verify_page_keys(records)
+        return self.iter_prepared_records(iter_transform_records(records)), None, None
 
     def process_records(self,
                         catalog, #pylint: disable=too-many-branches
@@ -115,7 +398,9 @@ class ActiveCampaign:
                         max_bookmark_value=None,
                         last_datetime=None,
                         parent=None,
-                        parent_id=None):
+                        parent_id=None,
+                        transformed_records=None,
+                        lines=None):
         """
         This function perform following operation,
         • Transform all the records
@@ -124,49 +409,46 @@ class ActiveCampaign:
         • Write all records for FULL_TABLE stream
         • Return updated maximum bookmark value and total count of records
         """
-        stream = catalog.get_stream(stream_name)
-        schema = stream.schema.to_dict()
-        stream_metadata = metadata.to_map(stream.metadata)
+        # Records transformed (and lines serialized) by the TransformPool are only filtered and written
+        if transformed_records is None:
+            schema, stream_metadata = self.get_schema_and_metadata(catalog, stream_name)
+            transformed_records = self.iter_transformed_records(
+                stream_name, records, schema, stream_metadata, parent, parent_id)
 
         with metrics.record_counter(stream_name) as counter:
-            for record in records:
-                # If child object, add parent_id to record
-                if parent_id and parent:
-                    record[parent + '_id'] = parent_id
-
-                # Transform record for Singer.io
-                with Transformer() as transformer:
-                    try:
-                        transformed_record = transformer.transform(
-                            record,
-                            schema,
-                            stream_metadata)
-                    except Exception as err:
-                        LOGGER.error('Transformer Error: {}'.format(err))
-                        LOGGER.error('Stream: {}, record: {}'.format(stream_name, record))
-                        raise err
-
-                    # Reset max_bookmark_value to new value if higher
-                    if transformed_record.get(bookmark_field):
-                        if max_bookmark_value is None or \
-                            transformed_record[bookmark_field] > self.transform_datetime(max_bookmark_value):
-                            max_bookmark_value = transformed_record[bookmark_field]
-
-                    # If bookmark_field is not none that means stream is incremental.
-                    # So, in that case, the tap writes only those records of which the replication key value is greater than last saved bookmark key value
-                    # For, FULL_TABLE stream bookmark_field is none. So, in the `else` part it writes all records for the FULL_TABLE stream
-                    if bookmark_field and (bookmark_field in transformed_record):
-                        last_dttm = self.transform_datetime(last_datetime)
-                        bookmark_dttm = self.transform_datetime(transformed_record[bookmark_field])
-                        # Keep only records whose bookmark is after the last_datetime
-                        if bookmark_dttm:
-                            if bookmark_dttm >= last_dttm:
-                                self.write_record(stream_name, transformed_record, \
-                                    time_extracted=time_extracted)
-                                counter.increment()
-                    else:
-                        self.write_record(stream_name, transformed_record, time_extracted=time_extracted)
-                        counter.increment()
+            for index, transformed_record in enumerate(transformed_records):
+                line = lines[index] if lines else None
+
+                # Reset max_bookmark_value to new value if higher
+                if transformed_record.get(bookmark_field):
+                    if max_bookmark_value is None or \
+                        transformed_record[bookmark_field] > self.transform_datetime(max_bookmark_value):
+                        max_bookmark_value = transformed_record[bookmark_field]
+
+                # If bookmark_field is not none that means stream is incremental.
+                # So, in that case, the tap writes only those records of which the replication key value is greater than last saved bookmark key value
+                # For, FULL_TABLE stream bookmark_field is none. So, in the `else` part it writes all records for the FULL_TABLE stream
+                if bookmark_field and (bookmark_field in transformed_record):
+                    last_dttm = self.transform_datetime(last_datetime)
+                    bookmark_dttm = self.transform_datetime(transformed_record[bookmark_field])
+                    # Keep only records whose bookmark is after the last_datetime
+                    if bookmark_dttm:
+                        if bookmark_dttm >= last_dttm:
+                            # Skip records already written at the same bookmark by the previous run
+                            if not parent and self.is_bookmark_tie(bookmark_dttm, transformed_record):
+                                continue
+                            self.write_record(stream_name, transformed_record, \
+                                time_extracted=time_extracted, line=line)
+                            counter.increment()
+                            if not parent:
+                                self.track_bookmark_tie(bookmark_dttm, transformed_record)
+                elif not bookmark_field and self.fingerprints and not parent and \
+                    not self.fingerprints.is_changed(stream_name, transformed_record, self.key_properties):
+                    # FULL_TABLE record unchanged since the previous run
+                    continue
+                else:
+                    self.write_record(stream_name, transformed_record, time_extracted=time_extracted, line=line)
+                    counter.increment()
 
             # return maximum bookmark value and total no of records
             return max_bookmark_value, counter.value
@@ -193,22 +475,38 @@ class ActiveCampaign:
 
         last_datetime = self.get_bookmark(state, self.stream_name, start_date)
         max_bookmark_value = last_datetime
+        checkpoint = None if parent else self.get_checkpoint(state)
+        if checkpoint:
+            # Resume where the runtime budget stopped the previous run
+            last_datetime = checkpoint['last_datetime']
+            max_bookmark_value = checkpoint['max_bookmark']
         LOGGER.info('stream: {}, bookmark_field: {}, last_datetime: {}'.format(
             self.stream_name, bookmark_field, last_datetime))
+        if bookmark_field and not parent:
+            self.start_bookmark_ties(state, last_datetime)
         now_datetime = utils.now()
         last_dttm = strptime_to_utc(last_datetime)
         endpoint_total = 0
 
+        # Without a server-side filter, read the newest records first and stop at the bookmark
+        descending = bool(self.descending_sort and bookmark_field and not bookmark_query_field and not parent)
+        oldest_dttm = None
+
         # pagination: loop thru all pages of data
         # Pagination reference: https://developers.activecampaign.com/reference#pagination
         # Each page has an offset (starting value) and a limit (batch size, number of records)
         # Increase the "offset" by the "limit" for each batch.
         # Continue until the "record_count" returned < "limit" is null/zero or 
         offset = 0 # Starting offset value for each batch API call
-        limit = 100 # Batch size; Number of records per API call; Max = 100
+        limit = PAGE_LIMIT # Batch size; Number of records per API call; Max = 100
         total_records = 0 # Initialize total
         record_count = limit # Initialize, reset for each API call
         page = 1
+        if checkpoint:
+            offset = total_records = checkpoint['offset']
+            page = offset // limit + 1
+            LOGGER.info('Stream: {}, resuming from checkpoint at offset {}'.format(self.stream_name, offset))
+        self.__next_page = None
 
         while offset <= total_records: # break out of loop when record_count < limit (or not data returned)
             params = {
@@ -219,11 +517,19 @@ class ActiveCampaign:
 
             if bookmark_query_field:
                 params[bookmark_query_field] = last_datetime
+            if descending:
+                params[self.descending_sort] = 'DESC'
 
             # Need URL querystring for 1st page; subsequent pages provided by next_url
             # querystring: Squash query params into string
             querystring = None
             querystring = '&'.join(['%s=%s' % (key, value) for (key, value) in params.items()])
+            # With a TransformPool, the next page is fetched while this one is transformed (not for a
+            # descending scan, which may stop at this page)
+            next_querystring = None
+            if self.pool and not descending:
+                next_querystring = '&'.join(['%s=%s' % (key, value)
+                                             for (key, value) in dict(params, offset=offset + limit).items()])
 
             LOGGER.info('URL for Stream {}: {}{}{}'.format(
                 self.stream_name,
@@ -234,44 +540,64 @@ class ActiveCampaign:
             # API request data
             endpoint_total, total_records, record_count, page, offset, max_bookmark_value = self.get_and_transform_records(
                                 querystring, path, max_bookmark_value, state, catalog, start_date, last_datetime, endpoint_total, 
-                                  limit, total_records, record_count, page, offset, parent, parent_id, selected_streams)
+                                  limit, total_records, record_count, page, offset, parent, parent_id, selected_streams,
+                                  next_querystring)
+
+            if descending:
+                oldest_dttm = self.get_oldest_in_order(self.page_bookmarks, oldest_dttm)
+                if oldest_dttm is None:
+                    # The sort is not applied by the API: read all pages, records are still filtered by bookmark
+                    LOGGER.warning('Stream: {}, records are not sorted by {} newest first, reading all pages'.format(
+                        self.stream_name, bookmark_field))
+                    descending = False
+                elif oldest_dttm < last_dttm:
+                    # The order of a page can match by chance (e.g. records sharing a timestamp), the sort
+                    # is confirmed before the newer records of the next pages are left unread
+                    if not self.is_sorted_newest_first(path, static_params, bookmark_field):
+                        LOGGER.warning('Stream: {}, the API does not apply {}, reading all pages'.format(
+                            self.stream_name, self.descending_sort))
+                        descending = False
+                    else:
+                        LOGGER.info('Stream: {}, page {} reached records older than the bookmark, stopping'.format(
+                            self.stream_name, page - 1))
+                        break
+
+            if self.budget and not parent and offset <= total_records and self.budget.is_spent():
+                self.save_checkpoint(state, offset, last_datetime, max_bookmark_value)
 
         # Update the state with the max_bookmark_value for the endpoint
         # ActiveCampaign API does not allow page/batch sorting; bookmark written for endpoint
+        if checkpoint:
+            self.clear_checkpoint(state)
         if bookmark_field:
+            if not parent:
+                self.save_bookmark_ties(state)
             self.write_bookmark(state, self.stream_name, max_bookmark_value)
+        elif self.fingerprints and not parent and not checkpoint:
+            # All records of the FULL_TABLE stream were seen, keep their fingerprints for the next run
+            # (after a checkpoint, the records before it were seen by the previous run only)
+            self.fingerprints.finish_stream(self.stream_name)
 
         # Return total_records (for all pages and date windows)
         return endpoint_total
 
-    def transform_data(self, data):
+    def get_raw_records(self, data):
         """
-        Transform data with transform_json from transform.py
+        Return the records of an API response as sent, without copying them.
         """
-        data_key = self.data_key
-        
         # The data_key identifies the array/list of records below the <root> element
-        transformed_data = [] # initialize the record list
-        data_list = []
-        data_dict = {}
-        if data_key in data:
-            if isinstance(data[data_key], list):
-                transformed_data = transform_json(data, self.stream_name, data_key)
-            elif isinstance(data[data_key], dict):
-                data_list.append(data[data_key])
-                data_dict[data_key] = data_list
-                transformed_data = transform_json(data_dict, self.stream_name, data_key)
-        else: # data_key not in data
-            if isinstance(data, list):
-                data_list = data
-                data_dict[data_key] = data_list
-                transformed_data = transform_json(data_dict, self.stream_name, data_key)
-            elif isinstance(data, dict):
-                data_list.append(data)
-                data_dict[data_key] = data_list
-                transformed_data = transform_json(data_dict, self.stream_name, data_key)
-        
-        return transformed_data
+        records = data[self.data_key] if isinstance(data, dict) and self.data_key in data else data
+        if isinstance(records, list):
+            return records
+        if isinstance(records, dict):
+            return [records]
+        return []
+
+    def transform_data(self, data):
+        """
+        Transform data with transform_records from transform.py
+        """
+        return transform_records(self.get_raw_records(data))
 
     def sync_child_stream(self, children, transformed_data, catalog, state, start_date, selected_streams):
         """
@@ -282,7 +608,7 @@ class ActiveCampaign:
         for child_stream_name in children:
             if child_stream_name in selected_streams:
                 LOGGER.info('START Syncing: {}'.format(child_stream_name))
-                child_stream_obj = STREAMS[child_stream_name](self.client)
+                child_stream_obj = STREAMS[child_stream_name](self.client, writer=self.writer, pool=self.pool)
                 child_stream_obj.write_schema(catalog, child_stream_name)
                 parent_id_field = None
                 # For each parent record
@@ -322,52 +648,88 @@ class ActiveCampaign:
             # End child streams for parent
         # End if children
 
+    def prepare_record(self, record, bookmark_field):
+        """
+        Fill a missing replication key from the created timestamp and verify the key fields of the record.
+        """
+        # Some endpoints update date is null upon creation
+        if bookmark_field:
+            created_value = None
+            if self.created_timestamp:
+                created_value = record.get(self.created_timestamp)
+            bookmark_value = record.get(bookmark_field)
+            if not bookmark_value:
+                record[bookmark_field] = created_value
+        # Verify key id_fields are present
+        for key in self.key_properties:
+            if not record.get(key):
+                LOGGER.error('Stream: {}, Missing key {} in record: {}'.format(
+                    self.stream_name, key, record))
+                raise RuntimeError
+
+    def verify_page_keys(self, records):
+        """
+        Verify the key fields of the API records of a page, before any of them is written. The records
+        are not decamelized yet, the keys are looked up by their snake_case and camelCase names.
+        """
+        key_names = [(key, humps.camelize(key)) for key in self.key_properties]
+        for record in records:
+            for key, api_key in key_names:
+                if not (record.get(key) or record.get(api_key)):
+                    LOGGER.error('Stream: {}, Missing key {} in record: {}'.format(
+                        self.stream_name, key, record))
+                    raise RuntimeError
+
+    def prepare_records(self, transformed_data):
+        bookmark_field = next(iter(self.replication_keys or []), None)
+        for record in transformed_data:
+            self.prepare_record(record, bookmark_field)
+
+    def iter_prepared_records(self, records):
+        """
+        Prepare the records of a page as they are consumed, keeping their replication values in page_bookmarks.
+        """
+        bookmark_field = next(iter(self.replication_keys or []), None)
+        self.page_bookmarks = page_bookmarks = []
+        for record in records:
+            self.prepare_record(record, bookmark_field)
+            if bookmark_field:
+                page_bookmarks.append(record.get(bookmark_field))
+            yield record
+
     def get_and_transform_records(self, querystring, path, max_bookmark_value, state, catalog, start_date, last_datetime, endpoint_total, 
-                                  limit, total_records, record_count, page, offset, parent, parent_id, selected_streams):
+                                  limit, total_records, record_count, page, offset, parent, parent_id, selected_streams,
+                                  next_querystring=None):
         
         """
-        Get the records using the client get request and transform it using transform_records
+        Get the records using the client get request and transform it using transform_records.
+        The page of `next_querystring`, if any, is fetched ahead while a TransformPool transforms this one.
         """
         
         bookmark_field = next(iter(self.replication_keys or []), None)
-        created_timestamp_field = self.created_timestamp
-        id_fields = self.key_properties
 
         # API request data
+        self.page_bookmarks = []
         data = {}
-        data = self.client.get(
-            path=path,
-            params=querystring,
-            endpoint=self.stream_name)
-        
-        # time_extracted: datetime when the data was extracted from the API
-        time_extracted = utils.now()
+        _, data, time_extracted = self.get_prefetched_page(querystring) or \
+            self.fetch_page(catalog, path, querystring)
         
         if not data or data is None or data == {}:
             LOGGER.info('No data for URL {}{}{}'.format(self.client.base_url, path, querystring)) # No data results
         else: # has data
-            transformed_data = self.transform_data(data)
-            
-            if not transformed_data or transformed_data is None:
+            if not self.get_raw_records(data):
                 LOGGER.info('No transformed data for data = {}'.format(data)) # No data results
 
-            i = 0
-            for record in transformed_data:
-                # Some endpoints update date is null upon creation
-                if bookmark_field:
-                    created_value = None
-                    if created_timestamp_field:
-                        created_value = record.get(created_timestamp_field)
-                    bookmark_value = record.get(bookmark_field)
-                    if not bookmark_value:
-                        transformed_data[i][bookmark_field] = created_value
-                # Verify key id_fields are present
-                for key in id_fields:
-                    if not record.get(key):
-                        LOGGER.error('Stream: {}, Missing key {} in record: {}'.format(
-                            self.stream_name, key, record))
-                        raise RuntimeError
-                i = i + 1
+            prefetch = None
+            if next_querystring and isinstance(data, dict) and \
+                    offset + limit <= int(data.get('meta', {}).get('total') or 0):
+                prefetch = lambda: self.prefetch_page(catalog, path, next_querystring)
+            transformed_data, transformed_records, lines = self.get_page_records(
+                data, time_extracted, parent, parent_id, prefetch)
+            children = self.children
+            if children:
+                # The records are read again to sync the children
+                transformed_data = list(transformed_data)
         
             # Process records and get the max_bookmark_value and record_count for the set of records
             max_bookmark_value, record_count = self.process_records(
@@ -379,14 +741,14 @@ class ActiveCampaign:
                 max_bookmark_value=max_bookmark_value,
                 last_datetime=last_datetime,
                 parent=parent,
-                parent_id=parent_id)
+                parent_id=parent_id,
+                transformed_records=transformed_records,
+                lines=lines)
             LOGGER.info('Stream {}, batch processed {} records'.format(
                 self.stream_name, record_count))
             endpoint_total = endpoint_total + record_count
 
             # Loop thru parent batch records for each children objects (if should stream)
-            children = self.children
-
             if children:
                 # sync child stream
                 self.sync_child_stream(children, transformed_data, catalog, state, start_date, selected_streams)
@@ -543,6 +905,152 @@ class Contacts(ActiveCampaign):
     created_timestamp = 'created_timestamp'
     bookmark_query_field = 'filters[updated_after]'
     links = ['contactGoals', 'contactLogs', 'geoIps', 'trackingLogs']
+    # State key of the id-range shard checkpoints while a sharded sync is in progress
+    shard_state_key = 'contacts_shards'
+    # With partitions, shard bounds are rounded to this many ids, so that tap processes started
+    # independently compute the same ranges
+    shard_id_alignment = 1000
+
+    def __init__(self, client: ActiveCampaignClient = None, fingerprints=None, writer=None, budget=None,
+                 pool=None, passthrough=False, struct_decoding=False):
+        super().__init__(client, fingerprints=fingerprints, writer=writer, budget=budget, pool=pool,
+                         passthrough=passthrough, struct_decoding=struct_decoding)
+        # Shard checkpoints are updated and written to the state from several threads
+        self.__state_lock = threading.Lock()
+
+    def get_first_id(self, path, params):
+        querystring = '&'.join(['%s=%s' % (key, value) for (key, value) in params.items()])
+        data = self.client.get(path=path, params=querystring, endpoint=self.stream_name)
+        records = (data or {}).get(self.data_key) or []
+        return int(records[0]['id']) if records else None
+
+    def get_shards(self, path, last_datetime, shard_count, alignment=1):
+        """
+        Split the ids of the contacts updated after last_datetime into `shard_count` ranges, from the
+        lowest and highest id (two requests with limit=1) rounded to `alignment`. The last range is
+        open-ended, so contacts created during the sync are included.
+        """
+        params = {'limit': 1, self.bookmark_query_field: last_datetime}
+        min_id = self.get_first_id(path, {**params, 'orders[id]': 'ASC'})
+        max_id = self.get_first_id(path, {**params, 'orders[id]': 'DESC'})
+        if min_id is None or max_id is None:
+            return []
+
+        min_id = min_id // alignment * alignment
+        max_id = -(-(max_id + 1) // alignment) * alignment - 1
+        size = -(-(max_id - min_id + 1) // shard_count) # ceil
+        # id_greater: exclusive lower bound, last_id: highest id synced so far, id_less: exclusive upper bound
+        shards = [{'index': index, 'id_greater': lower - 1, 'last_id': lower - 1, 'id_less': lower + size,
+                   'max_bookmark': last_datetime, 'complete': False}
+                  for index, lower in enumerate(range(min_id, max_id + 1, size))]
+        shards[-1]['id_less'] = None
+        LOGGER.info('Stream: {}, ids {} to {} split into {} shards'.format(
+            self.stream_name, min_id, max_id, len(shards)))
+        return shards
+
+    def sync_shard(self, shard, catalog, state, last_datetime, path):
+        """
+        Sync the contacts of one id range in id order. After every page the highest synced id and
+        the max bookmark of the shard are checkpointed in the state.
+        """
+        bookmark_field = next(iter(self.replication_keys or []), None)
+        limit = PAGE_LIMIT
+        shard_total = 0
+        # Pages fetched ahead while a TransformPool transforms the current page
+        next_pages = []
+
+        while not shard['complete']:
+            params = {
+                'limit': limit,
+                'orders[id]': 'ASC',
+                'id_greater': shard['last_id'],
+                self.bookmark_query_field: last_datetime
+            }
+            if shard['id_less'] is not None:
+                params['id_less'] = shard['id_less']
+            querystring = '&'.join(['%s=%s' % (key, value) for (key, value) in params.items()])
+
+            prefetched_querystring, data, time_extracted = next_pages.pop() if next_pages else (None, None, None)
+            if prefetched_querystring != querystring:
+                _, data, time_extracted = self.fetch_page(catalog, path, querystring)
+            raw_records = self.get_raw_records(data) if data else []
+            prefetch = None
+            if self.pool and len(raw_records) >= limit:
+                next_querystring = '&'.join(['%s=%s' % (key, value) for (key, value) in dict(
+                    params, id_greater=max(int(record['id']) for record in raw_records)).items()])
+                # Called within this iteration, by get_page_records
+                prefetch = lambda: next_pages.append( # pylint: disable=cell-var-from-loop
+                    self.fetch_page(catalog, path, next_querystring))
+            transformed_data, transformed_records, lines = self.get_page_records(
+                data, time_extracted, prefetch=prefetch)
+
+            max_bookmark_value, record_count = self.process_records(
+                catalog=catalog,
+                stream_name=self.stream_name,
+                records=transformed_data,
+                time_extracted=time_extracted,
+                bookmark_field=bookmark_field,
+                max_bookmark_value=shard['max_bookmark'],
+                last_datetime=last_datetime,
+                transformed_records=transformed_records,
+                lines=lines)
+            shard_total = shard_total + record_count
+
+            with self.__state_lock:
+                if raw_records:
+                    shard['last_id'] = max(int(record['id']) for record in raw_records)
+                shard['max_bookmark'] = max_bookmark_value
+                shard['complete'] = len(raw_records) < limit
+                self.writer.write_state(state)
+
+            if self.budget and not shard['complete'] and self.budget.is_spent():
+                # The shard checkpoint is in the state, the next run resumes it
+                break
+
+        LOGGER.info('Stream: {}, shard up to id {} finished, total_records: {}'.format(
+            self.stream_name, shard['id_less'], shard_total))
+        return shard_total
+
+    def sync_shards(self, catalog, state, start_date, shard_count, partition=None):
+        """
+        Sync contacts as `shard_count` id ranges on parallel threads, each with its own checkpoint in
+        state['bookmarks']['contacts_shards']. An interrupted sharded sync resumes the unfinished
+        shards. Once all shards are complete their bookmarks are merged into the contacts bookmark.
+        With a partition (index, count), only the shards with index % count == index - 1 are synced
+        and the checkpoint is kept for `tap-activecampaign-merge-state`.
+        """
+        checkpoint = self.get_bookmark(state, self.shard_state_key, None)
+        if checkpoint:
+            last_datetime = checkpoint['last_datetime']
+            LOGGER.info('Stream: {}, resuming sharded sync from the state'.format(self.stream_name))
+        else:
+            last_datetime = self.get_bookmark(state, self.stream_name, start_date)
+            alignment = self.shard_id_alignment if partition else 1
+            checkpoint = {'last_datetime': last_datetime,
+                          'shards': self.get_shards(self.path, last_datetime, shard_count, alignment)}
+            state.setdefault('bookmarks', {})[self.shard_state_key] = checkpoint
+            self.writer.write_state(state)
+
+        self.start_bookmark_ties(state, last_datetime)
+        pending = [shard for shard in checkpoint['shards'] if not shard['complete'] and
+                   (partition is None or shard['index'] % partition[1] == partition[0] - 1)]
+        # As many shards run at once as the client's concurrency limit allows
+        shard_totals = map_with_limit(lambda shard: self.sync_shard(shard, catalog, state, last_datetime, self.path),
+                                      pending, getattr(self.client, 'limiter', None))
+
+        if not all(shard['complete'] for shard in pending):
+            LOGGER.info('Stream: {}, runtime budget spent, shard checkpoints saved'.format(self.stream_name))
+            raise RuntimeBudgetSpent(self.stream_name)
+        if not all(shard['complete'] for shard in checkpoint['shards']):
+            # Shards of other partitions, merged by tap-activecampaign-merge-state
+            return sum(shard_totals)
+
+        max_bookmark_value = max([last_datetime] + [shard['max_bookmark'] for shard in checkpoint['shards']],
+                                 key=strptime_to_utc)
+        del state['bookmarks'][self.shard_state_key]
+        self.save_bookmark_ties(state)
+        self.write_bookmark(state, self.stream_name, max_bookmark_value)
+        return sum(shard_totals)
 
 
 class ContactAutomations(ActiveCampaign):
@@ -720,6 +1228,7 @@ class Forms(ActiveCampaign):
     replication_keys = ['udate']
     path = 'forms'
     data_key = 'forms'
+    descending_sort = 'orders[udate]'
     created_timestamp = 'cdate'
 
 class Groups(ActiveCampaign):
@@ -753,6 +1262,7 @@ class Messages(ActiveCampaign):
     replication_keys = ['mdate']
     path = 'messages'
     data_key = 'messages'
+    descending_sort = 'orders[mdate]'
     created_timestamp = 'cdate'
 
 class SavedResponses(ActiveCampaign):
@@ -775,6 +1285,7 @@ class Scores(ActiveCampaign):
     replication_keys = ['mdate']
     path = 'scores'
     data_key = 'scores'
+    descending_sort = 'orders[mdate]'
     created_timestamp = 'cdate' 
 
 class Segments(ActiveCampaign):
@@ -828,6 +1339,7 @@ class Templates(ActiveCampaign):
     replication_keys = ['mdate']
     path = 'templates'
     data_key = 'templates'
+    descending_sort = 'orders[mdate]'
 
 class Users(ActiveCampaign):
     """
@@ -1110,9 +1622,8 @@ SUB_STREAMS = {
 
 def flatten_streams():
     flat_streams = {}
-    # Loop through all streams
+    # Loop through all stream classes, the attributes are read without instantiating them
     for stream in STREAMS.values():
-      stream = stream()
       flat_streams[stream.stream_name] = {
             'key_properties': stream.key_properties,
             'replication_method': stream.replication_method,
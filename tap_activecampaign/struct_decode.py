@@ -0,0 +1,175 @@
+import json
+import threading
+from typing import Any, Union
+import humps
+import singer
+from tap_activecampaign.compiled_transform import CompileError, TransformCompiler, TransformMismatch, \
+    compile_field_transform, get_kind, to_datetime
+from tap_activecampaign.transform import ZERO_DATE, is_date_field
+
+# msgspec is optional: pip install tap-activecampaign[msgspec]
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+LOGGER = singer.get_logger()
+
+# Types decoded natively, with the same results as singer's Transformer; other values are decoded as
+# they are and converted by the compiled transform of the field
+NATIVE_TYPES = {'integer': int, 'number': float, 'string': str}
+
+
+class DecodedPage(dict):
+    """
+    Response of a page decoded by a StructDecoder: its records are already transformed.
+    """
+
+
+def decamelize_value(value):
+    # Keys of nested objects are decamelized, as by transform_json
+    return humps.decamelize(value) if isinstance(value, (dict, list)) else value
+
+def get_zero_date_transform(transform_value):
+    return lambda value: None if value == ZERO_DATE else transform_value(value)
+
+
+class StructDecoder:
+    """
+    Decodes the response pages of a stream with msgspec into typed structs generated from the
+    stream schema: parsing, key mapping and the validation of integers, numbers and strings in one
+    native pass, without the generic dicts, the decamelized copy and the Transformer walk. The API
+    mixes camelCase and snake_case keys, so the key of each field is learned from the pages decoded
+    as plain JSON: the first page, and any page with an unknown key or a value the structs reject,
+    which is then returned as plain JSON for the standard transform.
+    """
+
+    def __init__(self, stream_name, data_key, schema, stream_metadata=None):
+        if msgspec is None:
+            raise Exception('Struct decoding requires msgspec: pip install tap-activecampaign[msgspec]')
+        if get_kind(schema)[0] != 'object':
+            raise CompileError('the schema is not an object with properties')
+        self.stream_name = stream_name
+        self.data_key = data_key
+        self.schema = schema
+        compiler = TransformCompiler(stream_metadata)
+        # Fields left out of the transformed records (see project_record)
+        self.deselected = {name for name in schema['properties'] if compiler.is_filtered(('properties', name))}
+        # API key of each field and the keys that are not in the schema, learned from the pages
+        self.keys = {}
+        self.extra_keys = set()
+        # (field name, msgspec type, conversion after decoding or None) of each field
+        self.fields = []
+        for name, field_schema in schema['properties'].items():
+            kind, nullable = get_kind(field_schema)
+            converter = None
+            if kind in NATIVE_TYPES:
+                decoded_type = Union[NATIVE_TYPES[kind], None] if nullable else NATIVE_TYPES[kind]
+            elif kind == 'datetime':
+                decoded_type = Union[str, None]
+                converter = lambda value, nullable=nullable: to_datetime(value, nullable)
+            else:
+                decoded_type = Any
+                transform_value = compile_field_transform(field_schema, ('properties', name), stream_metadata)
+                converter = lambda value, transform_value=transform_value: transform_value(decamelize_value(value))
+            if is_date_field(name) and kind in ('string', 'datetime'):
+                # Zero dates are nulled, as by fix_records
+                converter = get_zero_date_transform(converter or (lambda value: value))
+            self.fields.append((name, decoded_type, converter))
+        self.converters = [(name, converter) for name, _, converter in self.fields if converter]
+        self.field_names = [name for name, _, _ in self.fields]
+        self.page_type = None
+        self.__lock = threading.Lock()
+
+    def build_page_type(self):
+        """
+        Generate the structs of the records and of the page from the learned keys. Keys that are not
+        in the schema are kept as raw JSON and dropped; any other key fails the decoding.
+        """
+        fields = [(name, Union[decoded_type, msgspec.UnsetType], msgspec.UNSET)
+                  for name, decoded_type, _ in self.fields]
+        rename = {name: self.keys.get(name, name) for name in self.field_names}
+        for position, key in enumerate(sorted(self.extra_keys)):
+            fields.append(('extra_{}'.format(position), msgspec.Raw, msgspec.UNSET))
+            rename['extra_{}'.format(position)] = key
+        record_type = msgspec.defstruct(
+            'Record', fields, rename=rename, kw_only=True, forbid_unknown_fields=True)
+        return msgspec.defstruct('Page', [(self.data_key, list[record_type]), ('meta', Any, {})])
+
+    def learn_keys(self, data):
+        """
+        Map the keys of the records of a page decoded as plain JSON to the schema fields.
+        """
+        records = data.get(self.data_key) if isinstance(data, dict) else None
+        if not isinstance(records, list):
+            return
+        keys = set()
+        for record in records:
+            if isinstance(record, dict):
+                keys.update(record)
+        with self.__lock:
+            changed = False
+            for key in keys:
+                name = humps.decamelize(key)
+                if name in self.schema['properties']:
+                    if self.keys.get(name, key) != key:
+                        # Two keys of the same field, left to transform_json
+                        LOGGER.warning('Stream: {}, field {} is sent as {} and {}, not decoding structs'.format(
+                            self.stream_name, name, self.keys[name], key))
+                        self.page_type = None
+                        self.keys = None
+                        return
+                    changed = changed or name not in self.keys
+                    self.keys[name] = key
+                elif key not in self.extra_keys:
+                    changed = True
+                    self.extra_keys.add(key)
+            if changed or self.page_type is None:
+                self.page_type = self.build_page_type()
+
+    def project_record(self, record):
+        """
+        Leave out the fields that are not selected, once the record is prepared (see ActiveCampaign.prepare_records).
+        """
+        if not self.deselected:
+            return record
+        return {name: value for name, value in record.items() if name not in self.deselected}
+
+    def to_records(self, page):
+        records = []
+        for struct in getattr(page, self.data_key):
+            # Fields of the schema come first, extra keys are left out
+            record = {name: value for name, value in zip(self.field_names, msgspec.structs.astuple(struct))
+                      if value is not msgspec.UNSET}
+            for name, converter in self.converters:
+                if name in record:
+                    record[name] = converter(record[name])
+            records.append(record)
+        return records
+
+    def __call__(self, content):
+        """
+        Decode a response: a DecodedPage of transformed records, or the plain JSON response.
+        """
+        page_type = self.page_type
+        if page_type is not None:
+            try:
+                page = msgspec.json.decode(content, type=page_type, strict=False)
+                return DecodedPage({self.data_key: self.to_records(page), 'meta': page.meta})
+            except (msgspec.ValidationError, TransformMismatch) as err:
+                LOGGER.info('Stream: {}, page decoded as plain JSON: {}'.format(self.stream_name, err))
+        data = json.loads(content)
+        if self.keys is not None:
+            self.learn_keys(data)
+        return data
+
+
+def get_struct_decoder(stream_name, data_key, schema, stream_metadata):
+    """
+    Return the struct decoder of the stream, or None when its schema can only be transformed by Transformer.
+    """
+    try:
+        return StructDecoder(stream_name, data_key, schema, stream_metadata)
+    except CompileError as err:
+        LOGGER.info('Stream: {}, records are not decoded to structs: {}'.format(stream_name, err))
+        return None
@@ -1,7 +1,14 @@
-
+import time
 import singer
 
+from tap_activecampaign.budget import RuntimeBudgetSpent, get_checkpoints, get_runtime_budget, set_checkpoints
+from tap_activecampaign.client import RATE_LIMIT
+from tap_activecampaign.fingerprints import get_fingerprint_store
+from tap_activecampaign.output import get_writer
+from tap_activecampaign.partition import get_partition_durations, get_partition_streams
+from tap_activecampaign.plan import get_longest_first, get_plan, get_stream_durations, log_plan, save_stream_run
 from tap_activecampaign.streams import STREAMS, SUB_STREAMS
+from tap_activecampaign.workers import get_transform_pool
 
 LOGGER = singer.get_logger()
 
@@ -9,50 +16,128 @@ LOGGER = singer.get_logger()
 # If the integration is interrupted, this state property is used to identify
 #  the starting point to continue from.
 # Reference: https://github.com/singer-io/singer-python/blob/master/singer/bookmarks.py#L41-L46
-def update_currently_syncing(state, stream_name):
+def update_currently_syncing(state, stream_name, writer=None):
     if (stream_name is None) and ('currently_syncing' in state):
         del state['currently_syncing']
     else:
         singer.set_currently_syncing(state, stream_name)
-    singer.write_state(state)
+    (writer or get_writer()).write_state(state)
+
+
+def get_sync_streams(catalog, state, config, partition=None):
+    """
+    Return the selected streams and, in sync order, the top level streams synced by this process.
+    Child streams are synced with their parent; with a partition (i, N) only the streams assigned
+    to partition i are synced.
+    """
+    selected_streams = []
+    for stream in catalog.get_selected_streams(state):
+        selected_streams.append(stream.stream)
+    LOGGER.info('selected_streams: {}'.format(selected_streams))
 
+    stream_names = [stream_name for stream_name in selected_streams if stream_name not in SUB_STREAMS.values()]
+    if partition:
+        contacts_shards = int(config.get('contacts_shards') or 1)
+        stream_names = [stream_name for stream_name in stream_names if stream_name in get_partition_streams(
+            stream_names,
+            partition,
+            shared_streams=['contacts'] if contacts_shards > 1 else [],
+            durations=get_partition_durations(state))]
+        LOGGER.info('partition: {}/{}, streams: {}'.format(partition[0], partition[1], stream_names))
+    return selected_streams, stream_names
 
-def sync(client, config, catalog, state):
+
+def sync(client, config, catalog, state, partition=None, writer=None):
     start_date = config.get('start_date')
+    writer = writer or get_writer()
 
     # Get selected_streams from catalog, based on state last_stream
     #   last_stream = Previous currently synced stream, if the load was interrupted
     last_stream = singer.get_currently_syncing(state)
     LOGGER.info('last/currently syncing stream: {}'.format(last_stream))
-    selected_streams = []
-    for stream in catalog.get_selected_streams(state):
-        selected_streams.append(stream.stream)
-    LOGGER.info('selected_streams: {}'.format(selected_streams))
+    selected_streams, stream_names = get_sync_streams(catalog, state, config, partition)
+    if partition:
+        # The checkpoints and currently_syncing of the streams of other partitions are left to their
+        # states, so the merge does not bring back the positions of streams they have since finished
+        set_checkpoints(state, [checkpoint for checkpoint in get_checkpoints(state)
+                                if checkpoint.get('stream') in stream_names])
+        if last_stream not in stream_names:
+            state.pop('currently_syncing', None)
+            last_stream = None
 
     if not selected_streams or selected_streams == []:
         return
 
-    # Loop through endpoints in selected_streams
-    for stream_name in selected_streams:
+    # Optional change detection for FULL_TABLE streams
+    fingerprints = get_fingerprint_store(config, state)
+    # Number of id ranges contacts are synced in, in parallel
+    contacts_shards = int(config.get('contacts_shards') or 1)
+    # Optional `max_runtime`: stop at a checkpoint before the orchestrator stops the tap
+    budget = get_runtime_budget(config)
+    # Streams whose conformant values are copied without conversion
+    passthrough_streams = config.get('passthrough_streams') or []
+
+    # Streams are synced longest first, by the duration of their previous run or, with the optional
+    # preflight, the estimate of the plan
+    costs = {}
+    if config.get('preflight'):
+        sync_plan = get_plan(client, state, start_date, stream_names, selected_streams,
+                             float(config.get('rate_limit') or RATE_LIMIT))
+        log_plan(sync_plan)
+        costs.update({stream_name: stream['estimated_seconds'] for stream_name, stream in sync_plan['streams'].items()})
+    costs.update(get_stream_durations(state))
+    if costs:
+        stream_names = get_longest_first(stream_names, costs)
+        # An interrupted stream is resumed first
+        stream_names = [stream_name for stream_name in stream_names if stream_name == last_stream] + \
+            [stream_name for stream_name in stream_names if stream_name != last_stream]
+        LOGGER.info('sync order: {}'.format(stream_names))
 
-        # parent stream will sync sub stream
-        if stream_name in SUB_STREAMS.values():
-            continue
-        LOGGER.info('START Syncing: {}'.format(stream_name))
+    # Optional worker processes transforming the pages
+    pool = get_transform_pool(config, catalog, writer)
+    try:
+        # Loop through endpoints in stream_names
+        for stream_name in stream_names:
+            if budget and budget.is_spent():
+                # The next run starts with this stream
+                LOGGER.info('Runtime budget spent, stopping before: {}'.format(stream_name))
+                update_currently_syncing(state, stream_name, writer)
+                return
+            LOGGER.info('START Syncing: {}'.format(stream_name))
         
-        stream_obj = STREAMS[stream_name](client)
-        stream_obj.write_schema(catalog, stream_name)
-        update_currently_syncing(state, stream_name)
+            stream_obj = STREAMS[stream_name](client, fingerprints=fingerprints, writer=writer, budget=budget, pool=pool,
+                                              passthrough=stream_name in passthrough_streams,
+                                              struct_decoding=bool(config.get('struct_decoding')))
+            stream_obj.write_schema(catalog, stream_name)
+            update_currently_syncing(state, stream_name, writer)
+            start_time = time.monotonic()
         
-        total_records = stream_obj.sync(
-            client=client,
-            catalog=catalog,
-            state=state,
-            start_date=start_date,
-            path=stream_obj.path,
-            selected_streams=selected_streams)
-
-        update_currently_syncing(state, None)
-        LOGGER.info('FINISHED Syncing: {}, total_records: {}'.format(
-            stream_name,
-            total_records))
+            try:
+                if stream_name == 'contacts' and contacts_shards > 1:
+                    total_records = stream_obj.sync_shards(
+                        catalog=catalog,
+                        state=state,
+                        start_date=start_date,
+                        shard_count=contacts_shards,
+                        partition=partition)
+                else:
+                    total_records = stream_obj.sync(
+                        client=client,
+                        catalog=catalog,
+                        state=state,
+                        start_date=start_date,
+                        path=stream_obj.path,
+                        selected_streams=selected_streams)
+            except RuntimeBudgetSpent:
+                # The checkpoint and currently_syncing are in the state written by the stream
+                LOGGER.info('Runtime budget spent, stopped: {}'.format(stream_name))
+                return
+
+            save_stream_run(state, stream_name, time.monotonic() - start_time, total_records)
+            update_currently_syncing(state, None, writer)
+            LOGGER.info('FINISHED Syncing: {}, total_records: {}'.format(
+                stream_name,
+                total_records))
+    finally:
+        if pool:
+            pool.close()
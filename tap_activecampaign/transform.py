@@ -4,27 +4,47 @@ import singer
 
 LOGGER = singer.get_logger()
 
+# Value of unset dates in the API responses
+ZERO_DATE = '0000-00-00 00:00:00'
+
+
+def is_date_field(key):
+    return 'date' in key or 'stamp' in key or key in ('socialdata_lastcheck', 'deleted_at')
+
+
+def fix_record(rec):
+    if 'links' in rec:
+        if isinstance(rec['links'], dict):
+            rec.pop('links', None)
+    for key, val in rec.items():
+        if is_date_field(key):
+            if val == ZERO_DATE:
+                rec[key] = None
+
 
 def fix_records(this_json):
-    new_json = []
     for rec in this_json:
-        if 'links' in rec:
-            if isinstance(rec['links'], dict):
-                rec.pop('links', None)
-        for key, val in rec.items():
-            if 'date' in key or 'stamp' in key or key in ('socialdata_lastcheck', 'deleted_at'):
-                if val == '0000-00-00 00:00:00':
-                    rec[key] = None
+        fix_record(rec)
 
-        new_json.append(rec)
 
+def iter_transform_records(records):
+    """
+    Yield the decamelized and fixed copy of each record, one at a time as they are consumed.
+    """
+    for rec in records:
+        rec = humps.decamelize(rec)
+        fix_record(rec)
+        yield rec
 
-def transform_json(this_json, stream_name, data_key):
-    if data_key in this_json:
-        converted_json = humps.decamelize(this_json[data_key])
-    else:
-        converted_json = humps.decamelize(this_json)
 
-    fix_records(converted_json)
+def transform_records(records):
+    """
+    Return the decamelized and fixed copies of the records of a page.
+    """
+    return list(iter_transform_records(records))
+
 
-    return converted_json
+def transform_json(this_json, stream_name, data_key):
+    if data_key in this_json:
+        return transform_records(this_json[data_key])
+    return transform_records(this_json)
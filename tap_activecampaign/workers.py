@@ -0,0 +1,106 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import singer
+from singer import messages, metadata
+from tap_activecampaign.streams import STREAMS
+
+LOGGER = singer.get_logger()
+
+# Schema dict and metadata map per stream name, set in each worker process by init_worker
+_SCHEMAS = {}
+# Stream objects of the worker process, a passthrough keeps its sample across pages
+_STREAM_OBJECTS = {}
+
+
+class TransformWorkerError(Exception):
+    """
+    A page could not be transformed in a worker process; the message has the original error.
+    """
+
+
+def init_worker(schemas):
+    _SCHEMAS.update(schemas)
+
+def transform_page(stream_name, data, time_extracted, parent, parent_id, passthrough, record_lines):
+    """
+    Run in a worker process: return the records of an API page, their transformed records and,
+    with `record_lines`, their serialized RECORD messages (None otherwise).
+    """
+    key = (stream_name, passthrough)
+    if key not in _STREAM_OBJECTS:
+        _STREAM_OBJECTS[key] = STREAMS[stream_name](passthrough=passthrough)
+    stream_obj = _STREAM_OBJECTS[key]
+    schema, stream_metadata = _SCHEMAS[stream_name]
+    try:
+        records = stream_obj.transform_data(data) if data else []
+        stream_obj.prepare_records(records)
+        transformed_records = stream_obj.transform_records(
+            stream_name, records, schema, stream_metadata, parent, parent_id)
+    except Exception as err: # pylint: disable=broad-except
+        # Exceptions with their own constructor arguments (e.g. SchemaMismatch) do not unpickle
+        raise TransformWorkerError('Stream: {}, {}: {}'.format(stream_name, type(err).__name__, err)) from None
+
+    lines = None
+    if record_lines:
+        lines = [messages.format_message(messages.RecordMessage(
+            stream=stream_name,
+            record=record,
+            time_extracted=time_extracted)) for record in transformed_records]
+    return records, transformed_records, lines
+
+
+class TransformPool:
+    """
+    Worker processes that decamelize and transform the API pages and serialize their RECORD
+    messages, out of the GIL of the tap process. The stream threads only fetch, filter by bookmark
+    and write, in page order: a stream fetches its next page while the current one is transformed
+    (see ActiveCampaign.get_page_records), and the pages of streams synced in parallel (e.g. the
+    contacts shards) are transformed on several cores.
+    """
+
+    def __init__(self, catalog, workers, record_lines=True):
+        schemas = {stream.tap_stream_id: (stream.schema.to_dict(), metadata.to_map(stream.metadata))
+                   for stream in catalog.streams}
+        # Serialize the records in the workers only for writers that write RECORD lines
+        self.record_lines = record_lines
+        # spawn: the tap process runs threads (output queue, shards) that must not be forked
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(schemas,))
+        LOGGER.info('Transforming pages in {} worker processes'.format(workers))
+
+    def submit_page(self, stream_name, data, time_extracted, parent=None, parent_id=None, passthrough=False):
+        """
+        Start transforming an API page, return the Future of its (records, transformed records, RECORD lines),
+        see workers.transform_page.
+        """
+        return self.executor.submit(transform_page, stream_name, data, time_extracted, parent, parent_id,
+                                    passthrough, self.record_lines)
+
+    def transform_page(self, stream_name, data, time_extracted, parent=None, parent_id=None, passthrough=False):
+        """
+        Return (records, transformed records, RECORD lines) of an API page, see workers.transform_page.
+        """
+        return self.submit_page(stream_name, data, time_extracted, parent, parent_id, passthrough).result()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+
+def get_transform_pool(config, catalog, writer):
+    """
+    Return a TransformPool of `transform_workers` processes, or None (the default) to transform the
+    pages in the tap process.
+    """
+    workers = int(config.get('transform_workers') or 0)
+    if workers < 1:
+        return None
+    return TransformPool(catalog, workers, record_lines=writer.record_lines)
@@ -0,0 +1,85 @@
+"""
+Benchmark page decoding: json.loads, transform_json and the compiled transform
+against the msgspec struct decoder of the stream, on pages of generated records
+shaped like API responses (camelCase keys, string ids, date-times with offsets).
+
+Usage:
+    python tests/benchmarks/bench_decode.py --stream contacts --pages 200
+"""
+import argparse
+import json
+import time
+
+import humps
+from singer import metadata
+from tap_activecampaign.compiled_transform import compile_transform, get_kind
+from tap_activecampaign.discover import discover
+from tap_activecampaign.streams import PAGE_LIMIT, STREAMS
+from tap_activecampaign.struct_decode import DecodedPage, StructDecoder
+from tap_activecampaign.transform import transform_json
+
+SAMPLE_VALUES = {
+    'integer': '12345',
+    'number': '12.5',
+    'string': 'text',
+    'boolean': True,
+    'datetime': '2021-02-01T10:11:12-05:00',
+    'null': None,
+    'any': 'text',
+    'dict': {},
+    'generic': None
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stream', default='contacts')
+    parser.add_argument('--pages', type=int, default=200)
+    return parser.parse_args()
+
+
+def get_record(schema):
+    record = {}
+    for name, field_schema in schema['properties'].items():
+        kind, _ = get_kind(field_schema)
+        record[humps.camelize(name)] = get_record(field_schema) if kind == 'object' else SAMPLE_VALUES[kind]
+    record['links'] = {'self': 'https://example.api-us1.com/api/3/records/1'}
+    return record
+
+
+def run(args):
+    stream = discover().get_stream(args.stream)
+    data_key = STREAMS[args.stream].data_key
+    schema = stream.schema.to_dict()
+    stream_metadata = metadata.to_map(stream.metadata)
+    content = json.dumps({data_key: [get_record(schema) for _ in range(PAGE_LIMIT)],
+                          'meta': {'total': '100'}}).encode()
+
+    compiled = compile_transform(schema, stream_metadata)
+    start = time.perf_counter()
+    for _ in range(args.pages):
+        for record in transform_json(json.loads(content), args.stream, data_key):
+            compiled(record)
+    standard_seconds = time.perf_counter() - start
+
+    decoder = StructDecoder(args.stream, data_key, schema, stream_metadata)
+    # The first page maps the keys of the fields
+    decoder(content)
+    start = time.perf_counter()
+    for _ in range(args.pages):
+        page = decoder(content)
+    struct_seconds = time.perf_counter() - start
+
+    records = args.pages * PAGE_LIMIT
+    return {
+        'stream': args.stream,
+        'records': records,
+        'decoded_to_structs': isinstance(page, DecodedPage),
+        'standard_records_per_second': round(records / standard_seconds),
+        'struct_records_per_second': round(records / struct_seconds),
+        'speedup': round(standard_seconds / struct_seconds, 1)
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(parse_args()), indent=2))
@@ -0,0 +1,125 @@
+"""
+Benchmark the tap's retry behaviour against the local chaos server.
+
+Runs a full `contacts` sync against `ChaosServer`, timing every logical page
+(one `client.get` call, including all of its retries), and reports
+throughput and tail latency.
+
+Usage:
+    python tests/benchmarks/bench_retry.py --records 5000 --rate-429 0.1 --rate-5xx 0.05
+    python tests/benchmarks/bench_retry.py --rate-slow 0.02 --slow-seconds 5 --request-timeout 2
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chaos_server import Chaos, ChaosServer # pylint: disable=wrong-import-position
+from tap_activecampaign.client import ActiveCampaignClient # pylint: disable=wrong-import-position
+from tap_activecampaign.discover import discover # pylint: disable=wrong-import-position
+from tap_activecampaign.streams import Contacts # pylint: disable=wrong-import-position
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--rate-429', type=float, default=0.05)
+    parser.add_argument('--rate-403', type=float, default=0.01)
+    parser.add_argument('--rate-5xx', type=float, default=0.05)
+    parser.add_argument('--rate-reset', type=float, default=0.01)
+    parser.add_argument('--rate-slow', type=float, default=0.0)
+    parser.add_argument('--slow-seconds', type=float, default=2.0)
+    parser.add_argument('--retry-after', type=float, default=None,
+                        help='Retry-After header value sent with injected 429s')
+    parser.add_argument('--request-timeout', type=float, default=None)
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def select_stream(catalog, stream_name):
+    for stream in catalog.streams:
+        if stream.tap_stream_id == stream_name:
+            for entry in stream.metadata:
+                if not entry['breadcrumb']:
+                    entry['metadata']['selected'] = True
+    return catalog
+
+
+def run(args):
+    chaos = Chaos(rate_429=args.rate_429,
+                  rate_403=args.rate_403,
+                  rate_5xx=args.rate_5xx,
+                  rate_reset=args.rate_reset,
+                  rate_slow=args.rate_slow,
+                  slow_seconds=args.slow_seconds,
+                  retry_after=args.retry_after,
+                  seed=args.seed)
+    catalog = select_stream(discover(), 'contacts')
+    latencies = []
+    error = None
+
+    # The stand-in server is plain HTTP on localhost, which the client's
+    # api_url validation (HTTPS, public address) rejects by design.
+    with ChaosServer(total_records=args.records, chaos=chaos) as server, \
+            mock.patch('tap_activecampaign.client.is_api_url_valid', return_value=True):
+        client = ActiveCampaignClient(server.url, 'bench-token', 'tap-activecampaign-bench',
+                                      args.request_timeout)
+        client_get = client.get
+
+        def timed_get(*get_args, **get_kwargs):
+            start = time.monotonic()
+            try:
+                return client_get(*get_args, **get_kwargs)
+            finally:
+                latencies.append(time.monotonic() - start)
+
+        client.get = timed_get
+        stream = Contacts(client)
+        started = time.monotonic()
+        with redirect_stdout(io.StringIO()):
+            try:
+                total = stream.sync(client=client,
+                                    catalog=catalog,
+                                    state={},
+                                    start_date='2019-01-01T00:00:00Z',
+                                    path=stream.path,
+                                    selected_streams=['contacts'])
+            except Exception as err: # pylint: disable=broad-except
+                total = None
+                error = err
+        elapsed = time.monotonic() - started
+        counters = dict(server.counters)
+
+    return {
+        'records': total,
+        'failed': repr(error) if error else None,
+        'elapsed_seconds': round(elapsed, 3),
+        'pages': len(latencies),
+        'pages_per_second': round(len(latencies) / elapsed, 3) if elapsed else None,
+        'records_per_second': round((total or 0) / elapsed, 3) if elapsed else None,
+        'page_latency_seconds': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies or [0.0]), 3)
+        },
+        'server': counters
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(parse_args()), indent=2))
@@ -0,0 +1,85 @@
+"""
+Benchmark tap startup: cold process start to a finished discovery, and
+in-process schema loading, with and without the precompiled catalog bundle.
+
+Usage:
+    python tests/benchmarks/bench_startup.py --runs 20
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+DISCOVER = '''
+from tap_activecampaign import schema
+{setup}
+from tap_activecampaign.discover import discover
+discover()
+'''
+
+WITHOUT_BUNDLE = "schema.BUNDLE_FILE = 'missing_bundle.json'"
+
+
+def time_cold_start(setup, runs):
+    code = DISCOVER.format(setup=setup)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def time_in_process(function, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summary(timings):
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'min_ms': round(min(timings) * 1000, 2)
+    }
+
+
+def run(runs):
+    from tap_activecampaign import schema # pylint: disable=import-outside-toplevel
+
+    def load_all_from_files():
+        schema.load_bundle.cache_clear()
+        bundle_file = schema.BUNDLE_FILE
+        schema.BUNDLE_FILE = 'missing_bundle.json'
+        try:
+            schema.get_schemas()
+        finally:
+            schema.BUNDLE_FILE = bundle_file
+            schema.load_bundle.cache_clear()
+
+    def load_all_from_bundle():
+        schema.load_bundle.cache_clear()
+        schema.get_schemas()
+
+    def load_selected_from_bundle():
+        schema.load_bundle.cache_clear()
+        schema.get_schemas(['contacts', 'deals'])
+
+    return {
+        'cold_discover_with_bundle': summary(time_cold_start('', runs)),
+        'cold_discover_without_bundle': summary(time_cold_start(WITHOUT_BUNDLE, runs)),
+        'get_schemas_all_from_files': summary(time_in_process(load_all_from_files, runs)),
+        'get_schemas_all_from_bundle': summary(time_in_process(load_all_from_bundle, runs)),
+        'get_schemas_2_streams_from_bundle': summary(time_in_process(load_selected_from_bundle, runs))
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    print(json.dumps(run(parser.parse_args().runs), indent=2))
@@ -0,0 +1,81 @@
+"""
+Benchmark record transformation: singer's Transformer against the compiled
+transform of the stream, on generated records shaped like API responses.
+
+Usage:
+    python tests/benchmarks/bench_transform.py --stream contacts --records 20000
+"""
+import argparse
+import copy
+import json
+import time
+
+from singer import metadata, Transformer
+from tap_activecampaign.compiled_transform import compile_transform, get_kind
+from tap_activecampaign.discover import discover
+
+SAMPLE_VALUES = {
+    'integer': '12345',
+    'number': '12.5',
+    'string': 'text',
+    'boolean': True,
+    'datetime': '2021-02-01T10:11:12-05:00',
+    'null': None,
+    'any': 'text',
+    'dict': {},
+    'generic': None
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stream', default='contacts')
+    parser.add_argument('--records', type=int, default=20000)
+    return parser.parse_args()
+
+
+def get_record(schema):
+    record = {}
+    for name, field_schema in schema['properties'].items():
+        kind, _ = get_kind(field_schema)
+        record[name] = get_record(field_schema) if kind == 'object' else SAMPLE_VALUES[kind]
+    return record
+
+
+def time_transform(transform, records):
+    start = time.perf_counter()
+    for record in records:
+        transform(record)
+    return time.perf_counter() - start
+
+
+def run(args):
+    stream = discover().get_stream(args.stream)
+    schema = stream.schema.to_dict()
+    stream_metadata = metadata.to_map(stream.metadata)
+    record = get_record(schema)
+
+    # Transformer removes fields that are not selected from its input, each run gets its own records
+    records = [copy.deepcopy(record) for _ in range(args.records)]
+    transformer_seconds = time_transform(
+        lambda rec: Transformer().transform(rec, schema, stream_metadata), records)
+
+    compile_start = time.perf_counter()
+    compiled = compile_transform(schema, stream_metadata)
+    compile_seconds = time.perf_counter() - compile_start
+    records = [copy.deepcopy(record) for _ in range(args.records)]
+    compiled_seconds = time_transform(compiled, records)
+
+    return {
+        'stream': args.stream,
+        'records': args.records,
+        'fields': len(schema['properties']),
+        'compile_seconds': round(compile_seconds, 4),
+        'transformer_records_per_second': round(args.records / transformer_seconds),
+        'compiled_records_per_second': round(args.records / compiled_seconds),
+        'speedup': round(transformer_seconds / compiled_seconds, 1)
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(run(parse_args()), indent=2))
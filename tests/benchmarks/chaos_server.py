@@ -0,0 +1,183 @@
+"""
+Local stand-in for the ActiveCampaign v3 API with optional fault injection.
+
+The server answers `GET /api/3/users/me` (token check) and
+`GET /api/3/<collection>?offset=&limit=` with deterministic, paginated
+records shaped like the real API (`{<collection>: [...], "meta": {"total": N}}`).
+
+In chaos mode every data request is first run through a `Chaos` profile that
+can inject 429s (with an optional `Retry-After` header), intermittent 403s,
+5xx errors, connection resets and slow responses at configurable rates.
+
+Example:
+    with ChaosServer(total_records=1000, chaos=Chaos(rate_429=0.1, rate_5xx=0.05)) as server:
+        client = ActiveCampaignClient(server.url, 'token')
+"""
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class Chaos:
+    """
+    Fault-injection profile. Each rate is the probability (0.0 - 1.0) that a
+    data request receives the corresponding fault; at most one fault is
+    injected per request.
+    """
+
+    def __init__(self,
+                 rate_429=0.0,
+                 rate_403=0.0,
+                 rate_5xx=0.0,
+                 rate_reset=0.0,
+                 rate_slow=0.0,
+                 slow_seconds=2.0,
+                 retry_after=None,
+                 seed=None):
+        self.rate_429 = rate_429
+        self.rate_403 = rate_403
+        self.rate_5xx = rate_5xx
+        self.rate_reset = rate_reset
+        self.rate_slow = rate_slow
+        self.slow_seconds = slow_seconds
+        self.retry_after = retry_after
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+    def pick(self):
+        """
+        Return the fault to inject for one request: '429', '403', '5xx',
+        'reset', 'slow' or None.
+        """
+        with self.__lock:
+            roll = self.__random.random()
+        for fault, rate in (('429', self.rate_429),
+                            ('403', self.rate_403),
+                            ('5xx', self.rate_5xx),
+                            ('reset', self.rate_reset),
+                            ('slow', self.rate_slow)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def pick_5xx(self):
+        """ Return the status code to use for an injected server error. """
+        with self.__lock:
+            return self.__random.choice((500, 502, 503, 504))
+
+
+class _ChaosHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        # Keep benchmark output readable
+        pass
+
+    def _send_json(self, status_code, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _reset_connection(self):
+        # SO_LINGER with a zero timeout makes close() send a TCP RST
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        self.close_connection = True
+
+    def do_GET(self): # pylint: disable=invalid-name
+        server = self.server
+        parsed_url = urlparse(self.path)
+        path = parsed_url.path.rstrip('/')
+        server.count('requests')
+
+        if path.endswith('/users/me'):
+            self._send_json(200, {'user': {'id': '1', 'username': 'chaos'}})
+            return
+
+        fault = server.chaos.pick() if server.chaos else None
+        if fault:
+            server.count(fault)
+        if fault == '429':
+            headers = {}
+            if server.chaos.retry_after is not None:
+                headers['Retry-After'] = server.chaos.retry_after
+            self._send_json(429, {'message': 'Too Many Requests'}, headers)
+            return
+        if fault == '403':
+            self._send_json(403, {'message': 'Forbidden'})
+            return
+        if fault == '5xx':
+            self._send_json(server.chaos.pick_5xx(), {'message': 'Server Error'})
+            return
+        if fault == 'reset':
+            self._reset_connection()
+            return
+        if fault == 'slow':
+            time.sleep(server.chaos.slow_seconds)
+
+        collection = path.rsplit('/', 1)[-1]
+        query = parse_qs(parsed_url.query)
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', ['100'])[0])
+        last = min(offset + limit, server.total_records)
+        records = [server.make_record(record_id) for record_id in range(offset + 1, last + 1)]
+        server.count('pages')
+        self._send_json(200, {
+            collection: records,
+            'meta': {'total': str(server.total_records)}
+        })
+
+
+class ChaosServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server bound to a free localhost port. Use as a context
+    manager; `url` is the value to pass as the tap's `api_url`.
+    """
+    daemon_threads = True
+
+    def __init__(self, total_records=1000, chaos=None, port=0):
+        super().__init__(('127.0.0.1', port), _ChaosHandler)
+        self.total_records = total_records
+        self.chaos = chaos
+        self.counters = {}
+        self.__counter_lock = threading.Lock()
+        self.__thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_address[1])
+
+    def count(self, name):
+        with self.__counter_lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    @staticmethod
+    def make_record(record_id):
+        return {
+            'id': str(record_id),
+            'email': 'contact{}@example.com'.format(record_id),
+            'firstName': 'First{}'.format(record_id),
+            'lastName': 'Last{}'.format(record_id),
+            'cdate': '2021-01-01 00:00:00',
+            'udate': '2021-06-01T10:00:00-05:00',
+            'links': {'contactGoals': 'https://example.com/contactGoals'}
+        }
+
+    def __enter__(self):
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.shutdown()
+        self.server_close()
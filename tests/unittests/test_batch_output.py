@@ -0,0 +1,54 @@
+import gzip
+import io
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from urllib.parse import urlparse
+from tap_activecampaign.output import BatchWriter, SingerWriter, get_writer
+
+
+def read_batch(message):
+    with gzip.open(urlparse(message['manifest'][0]).path, 'rt') as file:
+        return [json.loads(line) for line in file]
+
+
+class TestBatchWriter(unittest.TestCase):
+
+    def test_rotating_batches(self):
+        """
+        Test that records are written to gzip JSONL files of `batch_size` records, each referenced by a BATCH message.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir, redirect_stdout(io.StringIO()) as stdout:
+            writer = BatchWriter(tmp_dir, batch_size=2, compression_level=1)
+            writer.write_schema('tags', {'type': 'object'}, ['id'])
+            for tag_id in range(5):
+                writer.write_record('tags', {'id': tag_id})
+            writer.close()
+
+            messages = [json.loads(line) for line in stdout.getvalue().splitlines()]
+            self.assertEqual([message['type'] for message in messages], ['SCHEMA', 'BATCH', 'BATCH', 'BATCH'])
+            self.assertEqual(messages[1]['encoding'], {'format': 'jsonl', 'compression': 'gzip'})
+            self.assertEqual([read_batch(message) for message in messages[1:]],
+                             [[{'id': 0}, {'id': 1}], [{'id': 2}, {'id': 3}], [{'id': 4}]])
+
+    def test_batches_flushed_before_state(self):
+        """
+        Test that the open batches of all streams are emitted before a STATE message.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir, redirect_stdout(io.StringIO()) as stdout:
+            writer = BatchWriter(tmp_dir, batch_size=100)
+            writer.write_record('tags', {'id': 1})
+            writer.write_record('deals', {'id': 2})
+            writer.write_state({'bookmarks': {'deals': '2021-01-01T00:00:00Z'}})
+            writer.close()
+
+            messages = [json.loads(line) for line in stdout.getvalue().splitlines()]
+            self.assertEqual([message['type'] for message in messages], ['BATCH', 'BATCH', 'STATE'])
+            self.assertEqual({message['stream'] for message in messages[:2]}, {'tags', 'deals'})
+
+    def test_get_writer(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.assertIsInstance(get_writer({'batch_dir': tmp_dir, 'batch_size': 10}), BatchWriter)
+        self.assertIsInstance(get_writer({}), SingerWriter)
+        self.assertNotIsInstance(get_writer({}), BatchWriter)
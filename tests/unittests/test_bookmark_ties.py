@@ -0,0 +1,81 @@
+import unittest
+from unittest import mock
+from tap_activecampaign.discover import discover
+from tap_activecampaign.streams import Contacts
+
+START_DATE = '2021-01-01T00:00:00Z'
+
+
+def get_contacts(ids, udate='2021-02-01T00:00:00-05:00'):
+    return [{'id': str(contact_id), 'email': 'c{}@example.com'.format(contact_id), 'udate': udate}
+            for contact_id in ids]
+
+
+class TestBookmarkTies(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+
+    def sync_contacts(self, contacts, state):
+        client = mock.Mock()
+        client.get.return_value = {'contacts': contacts, 'meta': {'total': str(len(contacts))}}
+        stream = Contacts(client)
+        with mock.patch.object(Contacts, 'write_record') as mocked_write_record, \
+                mock.patch.object(stream.writer, 'write_state'):
+            stream.sync(client, self.catalog, state, START_DATE, stream.path, ['contacts'])
+        return [args[1]['id'] for args, kwargs in mocked_write_record.call_args_list]
+
+    def test_records_at_bookmark_not_emitted_again(self):
+        """
+        Test that records sharing the saved bookmark are written once, while new or updated records are still written.
+        """
+        state = {}
+        bulk_import = get_contacts([1, 2, 3])
+        self.assertEqual(self.sync_contacts(bulk_import, state), [1, 2, 3])
+        self.assertEqual(state['bookmark_ties']['contacts'],
+                         {'bookmark': '2021-02-01T05:00:00.000000Z', 'ids': ['1', '2', '3']})
+
+        # Same records at the bookmark: nothing to write
+        self.assertEqual(self.sync_contacts(bulk_import, state), [])
+
+        # A record imported later with the same timestamp is still written
+        self.assertEqual(self.sync_contacts(get_contacts([1, 2, 3, 4]), state), [4])
+        self.assertEqual(state['bookmark_ties']['contacts']['ids'], ['1', '2', '3', '4'])
+
+        # An update moves the bookmark, only the updated record is at the new bookmark
+        updated = get_contacts([2], udate='2021-02-02T00:00:00-05:00')
+        self.assertEqual(self.sync_contacts(updated, state), [2])
+        self.assertEqual(state['bookmark_ties']['contacts'],
+                         {'bookmark': '2021-02-02T05:00:00.000000Z', 'ids': ['2']})
+        self.assertEqual(state['bookmarks']['contacts'], '2021-02-02T05:00:00.000000Z')
+
+    def test_updated_tie_after_newer_record(self):
+        """
+        Test that a record at the saved bookmark and since updated is written, when a newer record
+        before it on the page raises the bookmark of the run.
+        """
+        state = {}
+        self.assertEqual(self.sync_contacts(get_contacts([1, 2, 3]), state), [1, 2, 3])
+
+        updated = get_contacts([5, 1], udate='2021-02-02T00:00:00-05:00')
+        self.assertEqual(self.sync_contacts(updated, state), [5, 1])
+        self.assertEqual(state['bookmark_ties']['contacts'],
+                         {'bookmark': '2021-02-02T05:00:00.000000Z', 'ids': ['1', '5']})
+
+    def test_ties_for_other_bookmark_ignored(self):
+        """
+        Test that stored keys are not used when they belong to a different bookmark.
+        """
+        state = {'bookmarks': {'contacts': '2021-02-01T05:00:00.000000Z'},
+                 'bookmark_ties': {'contacts': {'bookmark': '2021-01-15T00:00:00.000000Z', 'ids': ['1']}}}
+        self.assertEqual(self.sync_contacts(get_contacts([1]), state), [1])
+
+    @mock.patch('tap_activecampaign.streams.MAX_BOOKMARK_TIE_IDS', 2)
+    def test_tie_ids_capped(self):
+        """
+        Test that at most MAX_BOOKMARK_TIE_IDS keys are stored, the others are written again by the next run.
+        """
+        state = {}
+        self.sync_contacts(get_contacts([1, 2, 3]), state)
+        self.assertEqual(state['bookmark_ties']['contacts']['ids'], ['1', '2'])
+        self.assertEqual(self.sync_contacts(get_contacts([1, 2, 3]), state), [3])
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from tap_activecampaign.cassette import Cassette, CassetteMissError, get_cassette
+from tap_activecampaign.client import ActiveCampaignClient
+
+
+class MockResponse:
+    def __init__(self, json_data, status_code=200):
+        self.json_data = json_data
+        self.status_code = status_code
+        self.content = b'{}'
+        self.headers = {}
+
+    def json(self):
+        return self.json_data
+
+
+PAGE = {"contacts": [{"id": "1", "email": "a@example.com"}], "meta": {"total": "1"}}
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmp_dir.name, 'cassette')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @mock.patch('tap_activecampaign.client.ActiveCampaignClient.check_api_token')
+    @mock.patch('requests.Session.request', return_value=MockResponse(PAGE))
+    def test_record_then_replay(self, mocked_request, mocked_check_api_token):
+        """
+        Test that recorded pages are served back in replay mode without any request.
+        """
+        client = ActiveCampaignClient('https://www.activecampaign.com', 'dummy_token',
+                                      cassette=Cassette(self.directory, 'record'))
+        self.assertEqual(client.get('contacts', params='offset=0&limit=100'), PAGE)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+        mocked_request.reset_mock()
+        with mock.patch('tap_activecampaign.client.is_api_url_valid') as mocked_url_check:
+            with ActiveCampaignClient('https://www.activecampaign.com', 'dummy_token',
+                                      cassette=Cassette(self.directory, 'replay')) as replay_client:
+                response = replay_client.get('contacts', params='offset=0&limit=100')
+
+        self.assertEqual(response, PAGE)
+        # Verify no network access: no DNS check, no token check and no request
+        self.assertEqual(mocked_url_check.call_count, 0)
+        self.assertEqual(mocked_request.call_count, 0)
+
+    @mock.patch('tap_activecampaign.client.ActiveCampaignClient.check_api_token')
+    @mock.patch('requests.Session.request', return_value=MockResponse(PAGE))
+    def test_record_without_decoder(self, mocked_request, mocked_check_api_token):
+        """
+        Test that a page is recorded as sent by the API, not as decoded by the decoder of the request.
+        """
+        client = ActiveCampaignClient('https://www.activecampaign.com', 'dummy_token',
+                                      cassette=Cassette(self.directory, 'record'))
+        decoder = mock.Mock()
+        self.assertEqual(client.get('contacts', params='offset=0&limit=100', decoder=decoder), PAGE)
+        self.assertEqual(decoder.call_count, 0)
+
+        replay_client = ActiveCampaignClient('https://www.activecampaign.com', 'dummy_token',
+                                             cassette=Cassette(self.directory, 'replay'))
+        self.assertEqual(replay_client.get('contacts', params='offset=0&limit=100'), PAGE)
+
+    def test_replay_miss(self):
+        """
+        Test that replaying a request that was never recorded raises CassetteMissError.
+        """
+        os.makedirs(self.directory)
+        client = ActiveCampaignClient('https://www.activecampaign.com', 'dummy_token',
+                                      cassette=Cassette(self.directory, 'replay'))
+        with self.assertRaises(CassetteMissError):
+            client.get('contacts', params='offset=100&limit=100')
+
+    def test_query_key(self):
+        """
+        Test that pages differing only in their query are stored separately and dict params are order independent.
+        """
+        cassette = Cassette(self.directory, 'record')
+        self.assertNotEqual(cassette.get_file_path('GET', 'contacts', 'offset=0&limit=100'),
+                            cassette.get_file_path('GET', 'contacts', 'offset=100&limit=100'))
+        self.assertEqual(cassette.get_file_path('GET', 'contacts', {'offset': 0, 'limit': 100}),
+                         cassette.get_file_path('GET', 'contacts', {'limit': 100, 'offset': 0}))
+
+    def test_get_cassette_from_config(self):
+        """
+        Test that the cassette is only enabled when `cassette_mode` is configured.
+        """
+        self.assertIsNone(get_cassette({}))
+        cassette = get_cassette({'cassette_mode': 'record', 'cassette_dir': self.directory})
+        self.assertEqual(cassette.mode, 'record')
+        with self.assertRaises(Exception):
+            get_cassette({'cassette_mode': 'rewind', 'cassette_dir': self.directory})
@@ -0,0 +1,37 @@
+import json
+import unittest
+from unittest import mock
+from tap_activecampaign import schema
+from tap_activecampaign.discover import discover
+
+
+class TestCatalogBundle(unittest.TestCase):
+
+    def test_bundle_is_up_to_date(self):
+        """
+        Test that the committed bundle matches the schema files; regenerate it with `python -m tap_activecampaign.schema`.
+        """
+        self.assertEqual(schema.load_bundle(), schema.compile_bundle())
+
+    def test_discover_without_bundle(self):
+        """
+        Test that discover reads the schema files when the bundle is missing and produces the same catalog.
+        """
+        catalog = discover().to_dict()
+        schema.load_bundle.cache_clear()
+        try:
+            with mock.patch.object(schema, 'BUNDLE_FILE', 'missing_bundle.json'):
+                fallback_catalog = discover().to_dict()
+        finally:
+            schema.load_bundle.cache_clear()
+
+        self.assertEqual(json.dumps(catalog), json.dumps(fallback_catalog))
+
+    def test_get_schemas_for_selected_streams(self):
+        """
+        Test that only the requested streams are returned.
+        """
+        schemas, field_metadata = schema.get_schemas(['tags', 'contacts'])
+        self.assertEqual(list(schemas), ['tags', 'contacts'])
+        self.assertEqual(list(field_metadata), ['tags', 'contacts'])
+        self.assertIn((), [mdata['breadcrumb'] for mdata in field_metadata['tags']])
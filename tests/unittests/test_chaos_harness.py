@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+from unittest import mock
+from tap_activecampaign import client
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from chaos_server import Chaos, ChaosServer # pylint: disable=wrong-import-position
+
+
+@mock.patch('tap_activecampaign.client.is_api_url_valid', return_value=True)
+class TestClientAgainstChaosServer(unittest.TestCase):
+    """
+    Exercise the client's retry handling end to end against the local chaos server.
+    """
+
+    def test_pages_without_faults(self, mocked_url_check):
+        """
+        Test that the client reads every page when no faults are injected.
+        """
+        with ChaosServer(total_records=250) as server:
+            _client = client.ActiveCampaignClient(server.url, 'dummy_token')
+            data = _client.get('contacts', params='offset=200&limit=100')
+
+        self.assertEqual(len(data['contacts']), 50)
+        self.assertEqual(data['meta']['total'], '250')
+
+    @mock.patch('time.sleep')
+    def test_persistent_5xx_exhausts_retries(self, mocked_sleep, mocked_url_check):
+        """
+        Test that a page failing with 5xx on every attempt is tried 5 times.
+        """
+        with ChaosServer(total_records=10, chaos=Chaos(rate_5xx=1.0, seed=1)) as server:
+            _client = client.ActiveCampaignClient(server.url, 'dummy_token')
+            with self.assertRaises(client.Server5xxError):
+                _client.get('contacts', params='offset=0&limit=100')
+            counters = dict(server.counters)
+
+        # 1 token check + 5 attempts for the page
+        self.assertEqual(counters['5xx'], 5)
+
+    @mock.patch('time.sleep')
+    def test_intermittent_429_recovers(self, mocked_sleep, mocked_url_check):
+        """
+        Test that intermittent 429 responses are retried until the page succeeds.
+        """
+        with ChaosServer(total_records=10, chaos=Chaos(rate_429=0.5, seed=3)) as server:
+            _client = client.ActiveCampaignClient(server.url, 'dummy_token')
+            for _ in range(5):
+                data = _client.get('contacts', params='offset=0&limit=100')
+                self.assertEqual(len(data['contacts']), 10)
@@ -0,0 +1,88 @@
+import copy
+import random
+import unittest
+from singer import metadata, Transformer
+from singer.transform import SchemaMismatch
+from tap_activecampaign.compiled_transform import TransformMismatch, compile_transform, get_kind
+from tap_activecampaign.discover import discover
+
+# Values returned by the API, or close to them, for each kind of schema node
+SAMPLE_VALUES = {
+    'integer': ['12', 12, '1,200', '', None, 3.0, True],
+    'number': ['1.5', 1.5, 2, '1,200.5', '', None],
+    'string': ['text', '', None, 12, 1.5, False],
+    'boolean': [True, False, 'false', 'FALSE', 'true', '0', 0, 1, None, ''],
+    'datetime': ['2021-02-01 10:11:12', '2021-02-01T10:11:12-05:00', '2021-02-01T10:11:12.123456Z', '', None],
+    'null': [None, ''],
+    'any': ['text', {'a': 1}, None],
+    'dict': [{'a': 1}, None, ''],
+    'generic': [None, '', '12', ['a', 'b'], {'a': '1'}]
+}
+
+
+def get_value(schema, rand, depth=0):
+    kind, _ = get_kind(schema)
+    if kind == 'object':
+        if depth > 2 or rand.random() < 0.2:
+            return rand.choice([None, ''])
+        return get_record(schema, rand, depth + 1)
+    return rand.choice(SAMPLE_VALUES[kind])
+
+def get_record(schema, rand, depth=0):
+    record = {name: get_value(field_schema, rand, depth)
+              for name, field_schema in schema['properties'].items() if rand.random() < 0.9}
+    record['not_in_schema'] = 'dropped'
+    return record
+
+
+class TestCompiledTransform(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+
+    def assert_conformance(self, schema, stream_metadata, records):
+        compiled = compile_transform(schema, stream_metadata)
+        for record in records:
+            try:
+                expected = Transformer().transform(copy.deepcopy(record), copy.deepcopy(schema), stream_metadata)
+            except SchemaMismatch:
+                with self.assertRaises(TransformMismatch):
+                    compiled(copy.deepcopy(record))
+                continue
+            self.assertEqual(compiled(copy.deepcopy(record)), expected)
+
+    def test_conformance_all_streams(self):
+        """
+        Test that the compiled transform of every stream gives the same records as Transformer.
+        """
+        rand = random.Random(1)
+        for stream in self.catalog.streams:
+            with self.subTest(stream=stream.tap_stream_id):
+                schema = stream.schema.to_dict()
+                records = [get_record(schema, rand) for _ in range(50)]
+                self.assert_conformance(schema, metadata.to_map(stream.metadata), records)
+
+    def test_field_selection(self):
+        """
+        Test that fields that are not selected are left out, except automatic ones.
+        """
+        stream = self.catalog.get_stream('tags')
+        stream_metadata = metadata.to_map(stream.metadata)
+        for field_name in ('tag', 'id'):
+            stream_metadata[('properties', field_name)]['selected'] = False
+        record = {'id': '1', 'tag': 'vip', 'tag_type': 'contact'}
+
+        transformed = compile_transform(stream.schema.to_dict(), stream_metadata)(record)
+        self.assertEqual(transformed, {'id': 1, 'tag_type': 'contact'})
+        self.assert_conformance(stream.schema.to_dict(), stream_metadata, [record])
+
+    def test_mismatch(self):
+        """
+        Test that values that do not match the schema raise TransformMismatch, as Transformer fails for them.
+        """
+        schema = {'type': 'object', 'properties': {
+            'id': {'type': ['null', 'integer']},
+            'cdate': {'type': ['null', 'string'], 'format': 'date-time'},
+            'data': {'type': 'object', 'properties': {'x': {'type': 'integer'}}}}}
+        records = [{'id': 'abc'}, {'cdate': 'not a date'}, {'data': None}, {'data': {'x': None}}, {'id': '7'}]
+        self.assert_conformance(schema, {}, records)
@@ -0,0 +1,214 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from tap_activecampaign import client
+from tap_activecampaign.concurrency import ConcurrencyLimiter, map_with_limit
+
+
+class Mockresponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = b'{}'
+
+    def json(self):
+        return {}
+
+
+def run_window(limiter, latency=0.1):
+    """
+    Complete a window of requests, holding as many requests in flight as the limit allows.
+    """
+    released = 0
+    while released < limiter.window_size:
+        held = min(int(limiter.limit), limiter.window_size - released)
+        for _ in range(held):
+            limiter.acquire()
+        for _ in range(held):
+            limiter.release(latency)
+        released += held
+
+
+def run_sequential_window(limiter, latency=0.1):
+    for _ in range(limiter.window_size):
+        limiter.acquire()
+        limiter.release(latency)
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+
+    def test_additive_increase_when_stable(self):
+        """
+        Test that the limit grows by one per window of stable latency, up to the maximum.
+        """
+        limiter = ConcurrencyLimiter(initial_limit=2, max_limit=4, window_size=5)
+        run_window(limiter)
+        self.assertEqual(limiter.limit, 3)
+        run_window(limiter)
+        run_window(limiter)
+        self.assertEqual(limiter.limit, 4)
+
+    @mock.patch("tap_activecampaign.concurrency.metrics.log")
+    def test_multiplicative_decrease_when_throttled(self, mocked_metrics_log):
+        """
+        Test that a throttled request halves the limit once per window and logs the new limit as a metric.
+        """
+        limiter = ConcurrencyLimiter(initial_limit=8, window_size=5)
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(0.1, throttled=True)
+        self.assertEqual(limiter.limit, 4)
+
+        # The window with throttling does not increase the limit
+        run_window(limiter)
+        self.assertEqual(limiter.limit, 4)
+
+        point = mocked_metrics_log.call_args[0][1]
+        self.assertEqual((point.metric, point.value), ('concurrency_limit', 4))
+
+    def test_decrease_on_rising_latency(self):
+        """
+        Test that the limit is halved when the window p95 latency rises above the baseline.
+        """
+        limiter = ConcurrencyLimiter(initial_limit=4, window_size=5)
+        run_window(limiter, latency=0.1)
+        self.assertEqual(limiter.limit, 5)
+        run_window(limiter, latency=1.0)
+        self.assertEqual(int(limiter.limit), 2)
+
+    def test_no_increase_below_limit(self):
+        """
+        Test that the limit does not grow while fewer requests than the limit are in flight, e.g. in a
+        sequential sync, so the limit stays one that was used.
+        """
+        limiter = ConcurrencyLimiter(initial_limit=2, max_limit=16, window_size=5)
+        for _ in range(5):
+            run_sequential_window(limiter)
+        self.assertEqual(limiter.limit, 2)
+
+        run_window(limiter)
+        self.assertEqual(limiter.limit, 3)
+
+    def test_never_below_minimum(self):
+        limiter = ConcurrencyLimiter(initial_limit=1, window_size=5)
+        limiter.acquire()
+        limiter.release(0.1, throttled=True)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_in_flight_requests_capped(self):
+        """
+        Test that concurrent threads never exceed the current limit of requests in flight.
+        """
+        limiter = ConcurrencyLimiter(initial_limit=2, max_limit=2)
+        lock = threading.Lock()
+        peak = [0]
+
+        def work():
+            limiter.acquire()
+            with lock:
+                peak[0] = max(peak[0], limiter.in_flight)
+            time.sleep(0.01)
+            limiter.release(0.01)
+
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+
+class TestMapWithLimit(unittest.TestCase):
+
+    def run_items(self, limiter, count, on_call=None):
+        lock = threading.Lock()
+        running = [0]
+        peaks = []
+
+        def work(item):
+            with lock:
+                running[0] += 1
+                peaks.append(running[0])
+            if on_call:
+                on_call(item)
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return item * 2
+
+        return map_with_limit(work, range(count), limiter), peaks
+
+    def test_calls_follow_limit(self):
+        """
+        Test that no more calls run at once than the limit of the limiter, and that more calls run once
+        the limit grows.
+        """
+        limiter = ConcurrencyLimiter(initial_limit=2, max_limit=8)
+
+        def raise_limit(item):
+            if item == 3:
+                limiter.limit = 6.0
+
+        results, peaks = self.run_items(limiter, 20, raise_limit)
+        self.assertEqual(results, [item * 2 for item in range(20)])
+        self.assertEqual(max(peaks[:4]), 2)
+        self.assertGreater(max(peaks), 2)
+        self.assertLessEqual(max(peaks), 6)
+
+    def test_without_limiter(self):
+        """
+        Test that all calls run at once without a limiter.
+        """
+        results, peaks = self.run_items(None, 5)
+        self.assertEqual(results, [0, 2, 4, 6, 8])
+        self.assertEqual(len(peaks), 5)
+
+    def test_error_raised(self):
+        """
+        Test that an error of a call is raised.
+        """
+        def fail(item):
+            raise ValueError(item)
+
+        with self.assertRaises(ValueError):
+            map_with_limit(fail, range(3), ConcurrencyLimiter(initial_limit=2))
+
+
+@mock.patch("time.sleep")
+@mock.patch("tap_activecampaign.client.ActiveCampaignClient.check_api_token")
+class TestClientConcurrency(unittest.TestCase):
+
+    @mock.patch("requests.Session.request", side_effect=[Mockresponse(429), Mockresponse(200)])
+    def test_rate_limit_error_reduces_limit(self, mocked_request, mocked_token, mocked_sleep):
+        """
+        Test that an ActiveCampaignRateLimitError response halves the concurrency limit of the client.
+        """
+        _client = client.ActiveCampaignClient('https://www.activecampaign.com', 'dummy_token', max_concurrency=8)
+        _client.limiter.limit = 8
+        _client.request('GET', 'contacts')
+
+        self.assertEqual(_client.limiter.limit, 4)
+        self.assertEqual(_client.limiter.in_flight, 0)
+
+    @mock.patch("requests.Session.request", return_value=Mockresponse(200))
+    def test_rate_limit_wait_not_in_latency(self, mocked_request, mocked_token, mocked_sleep):
+        """
+        Test that the wait for the rate budget happens before a request slot is taken, so the
+        latency samples of the concurrency limiter do not include the client's own queueing.
+        """
+        _client = client.ActiveCampaignClient('https://www.activecampaign.com', 'dummy_token')
+        in_flight = []
+
+        def wait():
+            in_flight.append(_client.limiter.in_flight)
+            threading.Event().wait(0.2)
+
+        _client.rate_limiter.wait = wait
+        with mock.patch.object(_client.limiter, 'release', wraps=_client.limiter.release) as mocked_release:
+            _client.request('GET', 'contacts')
+
+        self.assertEqual(in_flight, [0])
+        self.assertLess(mocked_release.call_args[0][0], 0.1)
@@ -0,0 +1,93 @@
+import threading
+import unittest
+from unittest import mock
+from urllib.parse import parse_qsl
+from tap_activecampaign.discover import discover
+from tap_activecampaign.streams import Contacts
+
+START_DATE = '2021-01-01T00:00:00Z'
+
+
+class FakeContactsClient:
+    """
+    Serves contacts with ids 1..total and supports the limit, orders[id], id_greater and id_less parameters.
+    """
+
+    base_url = 'https://www.activecampaign.com'
+
+    def __init__(self, total):
+        self.contacts = [{'id': str(contact_id), 'email': 'contact{}@example.com'.format(contact_id),
+                          'udate': '2021-02-{:02d}T00:00:00-05:00'.format(1 + contact_id % 28)}
+                         for contact_id in range(1, total + 1)]
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, path, params=None, endpoint=None):
+        params = dict(parse_qsl(params))
+        with self.lock:
+            self.requests.append(params)
+        contacts = [contact for contact in self.contacts
+                    if int(contact['id']) > int(params.get('id_greater', 0))
+                    and int(contact['id']) < int(params.get('id_less', 10 ** 9))]
+        if params.get('orders[id]') == 'DESC':
+            contacts.reverse()
+        return {'contacts': [dict(contact) for contact in contacts[:int(params['limit'])]],
+                'meta': {'total': str(len(contacts))}}
+
+
+class TestContactsShards(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+
+    def sync_shards(self, client, state, shard_count=4):
+        stream = Contacts(client)
+        with mock.patch.object(Contacts, 'write_record') as mocked_write_record, \
+                mock.patch.object(stream.writer, 'write_state'):
+            total = stream.sync_shards(self.catalog, state, START_DATE, shard_count)
+        return total, [args[1]['id'] for args, kwargs in mocked_write_record.call_args_list]
+
+    def test_get_shards(self):
+        """
+        Test that the id space from the preflight is split into contiguous ranges with an open-ended last range.
+        """
+        shards = Contacts(FakeContactsClient(1000)).get_shards('contacts', START_DATE, 4)
+
+        self.assertEqual([(shard['last_id'], shard['id_less']) for shard in shards],
+                         [(0, 251), (250, 501), (500, 751), (750, None)])
+
+    def test_sharded_sync_writes_all_records_once(self):
+        """
+        Test that all contacts are written exactly once and the shard bookmarks are merged into the contacts bookmark.
+        """
+        state = {}
+        total, ids = self.sync_shards(FakeContactsClient(1000), state)
+
+        self.assertEqual(total, 1000)
+        self.assertEqual(sorted(ids), list(range(1, 1001)))
+        self.assertEqual(state['bookmarks'], {'contacts': '2021-02-28T05:00:00.000000Z'})
+
+    def test_resume_unfinished_shards(self):
+        """
+        Test that an interrupted sharded sync continues each unfinished shard after its last checkpointed id.
+        """
+        state = {'bookmarks': {'contacts_shards': {
+            'last_datetime': START_DATE,
+            'shards': [
+                {'last_id': 100, 'id_less': 101, 'max_bookmark': '2021-02-10T00:00:00Z', 'complete': True},
+                {'last_id': 150, 'id_less': None, 'max_bookmark': START_DATE, 'complete': False}
+            ]}}}
+        client = FakeContactsClient(200)
+        total, ids = self.sync_shards(client, state)
+
+        self.assertEqual(sorted(ids), list(range(151, 201)))
+        # No preflight requests when resuming
+        self.assertTrue(all(request['limit'] == '100' for request in client.requests))
+        self.assertNotIn('contacts_shards', state['bookmarks'])
+
+    def test_no_contacts(self):
+        state = {'bookmarks': {'contacts': '2021-03-01T00:00:00Z'}}
+        total, ids = self.sync_shards(FakeContactsClient(0), state)
+
+        self.assertEqual((total, ids), (0, []))
+        self.assertEqual(state, {'bookmarks': {'contacts': '2021-03-01T00:00:00Z'}})
@@ -0,0 +1,34 @@
+import unittest
+from unittest import mock
+from singer.transform import string_to_datetime
+from tap_activecampaign.datetimes import normalize_datetime, normalize_datetime_string, parse_fixed_format
+
+
+class TestNormalizeDatetime(unittest.TestCase):
+
+    def test_same_as_singer(self):
+        """
+        Test that the API formats and other values are normalized as singer's Transformer does.
+        """
+        values = ['2021-02-01 10:11:12', '2021-02-01T10:11:12Z', '2021-02-01T10:11:12-05:00',
+                  '2021-02-01T23:59:59+05:30', '2021-12-31T23:00:00-05:00', '2021-02-01T10:11:12.1Z',
+                  '2021-02-01T10:11:12.123456+00:00', '2021-02-01T10:11:12.123456789Z', '2021-02-01',
+                  '2020-02-29 00:00:00', '2021-02-30 00:00:00', '9999-12-31T23:59:59-01:00', 'not a date']
+        for value in values:
+            with self.subTest(value=value):
+                self.assertEqual(normalize_datetime(value), string_to_datetime(value))
+
+    def test_empty_values(self):
+        self.assertIsNone(normalize_datetime(None))
+        self.assertIsNone(normalize_datetime(''))
+
+    def test_repeated_values_cached(self):
+        """
+        Test that a repeated value is parsed once.
+        """
+        normalize_datetime_string.cache_clear()
+        with mock.patch('tap_activecampaign.datetimes.parse_fixed_format', wraps=parse_fixed_format) as mocked_parse:
+            for _ in range(1000):
+                self.assertEqual(normalize_datetime('2021-02-01 10:11:12'), '2021-02-01T10:11:12.000000Z')
+        self.assertEqual(mocked_parse.call_count, 1)
+        self.assertEqual(normalize_datetime_string.cache_info().hits, 999)
@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs
+from tap_activecampaign.discover import discover
+from tap_activecampaign.streams import Templates
+
+START_DATE = '2021-01-01T00:00:00Z'
+
+
+def get_templates(count, descending=True):
+    # One template per day from 2021-01-01, newest first when descending
+    templates = [{'id': str(day), 'name': 'template {}'.format(day),
+                  'mdate': '2021-{:02d}-{:02d}T00:00:00-05:00'.format(1 + (day - 1) // 28, 1 + (day - 1) % 28)}
+                 for day in range(1, count + 1)]
+    return list(reversed(templates)) if descending else templates
+
+
+class FakeTemplatesClient:
+    """
+    Returns the templates page by page, as the API does for the offset and limit of the query, sorted by
+    `orders[mdate]` unless `sorts` is False.
+    """
+
+    base_url = 'https://example.api-us1.com/api/3/'
+
+    def __init__(self, templates, sorts=True):
+        self.templates = templates
+        self.sorts = sorts
+        self.queries = []
+
+    def get(self, path, params, endpoint):
+        query = {key: values[0] for key, values in parse_qs(params).items()}
+        self.queries.append(query)
+        offset, limit = int(query['offset']), int(query['limit'])
+        templates = self.templates
+        if self.sorts and 'orders[mdate]' in query:
+            templates = sorted(templates, key=lambda template: template['mdate'],
+                               reverse=query['orders[mdate]'] == 'DESC')
+        return {'templates': templates[offset:offset + limit], 'meta': {'total': str(len(self.templates))}}
+
+
+class TestDescendingScan(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+
+    def sync_templates(self, client, state):
+        stream = Templates(client)
+        with mock.patch.object(Templates, 'write_record') as mocked_write_record, \
+                mock.patch.object(stream.writer, 'write_state'):
+            stream.sync(client, self.catalog, state, START_DATE, stream.path, ['templates'])
+        return [args[1]['id'] for args, kwargs in mocked_write_record.call_args_list]
+
+    def test_stops_at_page_older_than_bookmark(self):
+        """
+        Test that paging stops at the first page reaching records older than the bookmark.
+        """
+        client = FakeTemplatesClient(get_templates(300))
+        # Day 150 of the 300 templates: records of the first two pages (days 300 to 101) are read
+        state = {'bookmarks': {'templates': '2021-06-10T05:00:00.000000Z'}}
+        written = self.sync_templates(client, state)
+
+        # Two pages, then the newest and oldest first records confirming the sort
+        self.assertEqual(len(client.queries), 4)
+        self.assertEqual(client.queries[0]['orders[mdate]'], 'DESC')
+        self.assertEqual([(query['limit'], query['orders[mdate]']) for query in client.queries[2:]],
+                         [('1', 'DESC'), ('1', 'ASC')])
+        self.assertEqual(written, list(range(300, 149, -1)))
+        self.assertEqual(state['bookmarks']['templates'], '2021-11-20T05:00:00.000000Z')
+
+    def test_unsorted_response_reads_all_pages(self):
+        """
+        Test that all pages are read when the records are not sorted newest first.
+        """
+        client = FakeTemplatesClient(get_templates(300, descending=False), sorts=False)
+        state = {'bookmarks': {'templates': '2021-06-10T05:00:00.000000Z'}}
+        written = self.sync_templates(client, state)
+
+        # Paging continues to the end, as for any stream
+        self.assertEqual(len(client.queries), 4)
+        self.assertEqual(written, list(range(150, 301)))
+        self.assertEqual(state['bookmarks']['templates'], '2021-11-20T05:00:00.000000Z')
+
+    def test_sort_ignored_by_api_reads_all_pages(self):
+        """
+        Test that paging does not stop when a first page older than the bookmark is in order by chance
+        but the API does not apply the sort: the newer records of the next pages are still read.
+        """
+        # Templates of a bulk import sharing their mdate, then newer templates
+        bulk = [{'id': str(template_id), 'name': 'bulk', 'mdate': '2021-01-01T00:00:00-05:00'}
+                for template_id in range(1, 101)]
+        templates = bulk + get_templates(150, descending=False)[100:]
+        for template in templates[100:]:
+            template['id'] = str(int(template['id']) + 1000)
+        client = FakeTemplatesClient(templates, sorts=False)
+        state = {'bookmarks': {'templates': '2021-03-01T05:00:00.000000Z'}}
+        written = self.sync_templates(client, state)
+
+        self.assertEqual(len(client.queries), 2 + 2)
+        self.assertEqual(written, [int(template['id']) for template in templates
+                                   if template['mdate'] >= '2021-03-01'])
+        self.assertEqual(state['bookmarks']['templates'], '2021-06-10T05:00:00.000000Z')
@@ -0,0 +1,100 @@
+import copy
+import os
+import tempfile
+import unittest
+from unittest import mock
+from tap_activecampaign.discover import discover
+from tap_activecampaign.fingerprints import FingerprintStore, get_fingerprint_store
+from tap_activecampaign.streams import Tags
+
+
+def get_page(tags):
+    return {"tags": tags, "meta": {"total": str(len(tags))}}
+
+
+TAGS = [
+    {"id": "1", "tag": "customer", "tagType": "contact", "cdate": "2021-01-01T00:00:00-05:00"},
+    {"id": "2", "tag": "lead", "tagType": "contact", "cdate": "2021-01-01T00:00:00-05:00"},
+    {"id": "3", "tag": "vip", "tagType": "contact", "cdate": "2021-01-01T00:00:00-05:00"}
+]
+
+
+class TestFingerprintStore(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+
+    def sync_tags(self, tags, fingerprints):
+        client = mock.Mock()
+        client.get.return_value = get_page([dict(tag) for tag in tags])
+        stream = Tags(client, fingerprints=fingerprints)
+        with mock.patch.object(Tags, 'write_record') as mocked_write_record:
+            stream.sync(client, self.catalog, {}, '2019-01-01T00:00:00Z', stream.path, ['tags'])
+        return [args[1]['id'] for args, kwargs in mocked_write_record.call_args_list]
+
+    def test_only_changed_records_written(self):
+        """
+        Test that a second run writes only new or changed FULL_TABLE records and reports removed keys.
+        """
+        state = {}
+        self.assertEqual(self.sync_tags(TAGS, get_fingerprint_store({'fingerprint_store': 'state'}, state)), [1, 2, 3])
+        self.assertEqual(set(state['fingerprints']['tags']), {'1', '2', '3'})
+
+        changed_tags = [TAGS[0], dict(TAGS[1], tag='prospect'), {"id": "4", "tag": "new", "tagType": "contact"}]
+        fingerprints = get_fingerprint_store({'fingerprint_store': 'state'}, state)
+        removed_keys = []
+        finish_stream = fingerprints.finish_stream
+        fingerprints.finish_stream = lambda stream_name: removed_keys.extend(finish_stream(stream_name))
+        self.assertEqual(self.sync_tags(changed_tags, fingerprints), [2, 4])
+
+        # Verify the key of the deleted record is reported
+        self.assertEqual(removed_keys, ['3'])
+        self.assertEqual(set(state['fingerprints']['tags']), {'1', '2', '4'})
+
+    def test_removed_keys(self):
+        """
+        Test that finish_stream returns the keys seen in the previous run only.
+        """
+        store = FingerprintStore({'tags': {'1': 'a', '2': 'b'}})
+        store.is_changed('tags', {'id': 1}, ['id'])
+        self.assertEqual(store.finish_stream('tags'), ['2'])
+
+    def test_sidecar_file(self):
+        """
+        Test that fingerprints persisted in a sidecar file are used by the next run once the target
+        has saved the state of the run.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = {'fingerprint_store': os.path.join(tmp_dir, 'fingerprints.json')}
+            state = {}
+            self.assertEqual(len(self.sync_tags(TAGS, get_fingerprint_store(config, state))), 3)
+            self.assertNotIn('fingerprints', state)
+            self.assertEqual(self.sync_tags(TAGS, get_fingerprint_store(config, state)), [])
+            self.assertTrue(os.path.exists(config['fingerprint_store']))
+
+    def test_sidecar_file_not_promoted_without_state(self):
+        """
+        Test that the fingerprints staged by a run whose state the target did not save are discarded,
+        so the records of a failed load are written again by the next run.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = {'fingerprint_store': os.path.join(tmp_dir, 'fingerprints.json')}
+            state = {}
+            self.assertEqual(len(self.sync_tags(TAGS, get_fingerprint_store(config, state))), 3)
+            self.assertEqual(self.sync_tags(TAGS, get_fingerprint_store(config, state)), [])
+
+            # The target fails to load the changed record: the next run starts from the previous state
+            saved_state = copy.deepcopy(state)
+            changed_tags = [TAGS[0], dict(TAGS[1], tag='prospect'), TAGS[2]]
+            self.assertEqual(self.sync_tags(changed_tags, get_fingerprint_store(config, copy.deepcopy(saved_state))),
+                             [2])
+            self.assertEqual(self.sync_tags(changed_tags, get_fingerprint_store(config, saved_state)), [2])
+            self.assertEqual(self.sync_tags(changed_tags, get_fingerprint_store(config, saved_state)), [])
+
+    def test_disabled_by_default(self):
+        """
+        Test that all records are written when no fingerprint store is configured.
+        """
+        self.assertIsNone(get_fingerprint_store({}, {}))
+        self.assertEqual(len(self.sync_tags(TAGS, None)), 3)
+        self.assertEqual(len(self.sync_tags(TAGS, None)), 3)
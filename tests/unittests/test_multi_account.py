@@ -0,0 +1,142 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+from singer import utils
+from tap_activecampaign.client import RateLimiter
+from tap_activecampaign.discover import discover
+from tap_activecampaign.multi import AccountWriter, MultiAccountState, get_account_config, sync_accounts
+from tap_activecampaign.streams import STREAMS
+from tap_activecampaign.workers import get_transform_pool
+
+CONFIG = {
+    'start_date': '2021-01-01T00:00:00Z',
+    'user_agent': 'test',
+    'accounts': [
+        {'name': 'acme', 'api_url': 'https://acme.api-us1.com', 'api_token': 'token1'},
+        {'api_url': 'https://globex.api-us1.com', 'api_token': 'token2'}
+    ]
+}
+
+
+def fake_sync_account(config, catalog, state, writer):
+    """
+    Write a schema, one record and the state, like sync() for a single stream.
+    """
+    writer.write_schema('tags', {'type': 'object'}, ['id'])
+    writer.write_record('tags', {'id': 1, 'account': config['api_token']})
+    state['bookmarks'] = {'tags': config['api_token']}
+    writer.write_state(state)
+
+
+def get_messages(lines):
+    return [json.loads(line) for line in lines.splitlines()]
+
+
+class TestMultiAccount(unittest.TestCase):
+
+    def test_prefix_output(self):
+        """
+        Test that records of all accounts go to stdout with prefixed stream names and the state combines all accounts.
+        """
+        state = {'accounts': {'acme': {'bookmarks': {'tags': 'old'}}}}
+        with redirect_stdout(io.StringIO()) as stdout:
+            sync_accounts(CONFIG, None, state, fake_sync_account)
+        messages = get_messages(stdout.getvalue())
+
+        self.assertEqual(sorted(message['stream'] for message in messages if message['type'] == 'RECORD'),
+                         ['acme__tags', 'globex__tags'])
+        self.assertEqual(messages[-1]['value']['accounts'], {
+            'acme': {'bookmarks': {'tags': 'token1'}},
+            'globex': {'bookmarks': {'tags': 'token2'}}})
+
+    def test_file_per_account(self):
+        """
+        Test that each account gets its own output file with standard stream names and state.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir, redirect_stdout(io.StringIO()) as stdout:
+            sync_accounts(dict(CONFIG, output='files', output_dir=tmp_dir), None, {}, fake_sync_account)
+            with open(os.path.join(tmp_dir, 'globex.jsonl')) as file:
+                messages = get_messages(file.read())
+
+        self.assertEqual([message['type'] for message in messages], ['SCHEMA', 'RECORD', 'STATE'])
+        self.assertEqual(messages[1]['stream'], 'tags')
+        self.assertEqual(messages[2]['value'], {'bookmarks': {'tags': 'token2'}})
+        # The combined state is still written to stdout
+        self.assertEqual(set(get_messages(stdout.getvalue())[-1]['value']['accounts']), {'acme', 'globex'})
+
+    def test_failed_account_does_not_stop_others(self):
+        """
+        Test that the other accounts are synced when one fails, and the failure is raised at the end.
+        """
+        synced = []
+
+        def sync_account(config, catalog, state, writer):
+            if config['api_token'] == 'token1':
+                raise Exception('invalid token')
+            synced.append(config['api_token'])
+
+        with self.assertRaisesRegex(Exception, 'Sync failed for accounts: acme'):
+            sync_accounts(CONFIG, None, {}, sync_account)
+        self.assertEqual(synced, ['token2'])
+
+    def test_stream_writes_through_account_writer(self):
+        """
+        Test that a stream writes its schema, records and state through an AccountWriter, including the
+        records of a TransformPool page whose serialized lines carry the stream name without the prefix.
+        """
+        catalog = discover()
+        record = {'id': '1', 'tag': 'vip', 'tag_type': 'contact', 'cdate': '2021-02-01T10:11:12-05:00'}
+        with redirect_stdout(io.StringIO()) as stdout:
+            writer = AccountWriter('acme', MultiAccountState({'acme': {}}))
+            self.assertIsNone(get_transform_pool({'transform_workers': 0}, catalog, writer))
+            stream = STREAMS['tags'](None, writer=writer)
+            stream.write_schema(catalog, 'tags')
+            stream.process_records(catalog, 'tags', [dict(record)], utils.now())
+            transformed_record = {'id': 2, 'tag': 'new'}
+            stream.process_records(catalog, 'tags', [{'id': '2'}], utils.now(),
+                                   transformed_records=[transformed_record],
+                                   lines=['{"type": "RECORD", "stream": "tags", "record": {"id": 2}}'])
+            stream.write_bookmark({}, 'tags', '2021-02-01T15:11:12.000000Z')
+            writer.close()
+        messages = get_messages(stdout.getvalue())
+
+        self.assertFalse(writer.record_lines)
+        self.assertEqual([(message['type'], message.get('stream')) for message in messages], [
+            ('SCHEMA', 'acme__tags'), ('RECORD', 'acme__tags'), ('RECORD', 'acme__tags'), ('STATE', None)])
+        self.assertEqual(messages[1]['record']['id'], 1)
+        self.assertEqual(messages[2]['record'], transformed_record)
+        self.assertEqual(messages[3]['value'],
+                         {'accounts': {'acme': {'bookmarks': {'tags': '2021-02-01T15:11:12.000000Z'}}}})
+
+    def test_account_config(self):
+        """
+        Test that account values override the shared config and local files are kept per account.
+        """
+        config = dict(CONFIG, cassette_mode='record', fingerprint_store='/tmp/fingerprints.json', rate_limit=5)
+        account_config = get_account_config(config, dict(CONFIG['accounts'][0], rate_limit=2))
+
+        self.assertNotIn('accounts', account_config)
+        self.assertEqual(account_config['rate_limit'], 2)
+        self.assertEqual(account_config['cassette_dir'], os.path.join('cassette', 'acme'))
+        self.assertEqual(account_config['fingerprint_store'], '/tmp/fingerprints_acme.json')
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    @mock.patch("time.sleep")
+    def test_rate_budget_per_instance(self, mocked_sleep):
+        """
+        Test that each rate limiter has its own budget.
+        """
+        first, second = RateLimiter(2, 1), RateLimiter(2, 1)
+        for _ in range(2):
+            first.wait()
+            second.wait()
+        self.assertEqual(mocked_sleep.call_count, 0)
+
+        first.wait()
+        self.assertEqual(mocked_sleep.call_count, 1)
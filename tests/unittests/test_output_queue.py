@@ -0,0 +1,73 @@
+import io
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+from tap_activecampaign.output import WRITER, OutputQueue, SingerWriter, get_writer
+
+
+class TestOutputQueue(unittest.TestCase):
+
+    def test_lines_written_in_order(self):
+        """
+        Test that all messages are written to stdout in order by the writer thread once the writer is closed.
+        """
+        with redirect_stdout(io.StringIO()) as stdout:
+            writer = SingerWriter(queue_max_bytes=1024)
+            for tag_id in range(100):
+                writer.write_record('tags', {'id': tag_id})
+            writer.write_state({'bookmarks': {}})
+            writer.close()
+
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 101)
+        self.assertEqual(lines[5], '{"type": "RECORD", "stream": "tags", "record": {"id": 5}}')
+        self.assertIn('STATE', lines[-1])
+
+    @mock.patch("tap_activecampaign.output.metrics.log")
+    def test_producer_blocks_at_memory_cap(self, mocked_metrics_log):
+        """
+        Test that producers continue while the target is slow until the cap is reached, and the blocked time is reported.
+        """
+        target_ready = threading.Event()
+        written = []
+
+        def slow_target(text):
+            target_ready.wait()
+            written.append(text)
+
+        queue = OutputQueue(slow_target, max_bytes=30)
+        # 11 bytes per line: two lines fit in the cap while the target is stuck
+        for _ in range(2):
+            queue.put('0123456789')
+
+        producer = threading.Thread(target=lambda: queue.put('0123456789'))
+        producer.start()
+        time.sleep(0.2)
+        # Blocked at the memory cap until the target catches up
+        self.assertTrue(producer.is_alive())
+        target_ready.set()
+        producer.join()
+        queue.close()
+
+        self.assertEqual(''.join(written), '0123456789\n' * 3)
+        self.assertGreater(queue.blocked_seconds, 0.1)
+        metric_names = [args[1].metric for args, kwargs in mocked_metrics_log.call_args_list]
+        self.assertIn('output_queue_depth', metric_names)
+        self.assertIn('output_blocked_time', metric_names)
+
+    def test_writer_error_raised(self):
+        """
+        Test that an error of the writer thread (e.g. a closed pipe) is raised to the producer.
+        """
+        queue = OutputQueue(mock.Mock(side_effect=BrokenPipeError()), max_bytes=1024)
+        queue.put('line')
+        with self.assertRaises(BrokenPipeError):
+            queue.close()
+
+    def test_get_writer(self):
+        writer = get_writer({'output_queue_max_mb': 1})
+        self.assertEqual(writer.queue.max_bytes, 1024 * 1024)
+        writer.close()
+        self.assertIs(get_writer({'output_queue_max_mb': 0}), WRITER)
@@ -0,0 +1,75 @@
+import glob
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from tap_activecampaign.output import get_writer
+from tap_activecampaign.schema import get_schemas
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    from tap_activecampaign.parquet_export import ParquetWriter, get_arrow_schema
+except ImportError:
+    pyarrow = None
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'id': {'type': ['null', 'integer']},
+        'email': {'type': ['null', 'string']},
+        'udate': {'type': ['null', 'string'], 'format': 'date-time'},
+        'score': {'type': 'number'},
+        'links': {'type': ['null', 'object'], 'properties': {'bounce': {'type': ['null', 'string']}}},
+        'tags': {'type': 'array', 'items': {'type': ['null', 'integer']}},
+        'fields': {'anyOf': [{'type': 'string'}, {'type': 'object'}]}
+    }
+}
+
+
+@unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+class TestParquetExport(unittest.TestCase):
+
+    def test_arrow_schema_from_json_schema(self):
+        arrow_schema, _ = get_arrow_schema(SCHEMA)
+
+        self.assertEqual(arrow_schema.field('id').type, pyarrow.int64())
+        self.assertEqual(arrow_schema.field('udate').type, pyarrow.timestamp('us', tz='UTC'))
+        self.assertEqual(arrow_schema.field('score').type, pyarrow.float64())
+        self.assertEqual(arrow_schema.field('links').type, pyarrow.struct([('bounce', pyarrow.string())]))
+        self.assertEqual(arrow_schema.field('tags').type, pyarrow.list_(pyarrow.int64()))
+        self.assertEqual(arrow_schema.field('fields').type, pyarrow.string())
+
+    def test_all_stream_schemas_convert(self):
+        schemas, _ = get_schemas()
+        for stream_name, schema in schemas.items():
+            self.assertEqual(len(get_arrow_schema(schema)[0]), len(schema['properties']), stream_name)
+
+    def test_export_and_state(self):
+        """
+        Test that records are exported to Parquet in row groups, the file is completed before the state, and only the state goes to stdout.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir, redirect_stdout(io.StringIO()) as stdout:
+            writer = get_writer({'export_dir': tmp_dir, 'export_batch_size': 2})
+            self.assertIsInstance(writer, ParquetWriter)
+            writer.write_schema('contacts', SCHEMA, ['id'])
+            for contact_id in range(3):
+                writer.write_record('contacts', {
+                    'id': contact_id, 'email': 'c{}@example.com'.format(contact_id),
+                    'udate': '2021-02-01T00:00:00.000000Z', 'score': 1.5,
+                    'links': {'bounce': 'url'}, 'tags': [1, 2], 'fields': {'a': 1}})
+            writer.write_state({'bookmarks': {'contacts': '2021-02-01T00:00:00.000000Z'}})
+
+            files = glob.glob(os.path.join(tmp_dir, 'contacts', '*.parquet'))
+            self.assertEqual(len(files), 1)
+            parquet_file = pyarrow.parquet.ParquetFile(files[0])
+            self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+            table = parquet_file.read()
+            writer.close()
+
+        self.assertEqual(table.column('id').to_pylist(), [0, 1, 2])
+        self.assertEqual(table.column('fields').to_pylist()[0], '{"a": 1}')
+        self.assertEqual(str(table.column('udate')[0].as_py()), '2021-02-01 00:00:00+00:00')
+        self.assertEqual([json.loads(line)['type'] for line in stdout.getvalue().splitlines()], ['STATE'])
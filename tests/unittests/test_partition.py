@@ -0,0 +1,199 @@
+import argparse
+import unittest
+from unittest import mock
+from tap_activecampaign.budget import RuntimeBudgetSpent
+from tap_activecampaign.discover import discover
+from tap_activecampaign.partition import get_partition_streams, merge_states, parse_partition
+from tap_activecampaign.streams import Activities, Contacts
+from tap_activecampaign.sync import get_sync_streams, sync
+from test_contacts_shards import FakeContactsClient, START_DATE
+from test_runtime_budget import FakeActivitiesClient, get_activities
+
+
+class TestPartition(unittest.TestCase):
+
+    def test_parse_partition(self):
+        self.assertEqual(parse_partition('2/3'), (2, 3))
+        for value in ('0/3', '4/3', '1', 'a/b', '1/0'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_partition(value)
+
+    def test_streams_assigned_once(self):
+        """
+        Test that every stream is assigned to exactly one partition, except the shared sharded streams.
+        """
+        stream_names = ['tags', 'contacts', 'deals', 'accounts', 'users', 'forms', 'lists']
+        assignments = [get_partition_streams(stream_names, (index, 3), shared_streams=['contacts'])
+                       for index in (1, 2, 3)]
+
+        for streams in assignments:
+            self.assertIn('contacts', streams)
+        others = sorted(name for streams in assignments for name in streams if name != 'contacts')
+        self.assertEqual(others, sorted(set(stream_names) - {'contacts'}))
+        # Same input, same assignment
+        self.assertEqual(assignments[0], get_partition_streams(list(reversed(stream_names)), (1, 3), ['contacts']))
+
+    def test_streams_assigned_by_duration(self):
+        """
+        Test that with durations of previous runs the longest streams are spread across the partitions.
+        """
+        stream_names = ['tags', 'contacts', 'deals', 'accounts', 'users', 'forms']
+        durations = {'contacts': 100.0, 'deals': 90.0, 'accounts': 20.0, 'users': 15.0, 'tags': 5.0}
+        assignments = [get_partition_streams(stream_names, (index, 2), durations=durations) for index in (1, 2)]
+
+        # forms has no duration and is assigned first, round-robin
+        self.assertEqual(assignments, [['contacts', 'forms', 'users'], ['accounts', 'deals', 'tags']])
+
+    def test_merge_bookmarks(self):
+        """
+        Test that the latest bookmark of each stream and all fingerprints are kept.
+        """
+        states = [
+            {'currently_syncing': 'deals', 'bookmarks': {'tags': '2021-01-01T00:00:00Z', 'deals': '2021-03-01T00:00:00Z'},
+             'fingerprints': {'tags': {'1': 'a'}}},
+            {'bookmarks': {'tags': '2021-02-01T00:00:00Z', 'deals': '2021-01-01T00:00:00Z'},
+             'fingerprints': {'lists': {'2': 'b'}}}
+        ]
+        self.assertEqual(merge_states(states), {
+            'bookmarks': {'tags': '2021-02-01T00:00:00Z', 'deals': '2021-03-01T00:00:00Z'},
+            'fingerprints': {'tags': {'1': 'a'}, 'lists': {'2': 'b'}},
+            'currently_syncing': 'deals'})
+
+    def test_merge_stream_history(self):
+        """
+        Test that the latest run of each stream is kept.
+        """
+        states = [
+            {'stream_history': {'tags': {'seconds': 3.0, 'records': 5, 'synced_at': '2021-02-01T00:00:00.000000Z'},
+                                'deals': {'seconds': 9.0, 'records': 50, 'synced_at': '2021-01-01T00:00:00.000000Z'}}},
+            {'stream_history': {'tags': {'seconds': 4.0, 'records': 6, 'synced_at': '2021-01-01T00:00:00.000000Z'},
+                                'deals': {'seconds': 8.0, 'records': 40, 'synced_at': '2021-02-01T00:00:00.000000Z'}}}
+        ]
+        history = merge_states(states)['stream_history']
+        self.assertEqual(history['tags']['seconds'], 3.0)
+        self.assertEqual(history['deals']['seconds'], 8.0)
+
+    def test_same_assignment_from_partition_states(self):
+        """
+        Test that partitions started from their own states, with different stream histories, still get
+        the assignment of the merged durations, and that the merge refuses states of different runs.
+        """
+        catalog = discover()
+        for stream in catalog.streams:
+            stream.metadata[0]['metadata']['selected'] = stream.tap_stream_id in ('tags', 'deals', 'users', 'forms')
+        merged = merge_states([{'stream_history': {
+            'deals': {'seconds': 90.0, 'records': 10, 'synced_at': '2021-01-01T00:00:00.000000Z'},
+            'users': {'seconds': 20.0, 'records': 10, 'synced_at': '2021-01-01T00:00:00.000000Z'}}}])
+        self.assertEqual(merged['partition_durations'], {'deals': 90.0, 'users': 20.0})
+
+        states = [dict(merged, stream_history={'tags': {'seconds': seconds, 'records': 1,
+                                                         'synced_at': '2021-02-01T00:00:00.000000Z'}})
+                  for seconds in (500.0, 1.0)]
+        assignments = [get_sync_streams(catalog, state, {}, (index, 2))[1] for index, state in zip((1, 2), states)]
+        self.assertEqual(sorted(assignments[0] + assignments[1]), ['deals', 'forms', 'tags', 'users'])
+
+        with self.assertRaisesRegex(Exception, 'started from different states'):
+            merge_states([merged, {'bookmarks': {}}])
+
+    def sync_activities(self, client, state, budget=None):
+        stream = Activities(client, budget=budget)
+        with mock.patch.object(Activities, 'write_record'), mock.patch.object(stream.writer, 'write_state'):
+            stream.sync(client, discover(), state, START_DATE, stream.path, ['activities'])
+
+    def test_merge_keeps_checkpoints(self):
+        """
+        Test that the checkpoints of the partitions stopped by the runtime budget are merged with the
+        currently syncing stream, and that the next run resumes from the merged state.
+        """
+        client = FakeActivitiesClient(get_activities(250))
+        stopped = {'currently_syncing': 'activities', 'bookmarks': {'activities': START_DATE}}
+        with self.assertRaises(RuntimeBudgetSpent):
+            self.sync_activities(client, stopped, mock.Mock(**{'is_spent.return_value': True}))
+        other = {'currently_syncing': 'deals', 'bookmarks': {'tags': START_DATE},
+                 'checkpoint': {'stream': 'deals', 'offset': 300, 'last_datetime': START_DATE, 'max_bookmark': None}}
+        finished = {'bookmarks': {'users': START_DATE}}
+
+        merged = merge_states([finished, stopped, other])
+        self.assertEqual(merged['checkpoint'], [stopped['checkpoint'], other['checkpoint']])
+        self.assertEqual(merged['currently_syncing'], 'activities')
+
+        client.queries.clear()
+        self.sync_activities(client, merged)
+        self.assertEqual(client.queries[0]['offset'], '100')
+        # The checkpoint of the other stream is kept until that stream resumes
+        self.assertEqual(merged['checkpoint'], other['checkpoint'])
+        self.assertEqual(merged['bookmarks']['activities'], '2021-02-28T05:00:00.000000Z')
+
+    @mock.patch('tap_activecampaign.sync.get_writer')
+    @mock.patch.object(Activities, 'write_schema')
+    @mock.patch.object(Activities, 'sync', return_value=0)
+    def test_partition_drops_checkpoints_of_other_partitions(self, mocked_sync, mocked_write_schema,
+                                                             mocked_get_writer):
+        """
+        Test that a partition keeps only the checkpoints of its own streams, so a stream finished by
+        another partition is not brought back by the next merge.
+        """
+        catalog = discover()
+        for stream in catalog.streams:
+            stream.metadata[0]['metadata']['selected'] = stream.tap_stream_id in ('activities', 'tags')
+        checkpoints = [{'stream': stream_name, 'offset': 100, 'last_datetime': START_DATE, 'max_bookmark': None}
+                       for stream_name in ('activities', 'tags')]
+        # Round-robin in name order: activities in partition 1, tags in partition 2
+        state = {'currently_syncing': 'tags', 'checkpoint': list(checkpoints)}
+        sync(mock.Mock(), {'start_date': START_DATE}, catalog, state, partition=(1, 2))
+
+        self.assertEqual(state['checkpoint'], checkpoints[0])
+        self.assertNotIn('currently_syncing', state)
+
+    def test_mismatched_shard_plans_discarded(self):
+        """
+        Test that shard checkpoints with different id ranges are dropped, keeping the previous contacts bookmark.
+        """
+        def get_state(id_less):
+            return {'bookmarks': {'contacts': START_DATE, 'contacts_shards': {'last_datetime': START_DATE, 'shards': [
+                {'index': 0, 'id_greater': -1, 'last_id': 10, 'id_less': id_less, 'max_bookmark': START_DATE, 'complete': True},
+                {'index': 1, 'id_greater': id_less - 1, 'last_id': 10, 'id_less': None, 'max_bookmark': START_DATE, 'complete': True}]}}}
+
+        self.assertEqual(merge_states([get_state(1000), get_state(2000)]), {'bookmarks': {'contacts': START_DATE}})
+
+
+class TestPartitionedContacts(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+
+    def sync_partition(self, client, state, partition):
+        stream = Contacts(client)
+        with mock.patch.object(Contacts, 'write_record') as mocked_write_record, \
+                mock.patch.object(stream.writer, 'write_state'):
+            stream.sync_shards(self.catalog, state, START_DATE, 4, partition=partition)
+        return [args[1]['id'] for args, kwargs in mocked_write_record.call_args_list]
+
+    def test_shards_split_across_partitions(self):
+        """
+        Test that two partitions sync disjoint contacts shards, and that merging their states gives the contacts bookmark.
+        """
+        client = FakeContactsClient(2500)
+        states = [{}, {}]
+        ids = [self.sync_partition(client, states[0], (1, 2)), self.sync_partition(client, states[1], (2, 2))]
+
+        self.assertEqual(sorted(ids[0] + ids[1]), list(range(1, 2501)))
+        self.assertTrue(ids[0] and ids[1])
+        # Each partition keeps its checkpoint, the contacts bookmark is only set by the merge
+        for state in states:
+            self.assertNotIn('contacts', state['bookmarks'])
+        self.assertEqual(merge_states(states), {'bookmarks': {'contacts': '2021-02-28T05:00:00.000000Z'}})
+
+    def test_incomplete_partition_resumes_after_merge(self):
+        """
+        Test that the merged state keeps the checkpoint until all shards are complete and a partition resumes from it.
+        """
+        client = FakeContactsClient(2500)
+        first = {}
+        first_ids = self.sync_partition(client, first, (1, 2))
+        merged = merge_states([first])
+        self.assertIn('contacts_shards', merged['bookmarks'])
+
+        ids = self.sync_partition(client, merged, (2, 2))
+        self.assertEqual(sorted(first_ids + ids), list(range(1, 2501)))
+        self.assertEqual(merge_states([merged])['bookmarks'], {'contacts': '2021-02-28T05:00:00.000000Z'})
@@ -0,0 +1,100 @@
+import copy
+import unittest
+from singer import metadata, Transformer
+from tap_activecampaign.compiled_transform import compile_transform
+from tap_activecampaign.discover import discover
+from tap_activecampaign.passthrough import PassthroughTransform
+from tap_activecampaign.streams import Tags
+
+
+def get_tag(tag_id):
+    return {'id': str(tag_id), 'tag': 'tag {}'.format(tag_id), 'tag_type': 'contact', 'description': None,
+            'cdate': '2021-02-01T10:11:12-05:00', 'links': {}}
+
+
+class TestPassthrough(unittest.TestCase):
+
+    def setUp(self):
+        stream = discover().get_stream('tags')
+        self.schema = stream.schema.to_dict()
+        self.stream_metadata = metadata.to_map(stream.metadata)
+
+    def get_passthrough(self, sample_size=5, sample_every=4):
+        compiled = compile_transform(self.schema, self.stream_metadata)
+        self.full_transforms = 0
+
+        def full_transform(record):
+            self.full_transforms += 1
+            return compiled(record)
+        return PassthroughTransform('tags', self.schema, self.stream_metadata, full_transform,
+                                    sample_size=sample_size, sample_every=sample_every)
+
+    def transformer(self, record):
+        return Transformer().transform(copy.deepcopy(record), self.schema, self.stream_metadata)
+
+    def test_trusted_fields(self):
+        """
+        Test that the fields unchanged in the sample are copied and the other ones still converted.
+        """
+        passthrough = self.get_passthrough()
+        records = [get_tag(tag_id) for tag_id in range(1, 21)]
+        transformed = [passthrough.transform(copy.deepcopy(record)) for record in records]
+
+        # description is null in every record, it is not trusted
+        self.assertEqual(passthrough.trusted_fields, {'tag': str, 'tag_type': str})
+        self.assertEqual(transformed, [self.transformer(record) for record in records])
+        # 5 records of the sample, then records 8, 12, 16 and 20
+        self.assertEqual(self.full_transforms, 9)
+        self.assertFalse(passthrough.disabled)
+
+    def test_fallback(self):
+        """
+        Test that a sampled record that differs from the passthrough disables it.
+        """
+        passthrough = self.get_passthrough()
+        records = [dict(get_tag(tag_id), cdate='2021-02-01T15:11:12.000000Z') for tag_id in range(1, 21)]
+        for record in records[6:]:
+            record['cdate'] = '2021-02-01 15:11:12'
+        transformed = [passthrough.transform(copy.deepcopy(record)) for record in records]
+
+        self.assertTrue(passthrough.disabled)
+        # Record 7 is not sampled and copied as it is, record 8 and the next ones are transformed in full
+        self.assertEqual(transformed[6]['cdate'], '2021-02-01 15:11:12')
+        self.assertEqual(transformed[7:], [self.transformer(record) for record in records[7:]])
+
+    def test_compile_trusted_fields(self):
+        """
+        Test that the compiled transform copies the values of the trusted fields.
+        """
+        transform = compile_transform(self.schema, self.stream_metadata, trusted_fields={'id': str, 'tag': str})
+        self.assertEqual(transform({'id': '1', 'tag': 'a', 'created_by': '3'}), {'id': '1', 'tag': 'a', 'created_by': 3})
+        # Values of another class are converted
+        self.assertEqual(transform({'id': 1, 'tag': 2}), {'id': 1, 'tag': '2'})
+
+    def test_null_fields_not_trusted(self):
+        """
+        Test that fields null in every sampled record are not trusted, and that trusted fields convert
+        the values of another class.
+        """
+        passthrough = self.get_passthrough(sample_every=100)
+        for tag_id in range(1, 6):
+            passthrough.transform({'id': tag_id, 'cdate': None})
+        record = {'id': '7', 'cdate': '2021-05-01 12:00:00'}
+
+        self.assertEqual(passthrough.trusted_fields, {'id': int})
+        self.assertEqual(passthrough.transform(dict(record)), self.transformer(record))
+        self.assertEqual(passthrough.transform(dict(record)), {'id': 7, 'cdate': '2021-05-01T12:00:00.000000Z'})
+
+    def test_stream_keeps_sample_across_pages(self):
+        """
+        Test that a stream in passthrough mode keeps one passthrough for all its pages.
+        """
+        stream = Tags(passthrough=True)
+        pages = [[get_tag(tag_id) for tag_id in range(start, start + 100)] for start in (1, 101)]
+        for page in pages:
+            self.assertEqual(stream.transform_records('tags', copy.deepcopy(page), self.schema, self.stream_metadata),
+                             [self.transformer(record) for record in page])
+
+        passthrough = stream.get_passthrough_transform('tags', self.schema, self.stream_metadata)
+        self.assertEqual(passthrough.trusted_fields, {'tag': str, 'tag_type': str})
+        self.assertIsNotNone(passthrough.passthrough)
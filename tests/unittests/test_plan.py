@@ -0,0 +1,96 @@
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs
+from tap_activecampaign.plan import get_plan
+from tap_activecampaign.streams import ActiveCampaign
+from tap_activecampaign.sync import sync
+
+START_DATE = '2021-01-01T00:00:00Z'
+
+
+class FakeCountClient:
+    """
+    Returns one record and the total of records of the endpoint, as the API does for limit=1.
+    """
+
+    def __init__(self, totals):
+        self.totals = totals
+        self.queries = {}
+
+    def get(self, path, params, endpoint):
+        self.queries[endpoint] = {key: values[0] for key, values in parse_qs(params).items()}
+        if self.totals[endpoint] is None:
+            raise Exception('Not found')
+        return {endpoint: [{'id': '1'}], 'meta': {'total': str(self.totals[endpoint])}}
+
+
+def get_catalog(stream_names):
+    catalog = mock.Mock()
+    catalog.get_selected_streams.return_value = [mock.Mock(stream=stream_name) for stream_name in stream_names]
+    return catalog
+
+
+class TestPlan(unittest.TestCase):
+
+    def test_plan(self):
+        """
+        Test the estimated requests and duration of each stream and the longest first order.
+        """
+        client = FakeCountClient({'tags': 50, 'contacts': 1250, 'ecommerce_orders': 30, 'forms': None})
+        state = {'bookmarks': {'contacts': '2021-03-01T00:00:00Z'}}
+        plan = get_plan(client, state, START_DATE, ['tags', 'contacts', 'ecommerce_orders', 'forms'],
+                        ['tags', 'contacts', 'ecommerce_orders', 'ecommerce_order_products', 'forms'], 5.0)
+
+        # The count uses the bookmark filter of the sync
+        self.assertEqual(client.queries['contacts']['limit'], '1')
+        self.assertEqual(client.queries['contacts']['filters[updated_after]'], '2021-03-01T00:00:00Z')
+        self.assertEqual(plan['streams']['contacts']['requests'], 13)
+        self.assertEqual(plan['streams']['tags']['requests'], 1)
+        # One request per order for the selected order products
+        self.assertEqual(plan['streams']['ecommerce_orders']['requests'], 31)
+        self.assertIsNone(plan['streams']['forms']['requests'])
+
+        self.assertEqual(plan['order'], ['ecommerce_orders', 'contacts', 'tags', 'forms'])
+        self.assertEqual(plan['requests'], 45)
+        self.assertEqual(plan['estimated_seconds'], 9.0)
+
+    @mock.patch.object(ActiveCampaign, 'write_schema')
+    @mock.patch.object(ActiveCampaign, 'sync', return_value=0)
+    def test_preflight_sync_order(self, mocked_sync, mocked_write_schema):
+        """
+        Test that with preflight the streams are synced longest first, after the interrupted stream.
+        """
+        client = FakeCountClient({'tags': 50, 'contacts': 1250, 'lists': 700})
+        config = {'start_date': START_DATE, 'preflight': True}
+        writer = mock.Mock()
+        catalog = get_catalog(['lists', 'tags', 'contacts'])
+
+        sync(client, config, catalog, {}, writer=writer)
+        self.assertEqual([kwargs['path'] for args, kwargs in mocked_sync.call_args_list],
+                         ['contacts', 'lists', 'tags'])
+
+        mocked_sync.reset_mock()
+        sync(client, config, catalog, {'currently_syncing': 'tags'}, writer=writer)
+        self.assertEqual([kwargs['path'] for args, kwargs in mocked_sync.call_args_list],
+                         ['tags', 'contacts', 'lists'])
+
+    @mock.patch.object(ActiveCampaign, 'write_schema')
+    @mock.patch.object(ActiveCampaign, 'sync', return_value=7)
+    def test_history_sync_order(self, mocked_sync, mocked_write_schema):
+        """
+        Test that each run is kept in the stream history and the next sync runs the longest streams first.
+        """
+        client = FakeCountClient({})
+        config = {'start_date': START_DATE}
+        catalog = get_catalog(['lists', 'tags', 'contacts', 'deals'])
+        state = {'stream_history': {
+            'tags': {'seconds': 30.0, 'records': 500, 'synced_at': START_DATE},
+            'contacts': {'seconds': 900.0, 'records': 90000, 'synced_at': START_DATE},
+            'lists': {'seconds': 2.5, 'records': 10, 'synced_at': START_DATE}}}
+
+        sync(client, config, catalog, state, writer=mock.Mock())
+        # Streams without history follow the others
+        self.assertEqual([kwargs['path'] for args, kwargs in mocked_sync.call_args_list],
+                         ['contacts', 'tags', 'lists', 'deals'])
+        self.assertEqual(state['stream_history']['deals']['records'], 7)
+        self.assertLess(state['stream_history']['contacts']['seconds'], 900.0)
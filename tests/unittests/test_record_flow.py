@@ -0,0 +1,87 @@
+import copy
+import tracemalloc
+import unittest
+from singer import utils
+from tap_activecampaign.discover import discover
+from tap_activecampaign.streams import Tags
+from test_passthrough import get_tag
+
+
+def get_page(count):
+    return {'tags': [get_tag(tag_id) for tag_id in range(1, count + 1)], 'meta': {'total': str(count)}}
+
+
+class TestRecordFlow(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+        self.written = 0
+
+    def write_record(self, stream_name, record, time_extracted, line=None):
+        self.written += 1
+
+    def get_stream(self):
+        stream = Tags()
+        stream.write_record = self.write_record
+        return stream
+
+    def sync_page(self, stream, data):
+        records, transformed_records, lines = stream.get_page_records(data, utils.now())
+        return stream.process_records(self.catalog, 'tags', records, utils.now(),
+                                      transformed_records=transformed_records, lines=lines)
+
+    def get_peak(self, count):
+        """
+        Return the peak of the memory allocated to process a page of `count` records.
+        """
+        stream = self.get_stream()
+        # Compile the transform and load the schema before measuring
+        self.sync_page(stream, get_page(1))
+        data = get_page(count)
+        tracemalloc.start()
+        try:
+            self.sync_page(stream, data)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_peak_allocations_per_page(self):
+        """
+        Test that the records of a page are transformed and written one at a time: the memory
+        allocated to process a page does not grow with the number of records.
+        """
+        small_peak = self.get_peak(200)
+        large_peak = self.get_peak(2000)
+
+        self.assertEqual(self.written, 1 + 200 + 1 + 2000)
+        self.assertLess(large_peak, 2 * small_peak)
+        self.assertLess(large_peak, 256 * 1024)
+
+    def test_same_records(self):
+        """
+        Test that the lazy page records are the records of transform_data.
+        """
+        stream = self.get_stream()
+        data = get_page(10)
+        records, transformed_records, lines = stream.get_page_records(copy.deepcopy(data), utils.now())
+
+        self.assertIsNone(transformed_records)
+        self.assertIsNone(lines)
+        self.assertEqual(list(records), stream.transform_data(data))
+
+    def test_missing_key_writes_nothing(self):
+        """
+        Test that no record of a page is written when a later record of the page has no key.
+        """
+        stream = self.get_stream()
+        data = get_page(3)
+        del data['tags'][2]['id']
+
+        with self.assertRaises(RuntimeError):
+            self.sync_page(stream, data)
+        self.assertEqual(self.written, 0)
+
+    def test_empty_page(self):
+        stream = self.get_stream()
+        self.assertEqual(self.sync_page(stream, {'tags': [], 'meta': {'total': '0'}}), (None, 0))
+        self.assertEqual(self.sync_page(stream, {}), (None, 0))
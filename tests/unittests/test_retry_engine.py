@@ -0,0 +1,142 @@
+import unittest
+from unittest import mock
+from email.utils import formatdate
+import time
+from tap_activecampaign import client
+
+
+class Mockresponse:
+    def __init__(self, status_code, headers=None, json_data=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.json_data = json_data or {}
+        self.content = b'{}'
+
+    def json(self):
+        return self.json_data
+
+
+def get_client(**kwargs):
+    return client.ActiveCampaignClient('https://www.activecampaign.com', 'dummy_token', **kwargs)
+
+
+@mock.patch("time.sleep")
+@mock.patch("tap_activecampaign.client.ActiveCampaignClient.check_api_token")
+class TestRetryEngine(unittest.TestCase):
+
+    @mock.patch("requests.Session.request")
+    def test_retry_after_is_honored(self, mocked_request, mocked_token, mocked_sleep):
+        """
+        Test that the wait before retrying a 429 follows the Retry-After header.
+        """
+        mocked_request.side_effect = [Mockresponse(429, {'Retry-After': '7'}), Mockresponse(200, json_data={'ok': 1})]
+
+        self.assertEqual(get_client().request('GET', 'contacts'), {'ok': 1})
+        # The rate limiter may sleep as well, so look for the retry wait among all the sleeps
+        delays = [args[0] for args, kwargs in mocked_sleep.call_args_list]
+        self.assertTrue(any(7 <= delay <= 8 for delay in delays))
+
+    @mock.patch("requests.Session.request")
+    def test_long_retry_after_is_honored(self, mocked_request, mocked_token, mocked_sleep):
+        """
+        Test that a Retry-After above MAX_BACKOFF is waited in full when the request deadline allows it.
+        """
+        mocked_request.side_effect = [Mockresponse(429, {'Retry-After': '90'}), Mockresponse(200, json_data={'ok': 1})]
+
+        self.assertEqual(get_client(request_deadline=300).request('GET', 'contacts'), {'ok': 1})
+        delays = [args[0] for args, kwargs in mocked_sleep.call_args_list]
+        self.assertTrue(any(90 <= delay <= 91 for delay in delays))
+
+    @mock.patch("requests.Session.request", return_value=Mockresponse(429, {'Retry-After': '45'}))
+    def test_deadline_stops_retries(self, mocked_request, mocked_token, mocked_sleep):
+        """
+        Test that no retry is attempted when the wait would exceed the request deadline.
+        """
+        with self.assertRaises(client.ActiveCampaignRateLimitError):
+            get_client(request_timeout=10, request_deadline=30).request('GET', 'contacts')
+
+        self.assertEqual(mocked_request.call_count, 1)
+
+    @mock.patch("requests.Session.request", return_value=Mockresponse(200))
+    def test_separate_connect_and_read_timeout(self, mocked_request, mocked_token, mocked_sleep):
+        """
+        Test that a configured connect timeout is passed along with the read timeout.
+        """
+        get_client(request_timeout=100, connect_timeout=5).request('GET', 'contacts')
+
+        self.assertEqual(mocked_request.call_args[1]['timeout'], (5.0, 100.0))
+
+    @mock.patch("requests.Session.request", return_value=Mockresponse(500))
+    def test_circuit_breaker(self, mocked_request, mocked_token, mocked_sleep):
+        """
+        Test that the circuit opens after consecutive failures, fails fast, and lets a trial request through after the reset timeout.
+        """
+        _client = get_client(circuit_breaker_threshold=3, circuit_breaker_reset_timeout=60)
+
+        with self.assertRaises(client.ActiveCampaignInternalServerError):
+            _client.request('GET', 'contacts', endpoint='contacts')
+        self.assertEqual(mocked_request.call_count, 3)
+
+        # Open circuit: fail fast without any request
+        with self.assertRaises(client.ActiveCampaignCircuitOpenError):
+            _client.request('GET', 'contacts', endpoint='contacts')
+        self.assertEqual(mocked_request.call_count, 3)
+
+        # Other endpoints are not affected
+        mocked_request.return_value = Mockresponse(200, json_data={'ok': 1})
+        self.assertEqual(_client.request('GET', 'deals', endpoint='deals'), {'ok': 1})
+
+        # After the reset timeout a trial request closes the circuit again
+        _client.get_circuit_breaker('contacts').opened_at -= 61
+        self.assertEqual(_client.request('GET', 'contacts', endpoint='contacts'), {'ok': 1})
+        self.assertFalse(_client.get_circuit_breaker('contacts').is_open)
+
+    @mock.patch("requests.Session.request", return_value=Mockresponse(500))
+    def test_default_circuit_opens_within_a_run(self, mocked_request, mocked_token, mocked_sleep):
+        """
+        Test that with the default threshold, and any higher one, a request that used all its attempts
+        opens the circuit, so the next requests to the endpoint fail fast.
+        """
+        for _client in (get_client(), get_client(circuit_breaker_threshold=10)):
+            mocked_request.reset_mock()
+            with self.assertRaises(client.ActiveCampaignInternalServerError):
+                _client.request('GET', 'contacts', endpoint='contacts')
+            self.assertEqual(mocked_request.call_count, client.MAX_TRIES)
+            self.assertTrue(_client.get_circuit_breaker('contacts').is_open)
+
+            with self.assertRaises(client.ActiveCampaignCircuitOpenError):
+                _client.request('GET', 'contacts', endpoint='contacts')
+            self.assertEqual(mocked_request.call_count, client.MAX_TRIES)
+
+    @mock.patch("requests.Session.request")
+    def test_throttling_does_not_open_circuit(self, mocked_request, mocked_token, mocked_sleep):
+        """
+        Test that 429 and 403 responses are retried without counting towards the circuit.
+        """
+        mocked_request.side_effect = [Mockresponse(429), Mockresponse(403), Mockresponse(429), Mockresponse(403),
+                                      Mockresponse(200, json_data={'ok': 1})]
+        _client = get_client(circuit_breaker_threshold=2)
+
+        self.assertEqual(_client.request('GET', 'contacts', endpoint='contacts'), {'ok': 1})
+        self.assertEqual(mocked_request.call_count, 5)
+        self.assertEqual(_client.get_circuit_breaker('contacts').failures, 0)
+
+
+class TestRetryAfterParsing(unittest.TestCase):
+
+    def test_retry_after_values(self):
+        """
+        Test parsing of Retry-After as seconds, HTTP date, and invalid or missing values.
+        """
+        self.assertEqual(client.get_retry_after(Mockresponse(429, {'Retry-After': '3'})), 3.0)
+        http_date = formatdate(time.time() + 30, usegmt=True)
+        self.assertTrue(25 <= client.get_retry_after(Mockresponse(429, {'Retry-After': http_date})) <= 30)
+        self.assertIsNone(client.get_retry_after(Mockresponse(429, {'Retry-After': 'soon'})))
+        self.assertIsNone(client.get_retry_after(Mockresponse(429, None)))
+
+    def test_backoff_delay_without_hint(self):
+        """
+        Test that the delay without a server hint is full jitter exponential backoff.
+        """
+        for attempt in range(1, 5):
+            self.assertTrue(0 <= client.get_retry_delay(attempt, Exception()) <= 2 ** attempt)
@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+from urllib.parse import parse_qs
+from tap_activecampaign.budget import RuntimeBudget, RuntimeBudgetSpent
+from tap_activecampaign.discover import discover
+from tap_activecampaign.streams import Activities, ActiveCampaign
+from tap_activecampaign.sync import sync
+
+START_DATE = '2021-01-01T00:00:00Z'
+
+
+def get_activities(count):
+    # Not sorted by tstamp, as the API returns them
+    return [{'id': str(number), 'tstamp': '2021-02-{:02d}T00:00:00-05:00'.format(1 + number * 5 % 28)}
+            for number in range(1, count + 1)]
+
+
+class FakeActivitiesClient:
+    """
+    Returns the activities page by page, as the API does for the offset and limit of the query.
+    """
+
+    base_url = 'https://example.api-us1.com/api/3/'
+
+    def __init__(self, activities):
+        self.activities = activities
+        self.queries = []
+
+    def get(self, path, params, endpoint):
+        query = {key: values[0] for key, values in parse_qs(params).items()}
+        self.queries.append(query)
+        offset, limit = int(query['offset']), int(query['limit'])
+        return {'activities': self.activities[offset:offset + limit], 'meta': {'total': str(len(self.activities))}}
+
+
+class TestRuntimeBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+
+    def sync_activities(self, client, state, budget=None):
+        stream = Activities(client, budget=budget)
+        with mock.patch.object(Activities, 'write_record') as mocked_write_record, \
+                mock.patch.object(stream.writer, 'write_state'):
+            try:
+                stream.sync(client, self.catalog, state, START_DATE, stream.path, ['activities'])
+            finally:
+                self.written = [args[1]['id'] for args, kwargs in mocked_write_record.call_args_list]
+
+    def test_margin(self):
+        self.assertEqual(RuntimeBudget(3600).margin, 60)
+        self.assertEqual(RuntimeBudget(100).margin, 10)
+        with mock.patch('tap_activecampaign.budget.time.monotonic', side_effect=[0, 80, 95]):
+            budget = RuntimeBudget(100)
+            self.assertFalse(budget.is_spent())
+            self.assertTrue(budget.is_spent())
+
+    def test_checkpoint_and_resume(self):
+        """
+        Test that a stream stopped by the budget resumes at the checkpoint offset with the running bookmark.
+        """
+        client = FakeActivitiesClient(get_activities(250))
+        state = {'bookmarks': {'activities': START_DATE}}
+        budget = mock.Mock()
+        budget.is_spent.return_value = True
+
+        with self.assertRaises(RuntimeBudgetSpent):
+            self.sync_activities(client, state, budget)
+        self.assertEqual(self.written, list(range(1, 101)))
+        self.assertEqual(state['checkpoint'], {'stream': 'activities', 'offset': 100, 'last_datetime': START_DATE,
+                                               'max_bookmark': '2021-02-28T05:00:00.000000Z'})
+        # The bookmark only moves once the stream is complete
+        self.assertEqual(state['bookmarks']['activities'], START_DATE)
+
+        client.queries.clear()
+        self.sync_activities(client, state)
+        self.assertEqual(client.queries[0]['offset'], '100')
+        self.assertEqual(client.queries[0]['after'], START_DATE)
+        self.assertEqual(self.written, list(range(101, 251)))
+        self.assertNotIn('checkpoint', state)
+        self.assertEqual(state['bookmarks']['activities'], '2021-02-28T05:00:00.000000Z')
+
+    @mock.patch.object(ActiveCampaign, 'write_schema')
+    @mock.patch.object(ActiveCampaign, 'sync', side_effect=RuntimeBudgetSpent('lists'))
+    def test_sync_stops_cleanly(self, mocked_sync, mocked_write_schema):
+        """
+        Test that sync returns after a stream is stopped by the budget, with that stream currently syncing.
+        """
+        catalog = mock.Mock()
+        catalog.get_selected_streams.return_value = [mock.Mock(stream='lists'), mock.Mock(stream='tags')]
+        state = {}
+
+        sync(mock.Mock(), {'start_date': START_DATE, 'max_runtime': 3600}, catalog, state, writer=mock.Mock())
+        self.assertEqual(mocked_sync.call_count, 1)
+        self.assertEqual(state['currently_syncing'], 'lists')
@@ -0,0 +1,55 @@
+import io
+import json
+import subprocess
+import sys
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+import tap_activecampaign
+
+# Generous bound for a cold interpreter start, imports and a full discovery
+MAX_COLD_DISCOVER_SECONDS = 5
+
+COLD_DISCOVER = '''
+import io, json, sys
+from contextlib import redirect_stdout
+from tap_activecampaign import do_discover
+with redirect_stdout(io.StringIO()):
+    do_discover()
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+class TestDiscoverStartup(unittest.TestCase):
+
+    def test_cold_discover_imports_and_time(self):
+        """
+        Test that discover in a fresh process finishes quickly and never imports the client or stream modules.
+        """
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', COLD_DISCOVER], check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+        elapsed = time.perf_counter() - start
+        modules = set(json.loads(output.decode('utf-8').splitlines()[-1]))
+
+        for module in ('tap_activecampaign.client', 'tap_activecampaign.streams',
+                       'tap_activecampaign.sync', 'tap_activecampaign.transform', 'humps'):
+            self.assertNotIn(module, modules)
+        self.assertLess(elapsed, MAX_COLD_DISCOVER_SECONDS)
+
+    @mock.patch('requests.Session.request', side_effect=AssertionError('network access'))
+    @mock.patch('socket.gethostbyname', side_effect=AssertionError('DNS resolution'))
+    def test_discover_mode_without_network(self, mocked_dns, mocked_request):
+        """
+        Test that `--discover` neither resolves the api_url nor verifies the api_token.
+        """
+        args = mock.Mock(discover=True, catalog=None, state=None,
+                         config={'api_url': 'https://example.api-us1.com', 'api_token': 'token',
+                                 'start_date': '2019-01-01T00:00:00Z', 'user_agent': 'test'})
+        with mock.patch('singer.utils.parse_args', return_value=args), redirect_stdout(io.StringIO()) as stdout:
+            tap_activecampaign.main()
+
+        self.assertEqual(len(json.loads(stdout.getvalue())['streams']), 59)
+        self.assertEqual(mocked_dns.call_count, 0)
+        self.assertEqual(mocked_request.call_count, 0)
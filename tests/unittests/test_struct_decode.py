@@ -0,0 +1,135 @@
+import copy
+import json
+import random
+import unittest
+from unittest import mock
+import humps
+from singer import metadata, Transformer
+from singer.transform import SchemaMismatch
+from tap_activecampaign.compiled_transform import get_kind
+from tap_activecampaign.discover import discover
+from tap_activecampaign.streams import STREAMS, Templates
+from tap_activecampaign.struct_decode import DecodedPage, StructDecoder
+from tap_activecampaign.transform import ZERO_DATE, is_date_field, transform_json
+from test_descending_scan import FakeTemplatesClient, START_DATE, get_templates
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Values of each kind of schema node as sent by the API
+API_VALUES = {
+    'integer': ['12', 12, None],
+    'number': ['1.5', 2, None],
+    'string': ['text', '', None],
+    'boolean': [True, False, 'false', '0', 1, None],
+    'datetime': ['2021-02-01 10:11:12', '2021-02-01T10:11:12-05:00', None],
+    'null': [None],
+    'any': ['text', {'someKey': 1}, None],
+    'dict': [{'someKey': 'a'}, None],
+    'generic': [None, '12', ['a', 'b']]
+}
+
+
+def get_api_value(name, schema, rand):
+    kind, _ = get_kind(schema)
+    if kind == 'object':
+        return {humps.camelize(field): get_api_value(field, field_schema, rand)
+                for field, field_schema in schema['properties'].items() if rand.random() < 0.8}
+    if kind in ('string', 'datetime') and is_date_field(name) and rand.random() < 0.2:
+        return ZERO_DATE
+    return rand.choice(API_VALUES[kind])
+
+def get_api_record(schema, rand, camel_fields):
+    record = {humps.camelize(name) if name in camel_fields else name: get_api_value(name, field_schema, rand)
+              for name, field_schema in schema['properties'].items() if rand.random() < 0.9}
+    record['links'] = {'someLink': 'https://example.com'}
+    return record
+
+
+class FakeDecodingClient(FakeTemplatesClient):
+    """
+    Serves the templates as response content, decoded by the decoder of the request when given.
+    """
+
+    def get(self, path, params, endpoint, decoder=None):
+        content = json.dumps(super().get(path, params, endpoint)).encode()
+        return decoder(content) if decoder else json.loads(content)
+
+
+@unittest.skipUnless(msgspec, 'msgspec is not installed')
+class TestStructDecode(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+
+    def get_expected(self, data, stream_name, data_key, schema, stream_metadata):
+        records = transform_json(copy.deepcopy(data), stream_name, data_key)
+        return [Transformer().transform(record, schema, stream_metadata) for record in records]
+
+    def test_conformance_all_streams(self):
+        """
+        Test that the pages decoded to structs give the records of transform_json and Transformer,
+        and that the pages the structs reject are returned as plain JSON.
+        """
+        rand = random.Random(3)
+        decoded_pages = 0
+        for stream_name, stream_class in STREAMS.items():
+            if not stream_class.data_key:
+                continue
+            with self.subTest(stream=stream_name):
+                stream = self.catalog.get_stream(stream_name)
+                schema, stream_metadata = stream.schema.to_dict(), metadata.to_map(stream.metadata)
+                camel_fields = {name for name in schema['properties'] if rand.random() < 0.5}
+                decoder = StructDecoder(stream_name, stream_class.data_key, schema, stream_metadata)
+
+                pages = [{stream_class.data_key: [get_api_record(schema, rand, camel_fields) for _ in range(3)],
+                          'meta': {'total': '3'}} for _ in range(10)]
+                # The first page maps the keys
+                self.assertNotIsInstance(decoder(json.dumps(pages[0]).encode()), DecodedPage)
+                for page in pages[1:]:
+                    decoded = decoder(json.dumps(page).encode())
+                    if not isinstance(decoded, DecodedPage):
+                        self.assertEqual(decoded, page)
+                        continue
+                    decoded_pages += 1
+                    try:
+                        expected = self.get_expected(page, stream_name, stream_class.data_key, schema,
+                                                     stream_metadata)
+                    except SchemaMismatch:
+                        self.fail('Page decoded to structs, Transformer rejects it')
+                    self.assertEqual([decoder.project_record(record) for record in decoded[stream_class.data_key]],
+                                     expected)
+                    self.assertEqual(decoded['meta'], {'total': '3'})
+        self.assertGreater(decoded_pages, 50)
+
+    def test_learns_new_keys(self):
+        """
+        Test that a page with a key not seen before is returned as plain JSON and the next one decoded.
+        """
+        stream = self.catalog.get_stream('tags')
+        decoder = StructDecoder('tags', 'tags', stream.schema.to_dict(), metadata.to_map(stream.metadata))
+        page = {'tags': [{'id': '1', 'tagType': 'contact'}]}
+        decoder(json.dumps(page).encode())
+
+        page['tags'].append({'id': '2', 'tag': 'vip', 'newKey': 1})
+        self.assertEqual(decoder(json.dumps(page).encode()), page)
+        self.assertEqual(decoder(json.dumps(page).encode()),
+                         {'tags': [{'id': 1, 'tag_type': 'contact'}, {'id': 2, 'tag': 'vip'}], 'meta': {}})
+
+    def test_sync_same_records(self):
+        """
+        Test that a sync with struct decoding writes the same records as the standard path.
+        """
+        written = []
+        for struct_decoding in (False, True):
+            client = FakeDecodingClient(get_templates(250))
+            stream = Templates(client, struct_decoding=struct_decoding)
+            with mock.patch.object(Templates, 'write_record') as mocked_write_record, \
+                    mock.patch.object(stream.writer, 'write_state'):
+                stream.sync(client, self.catalog, {}, START_DATE, stream.path, ['templates'])
+            written.append([args[1] for args, kwargs in mocked_write_record.call_args_list])
+
+        self.assertEqual(len(written[0]), 250)
+        self.assertEqual(written[1], written[0])
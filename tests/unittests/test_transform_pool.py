@@ -0,0 +1,134 @@
+import datetime
+import io
+import json
+import unittest
+from unittest import mock
+from singer import metadata
+from tap_activecampaign import workers
+from tap_activecampaign.discover import discover
+from tap_activecampaign.output import SingerWriter
+from tap_activecampaign.streams import Contacts, Tags
+from tap_activecampaign.workers import TransformPool, TransformWorkerError
+from test_contacts_shards import FakeContactsClient, START_DATE
+from test_descending_scan import FakeTemplatesClient
+from test_passthrough import get_tag
+
+TIME_EXTRACTED = datetime.datetime(2021, 3, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeTagsClient(FakeTemplatesClient):
+    """
+    Returns the tags page by page, logging the offset of each request in `events`.
+    """
+
+    def __init__(self, tags, events):
+        super().__init__(tags)
+        self.events = events
+
+    def get(self, path, params, endpoint):
+        data = super().get(path, params, endpoint)
+        self.events.append(('get', int(self.queries[-1]['offset'])))
+        return {'tags': data.pop('templates'), **data}
+
+
+class InProcessPool:
+    """
+    TransformPool transforming the pages in the test process, logging in `events` when the first id
+    of a page is submitted and when its result is collected.
+    """
+
+    record_lines = True
+
+    def __init__(self, catalog, events):
+        workers.init_worker({stream.tap_stream_id: (stream.schema.to_dict(), metadata.to_map(stream.metadata))
+                             for stream in catalog.streams})
+        self.events = events
+
+    def submit_page(self, stream_name, data, time_extracted, parent=None, parent_id=None, passthrough=False):
+        first_id = int(data['tags'][0]['id'])
+        self.events.append(('submit', first_id))
+        result = workers.transform_page(stream_name, data, time_extracted, parent, parent_id, passthrough,
+                                        self.record_lines)
+
+        def get_result():
+            self.events.append(('result', first_id))
+            return result
+        return mock.Mock(result=get_result)
+
+
+class TestTransformPool(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = discover()
+
+    def sync_shards(self, pool=None):
+        out = io.StringIO()
+        stream = Contacts(FakeContactsClient(450), writer=SingerWriter(out=out), pool=pool)
+        with mock.patch('tap_activecampaign.streams.utils.now', return_value=TIME_EXTRACTED):
+            total = stream.sync_shards(self.catalog, {}, START_DATE, 2)
+        return total, out.getvalue().splitlines()
+
+    def test_same_output_as_in_process(self):
+        """
+        Test that the pages transformed and serialized by the worker processes give the same messages.
+        """
+        expected_total, expected_lines = self.sync_shards()
+        with TransformPool(self.catalog, 2) as pool:
+            total, lines = self.sync_shards(pool)
+
+        # STATE messages depend on the interleaving of the shard threads
+        records = [line for line in lines if line.startswith('{"type": "RECORD"')]
+        self.assertEqual(total, expected_total)
+        self.assertEqual(sorted(records), sorted(line for line in expected_lines if line.startswith('{"type": "RECORD"')))
+        # The records of each shard are written in page order
+        ids = [json.loads(line)['record']['id'] for line in records]
+        self.assertEqual([contact_id for contact_id in ids if contact_id <= 225], list(range(1, 226)))
+        self.assertEqual([contact_id for contact_id in ids if contact_id > 225], list(range(226, 451)))
+
+    def sync_tags(self, pool=None, events=None):
+        out = io.StringIO()
+        client = FakeTagsClient([get_tag(tag_id) for tag_id in range(1, 251)], events if events is not None else [])
+        stream = Tags(client, writer=SingerWriter(out=out), pool=pool)
+        with mock.patch('tap_activecampaign.streams.utils.now', return_value=TIME_EXTRACTED):
+            stream.sync(client, self.catalog, {}, START_DATE, stream.path, ['tags'])
+        return out.getvalue().splitlines()
+
+    def test_next_page_fetched_during_transform(self):
+        """
+        Test that the next page is requested while the current page is transformed, and the pages are
+        still written in order with the same messages.
+        """
+        events = []
+        lines = self.sync_tags(InProcessPool(self.catalog, events), events)
+
+        self.assertEqual(events, [('get', 0), ('submit', 1), ('get', 100), ('result', 1),
+                                  ('submit', 101), ('get', 200), ('result', 101),
+                                  ('submit', 201), ('result', 201)])
+        self.assertEqual(lines, self.sync_tags())
+
+    def test_records_only_for_other_writers(self):
+        """
+        Test that the records are not serialized for writers that do not write RECORD lines.
+        """
+        stream = self.catalog.get_stream('contacts')
+        workers.init_worker({'contacts': (stream.schema.to_dict(), metadata.to_map(stream.metadata))})
+        data = {'contacts': [{'id': '1', 'email': 'a@example.com', 'udate': '2021-02-01 10:11:12'}]}
+
+        records, transformed_records, lines = workers.transform_page(
+            'contacts', data, TIME_EXTRACTED, None, None, False, False)
+        self.assertEqual(records[0]['id'], '1')
+        self.assertEqual(transformed_records[0]['id'], 1)
+        self.assertIsNone(lines)
+
+    def test_worker_error(self):
+        """
+        Test that an error in a worker is raised as a TransformWorkerError with the original message.
+        """
+        stream = self.catalog.get_stream('contacts')
+        workers.init_worker({'contacts': (stream.schema.to_dict(), metadata.to_map(stream.metadata))})
+
+        with self.assertRaises(TransformWorkerError) as context:
+            # Record without its key
+            workers.transform_page('contacts', {'contacts': [{'email': 'a@example.com'}]},
+                                   TIME_EXTRACTED, None, None, False, True)
+        self.assertIn('RuntimeError', str(context.exception))